@@ -5,9 +5,15 @@ from werkzeug.exceptions import HTTPException
 import os
 import logging
 from dotenv import load_dotenv  # Import dotenv
-from routes.ocr import bp as ocr_bp
+from routes.ocr import bp as ocr_bp, requested_profile, requested_language
 from routes.grading import bp as grading_bp
-from utils.ocr_extraction import extract_text_from_image
+from utils.ocr_extraction import extract_text_from_image, extract_document_bytes
+from utils import ocr_engine
+from utils import job_queue
+from utils import image_ingest
+from utils import rubric_store
+from utils import derived_assets
+from utils.preprocessing import PROFILES as PREPROCESSING_PROFILES
 from utils.grading_helper import grade_with_mistral
 import tempfile
 import supabase_client as supabase
@@ -136,6 +142,14 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Pre-load OCR engines for this worker so the first request skips model loading
+if ocr_engine.OCR_PRELOAD_LANGUAGES:
+    ocr_engine.warm_up()
+
+# Background workers for the asynchronous OCR job queue (/api/ocr/jobs) are
+# started by the server once it is serving (gunicorn.conf.py's post_fork, or
+# below for the development server), never on import
+
 # Error handler
 @app.errorhandler(Exception)
 def handle_error(e):
@@ -307,13 +321,17 @@ def create_exam():
     description = data.get('description', '')
     created_by = data.get('created_by')
     language = data.get('language', 'English') # Extract language, default to English
+    ocr_profile = data.get('ocr_profile') # Optional OCR preprocessing profile for the exam's scripts
     
     if not title or not created_by:
         return jsonify({"error": "Title and user ID are required"}), 400
+
+    if ocr_profile and ocr_profile not in PREPROCESSING_PROFILES:
+        return jsonify({"error": f"Unknown OCR profile. Choose one of: {', '.join(PREPROCESSING_PROFILES)}"}), 400
     
     try:
         # Pass language to the helper function
-        exam = supabase.create_exam(title, description, created_by, language)
+        exam = supabase.create_exam(title, description, created_by, language, ocr_profile)
         return jsonify(exam), 201
     except Exception as e:
         logger.error(f"Create exam error: {str(e)}", exc_info=True)
@@ -337,6 +355,7 @@ def delete_exam(exam_id):
             headers=supabase.headers
         )
         logger.info(f"[Debug] Rubrics deletion status: {rubrics_response.status_code}")
+        rubric_store.get_store().invalidate(exam_id)
         
         # Finally, delete the exam
         exam_response = requests.delete(
@@ -387,6 +406,7 @@ def upload_rubric():
         if delete_response.status_code not in [200, 204]:
             logger.error(f"[Debug] Error deleting existing rubric: {delete_response.text}")
             # Continue anyway as there might not be an existing rubric
+        rubric_store.get_store().invalidate(exam_id)
         
         # Create the data dictionary with correct column names
         rubric_data = {
@@ -417,6 +437,8 @@ def upload_rubric():
         rubric = response.json()[0] if isinstance(response.json(), list) else response.json()
         
         logger.info(f"[Debug] Rubric uploaded successfully: {rubric['id']}")
+        # The preview and page thumbnails are rendered after the response
+        derived_assets.schedule(rubric.get('id'), image_url)
         return jsonify({
             "message": "Rubric uploaded successfully",
             "rubric": {
@@ -461,6 +483,7 @@ def get_rubric(exam_id):
             
         # Return the most recent rubric if multiple exist
         rubric = rubrics[0]
+        assets = derived_assets.get_store().manifest_for_url(rubric.get('preview')) or {}
         
         return jsonify({
             "id": rubric.get('id'),
@@ -468,6 +491,7 @@ def get_rubric(exam_id):
             "file_name": rubric.get('file_name'),
             "content": rubric.get('content'),
             "preview": rubric.get('preview'),
+            "thumbnails": assets.get('thumbnails', []),
             "created_at": rubric.get('created_at'),
             "image_url": rubric.get('image_url'),
             "file_type": rubric.get('file_type'),
@@ -479,6 +503,21 @@ def get_rubric(exam_id):
         logger.error(f"Traceback: {traceback.format_exc()}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/assets/<source_hash>/<filename>', methods=['GET'])
+def get_asset(source_hash, filename):
+    """Serve a rubric preview or thumbnail; names are content-addressed, so they never change"""
+    path = derived_assets.get_store().path(source_hash, filename)
+    if not path:
+        return jsonify({"error": "Asset not found"}), 404
+    response = send_file(path, max_age=derived_assets.ASSET_MAX_AGE, conditional=True, etag=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/api/assets/stats', methods=['GET'])
+def asset_stats():
+    return jsonify(derived_assets.get_store().stats()), 200
+
 # Submission management endpoints
 @app.route('/api/submissions', methods=['POST'])
 def create_submission():
@@ -499,9 +538,8 @@ def create_submission():
         return jsonify({"error": "Missing required fields: exam_id, student_name, student_id, created_by, script_file_name, extracted_text_script"}), 400
     
     try:
-        # Get rubric text (remains the same)
-        rubric = supabase.get_rubric(exam_id)
-        rubric_text = rubric.get('content') if rubric else None
+        # Rubric text is fetched once per exam and shared by its submissions
+        rubric_text = rubric_store.get_store().exam_text(exam_id)
         
         # Create submission using data from payload - pass student_id
         submission = supabase.create_submission(
@@ -853,89 +891,61 @@ def extract_text():
         # Log file details
         logger.info(f"[Debug OCR] File received: {file.filename}")
         logger.info(f"[Debug OCR] Content type: {file.content_type}")
-        logger.info(f"[Debug OCR] File size: {len(file.read())}")
-        file.seek(0)  # Reset file pointer after reading
 
-        # Save file temporarily
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # Decode from memory: no temp file, one copy of the upload
+        ingest_stats = image_ingest.new_ingest_stats()
+        data = image_ingest.read_upload(file, stats=ingest_stats)
+        logger.info(f"[Debug OCR] File size: {len(data)}")
 
         try:
             # Extract text using OCR
             logger.info("[Debug OCR] Starting OCR extraction")
-            logger.info(f"[Debug OCR] Processing file: {filepath}")
-            
-            # Read the image using cv2
-            image = cv2.imread(filepath)
-            if image is None:
+
+            # OCR through the shared pipeline so repeated uploads hit the OCR cache
+            document = extract_document_bytes(data, secure_filename(file.filename), lang=requested_language('eng'),
+                                              profile=requested_profile(), ingest_stats=ingest_stats)
+            if document is None:
                 logger.error("[Debug OCR] Failed to read image file")
                 return jsonify({'error': 'Failed to read image file'}), 400
-                
-            # Preprocess the image
-            processed_image = preprocess_image(image)
-            
-            # Convert to PIL Image for Tesseract
-            pil_image = Image.fromarray(processed_image)
-            
-            # Extract text using Tesseract
-            extracted_text = pytesseract.image_to_string(pil_image)
+
+            extracted_text = document['text']
+            logger.info(f"[Debug OCR] Served from cache: {document['cached']}")
+            logger.info(f"[Debug OCR] Ingestion copied {ingest_stats['bytes_copied']} bytes "
+                        f"in {ingest_stats['buffers']} buffers")
             
             if not extracted_text or len(extracted_text.strip()) == 0:
                 logger.error("[Debug OCR] No text extracted from image")
                 return jsonify({'error': 'No text could be extracted'}), 400
 
             logger.info(f"[Debug OCR] Successfully extracted text: {extracted_text[:100]}...")
-            return jsonify({'text': extracted_text}), 200
+            return jsonify({
+                'text': extracted_text,
+                'profile': document['profile'],
+                'timings': document['timings'],
+                'confidence': document['confidence'],
+                'ingest': ingest_stats
+            }), 200
 
         except Exception as e:
             logger.error(f"[Debug OCR] Error during text extraction: {str(e)}")
             logger.error(traceback.format_exc())
             return jsonify({'error': str(e)}), 500
-        finally:
-            # Clean up temporary file
-            if os.path.exists(filepath):
-                os.remove(filepath)
-                logger.info("[Debug OCR] Cleaned up temporary file")
 
     except Exception as e:
         logger.error(f"[Debug OCR] Error in extract_text endpoint: {str(e)}")
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
-def preprocess_image(image):
-    """
-    Preprocess the image for better OCR results
-    """
-    # Convert to grayscale if image is in color
-    if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    else:
-        gray = image
-
-    # Apply adaptive thresholding
-    binary = cv2.adaptiveThreshold(
-        gray, 255,
-        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-        cv2.THRESH_BINARY,
-        11, 2
-    )
-
-    # Denoise
-    denoised = cv2.fastNlMeansDenoising(binary)
-
-    # Dilation to connect text components
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-    dilated = cv2.dilate(denoised, kernel, iterations=1)
-
-    return dilated
-
 if __name__ == '__main__':
     # Check if MISTRAL_API_KEY is set
     if not os.environ.get('MISTRAL_API_KEY'):
         logger.warning("MISTRAL_API_KEY environment variable is not set!")
         print("WARNING: MISTRAL_API_KEY environment variable is not set!")
     
+    # With the reloader, only the child process that serves requests runs jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_queue.start_workers()
+
     logger.info("Starting AEMS Grading API on port 5000")
     print("Starting AEMS Grading API on port 5000")
     app.run(host='0.0.0.0', port=5000, debug=True)
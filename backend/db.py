@@ -57,10 +57,16 @@ def init_db():
             title VARCHAR(255) NOT NULL,
             description TEXT,
             created_by INTEGER REFERENCES users(id),
+            ocr_profile VARCHAR(32),
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         ''')
         
+        # Columns added after the exams table was first created
+        cur.execute('''
+        ALTER TABLE exams ADD COLUMN IF NOT EXISTS ocr_profile VARCHAR(32)
+        ''')
+        
         # Create rubrics table
         cur.execute('''
         CREATE TABLE IF NOT EXISTS rubrics (
@@ -0,0 +1,10 @@
+"""
+Gunicorn settings, read from the working directory by `gunicorn app:app`
+"""
+
+
+def post_fork(server, worker):
+    # Threads do not survive a fork, so each worker starts its own OCR job
+    # workers after it is forked rather than when the app is imported
+    from utils import job_queue
+    job_queue.start_workers()
@@ -1,17 +1,33 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, request, jsonify, make_response, Response, stream_with_context
 from werkzeug.utils import secure_filename
 import os
+import json
+import time
+import uuid
 import magic
 import logging
-from utils.ocr_extraction import extract_text_from_image
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.ocr_extraction import extract_document, extract_document_bytes, compare_layout_modes
+from utils import ocr_extraction
+from utils.ocr_cache import get_cache
+from utils import job_queue
+from utils import zip_ingest
+from utils import image_ingest
+from utils import ocr_languages
+from utils import ocr_engine
+from utils import cpu_budget
+from utils import rubric_store
+from utils import page_pipeline
+from utils import chunked_upload
+from utils import blank_pages
+from utils.preprocessing import resolve_profile
+import supabase_client
 from utils.grading_helper import grade_with_mistral
 from flask_cors import cross_origin
 import zipfile
-import tempfile
-import shutil
 import pytesseract
 from PIL import Image
-from flask import current_app
+from flask import current_app, g
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -23,10 +39,16 @@ UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# Files of one batch request OCR'd at the same time
+OCR_BATCH_WORKERS = int(os.environ.get('OCR_BATCH_WORKERS', 4))
+
 ALLOWED_EXTENSIONS = {
     'png': 'image/png',
     'jpg': 'image/jpeg',
     'jpeg': 'image/jpeg',
+    'tif': 'image/tiff',
+    'tiff': 'image/tiff',
+    'webp': 'image/webp',
     'pdf': 'application/pdf'
 }
 
@@ -63,6 +85,63 @@ def allowed_file(file) -> bool:
         logger.error(f"Error in file validation: {str(e)}", exc_info=True)
         return False
 
+def request_field(name, default=None):
+    """A form field, or the same key of a JSON body"""
+    if name in request.form:
+        return request.form.get(name)
+    body = request.get_json(silent=True)
+    return body.get(name, default) if isinstance(body, dict) else default
+
+def requested_exam():
+    """The exam named by the 'exam_id' field (looked up once per request), or None"""
+    if 'ocr_exam' not in g:
+        exam_id = request_field('exam_id')
+        g.ocr_exam = supabase_client.get_exam(exam_id) if exam_id else None
+    return g.ocr_exam
+
+def requested_profile():
+    """
+    Preprocessing profile for this request: the 'profile' form field first,
+    then the profile stored on the exam named by 'exam_id', then the default
+    """
+    exam = requested_exam()
+    return resolve_profile(request_field('profile'), exam.get('ocr_profile') if exam else None)
+
+def requested_language(default=None):
+    """
+    Tesseract language for this request: the 'lang' form field first, then
+    the language of the exam named by 'exam_id', then `default`
+    """
+    exam = requested_exam()
+    return ocr_languages.resolve_language(request_field('lang'), exam.get('language') if exam else None,
+                                          default)
+
+def _document_text(data, filename, profile, mode, ingest_stats, lang):
+    document = extract_document_bytes(data, secure_filename(filename), lang=lang, profile=profile, mode=mode,
+                                      ingest_stats=ingest_stats)
+    if not document or not document['text']:
+        logger.warning(f"No text extracted from {filename}")
+        return None
+    return document['text']
+
+def extract_upload_text(file, profile=None, mode=None, ingest_stats=None, lang=None):
+    """OCR an uploaded file from memory; returns its text or None"""
+    data = image_ingest.read_upload(file, stats=ingest_stats)
+    return _document_text(data, file.filename, profile, mode, ingest_stats, lang or requested_language())
+
+def extract_rubric_text(file, profile=None, mode=None, ingest_stats=None, lang=None):
+    """
+    Like extract_upload_text for the rubric of the exam named by 'exam_id':
+    each version of an exam's rubric is OCR'd once and reused for every script
+    """
+    data = image_ingest.read_upload(file, stats=ingest_stats)
+    lang = lang or requested_language()
+    return rubric_store.get_store().upload_text(
+        request.form.get('exam_id'), data,
+        lambda: _document_text(data, file.filename, profile, mode, ingest_stats, lang),
+        lang=lang, profile=profile, mode=mode
+    )
+
 def save_uploaded_file(file, prefix):
     """Save uploaded file and return the filepath"""
     if file and file.filename != '':
@@ -73,28 +152,6 @@ def save_uploaded_file(file, prefix):
         return filepath
     return None
 
-def extract_test_scripts(zip_path):
-    """Extract test scripts from ZIP file and return their paths"""
-    extract_dir = tempfile.mkdtemp(dir=UPLOAD_FOLDER)
-    script_paths = []
-    
-    try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-            
-        # Get all files from the extracted directory
-        for root, _, files in os.walk(extract_dir):
-            for file in files:
-                if file.lower().endswith(('.png', '.jpg', '.jpeg', '.pdf')):
-                    script_paths.append(os.path.join(root, file))
-        
-        return script_paths
-    except Exception as e:
-        logger.error(f"Error extracting ZIP file: {str(e)}")
-        if os.path.exists(extract_dir):
-            shutil.rmtree(extract_dir)
-        raise
-
 @bp.route('/process', methods=['POST'])
 def process_files():
     """Process uploaded files for OCR and grading"""
@@ -132,19 +189,17 @@ def process_files():
         logger.error(f"Invalid test script file type: {test_script_file.filename}")
         return jsonify({'error': 'Invalid test script file type'}), 400
     
-    # Save files temporarily
-    rubric_path = os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(rubric_file.filename))
-    test_script_path = os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(test_script_file.filename))
-    
-    rubric_file.save(rubric_path)
-    test_script_file.save(test_script_path)
-    
-    logger.debug(f"Files saved: {rubric_path}, {test_script_path}")
+    # Uploads are decoded from memory, nothing is written to the upload folder
+    ingest_stats = image_ingest.new_ingest_stats()
     
     # Extract text from files
     try:
-        rubric_text = extract_text_from_image(rubric_path)
-        test_script_text = extract_text_from_image(test_script_path)
+        profile = requested_profile()
+        lang = requested_language()
+        mode = request.form.get('layout')
+        rubric_text = extract_rubric_text(rubric_file, profile, mode, ingest_stats, lang)
+        test_script_text = extract_upload_text(test_script_file, profile, mode, ingest_stats, lang)
+        logger.debug(f"Ingestion copied {ingest_stats['bytes_copied']} bytes in {ingest_stats['buffers']} buffers")
         
         # Log the extracted text for debugging
         logger.debug(f"Extracted rubric text: {rubric_text}")
@@ -173,12 +228,6 @@ def process_files():
     except Exception as e:
         logger.error(f"Error processing files: {str(e)}", exc_info=True)
         return jsonify({'error': f'Error processing files: {str(e)}'}), 500
-    finally:
-        # Clean up temporary files
-        if os.path.exists(rubric_path):
-            os.remove(rubric_path)
-        if os.path.exists(test_script_path):
-            os.remove(test_script_path)
 
 def handle_preflight():
     response = make_response()
@@ -302,31 +351,355 @@ def extract_text():
         logger.error("Empty test script file")
         return jsonify({'error': 'Empty test script file'}), 400
     
-    # Save files temporarily
-    rubric_path = os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(rubric_file.filename))
-    test_script_path = os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(test_script_file.filename))
-    
-    rubric_file.save(rubric_path)
-    test_script_file.save(test_script_path)
-    
-    logger.debug(f"Files saved: {rubric_path}, {test_script_path}")
+    # Uploads are decoded from memory, nothing is written to the upload folder
+    ingest_stats = image_ingest.new_ingest_stats()
     
     # Extract text from files
     try:
-        rubric_text = extract_text_from_image(rubric_path)
-        test_script_text = extract_text_from_image(test_script_path)
+        profile = requested_profile()
+        lang = requested_language()
+        mode = request.form.get('layout')
+        rubric_text = extract_rubric_text(rubric_file, profile, mode, ingest_stats, lang)
+        test_script_text = extract_upload_text(test_script_file, profile, mode, ingest_stats, lang)
+        logger.debug(f"Ingestion copied {ingest_stats['bytes_copied']} bytes in {ingest_stats['buffers']} buffers")
         
         return jsonify({
             'rubric_text': rubric_text,
-            'script_text': test_script_text
+            'script_text': test_script_text,
+            'ingest': ingest_stats
         }), 200
         
     except Exception as e:
         logger.error(f"Error extracting text: {str(e)}", exc_info=True)
         return jsonify({'error': f'Error extracting text: {str(e)}'}), 500
+
+@bp.route('/compare-layout', methods=['POST'])
+def compare_layout():
+    """Compare whole-page and block-level OCR of one file for latency and accuracy"""
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+
+    file = request.files['file']
+    if not allowed_file(file):
+        return jsonify({'error': 'File type not allowed'}), 400
+
+    file_path = save_uploaded_file(file, 'compare')
+    try:
+        results = compare_layout_modes(
+            file_path,
+            lang=requested_language(),
+            profile=requested_profile(),
+            reference=request.form.get('reference')
+        )
+        return jsonify(results), 200
+    except Exception as e:
+        logger.error(f"Error comparing layout modes: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
     finally:
-        # Clean up temporary files
-        if os.path.exists(rubric_path):
-            os.remove(rubric_path)
-        if os.path.exists(test_script_path):
-            os.remove(test_script_path) 
\ No newline at end of file
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+def batch_result(index, filename, file_path, lang, profile, mode):
+    """OCR one file of a batch and describe the outcome as a JSON-serializable dict"""
+    start = time.perf_counter()
+    result = {'index': index, 'filename': filename}
+    try:
+        document = extract_document(file_path, lang=lang, profile=profile, mode=mode)
+        if document is None:
+            result['error'] = 'No text could be extracted'
+        else:
+            result.update({
+                'text': document['text'],
+                'pages': len(document['pages']),
+                'timings': document['timings'],
+                'confidence': document['confidence'],
+                'cached': document['cached']
+            })
+    except Exception as e:
+        logger.error(f"Error processing batch file {filename}: {str(e)}", exc_info=True)
+        result['error'] = str(e)
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    result['ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+@bp.route('/batch', methods=['POST'])
+def batch_extract():
+    """
+    OCR many uploaded files ('files') concurrently. The response is NDJSON:
+    one line per file, written as soon as that file finishes, so the
+    order of lines is the order of completion ('index' gives upload order).
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+
+    lang = requested_language()
+    profile = requested_profile()
+    mode = request.form.get('layout')
+
+    # Everything is saved before streaming starts; the request body is gone afterwards
+    accepted, rejected = [], []
+    for index, file in enumerate(files):
+        if not allowed_file(file):
+            rejected.append({'index': index, 'filename': file.filename, 'error': 'File type not allowed'})
+            continue
+        filename = secure_filename(f"batch_{uuid.uuid4().hex}_{file.filename}")
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        file.save(file_path)
+        accepted.append((index, file.filename, file_path))
+    logger.debug(f"Batch of {len(files)} files, {len(rejected)} rejected")
+
+    def generate():
+        for result in rejected:
+            yield json.dumps(result) + '\n'
+        if not accepted:
+            return
+        executor = ThreadPoolExecutor(max_workers=max(1, min(OCR_BATCH_WORKERS, len(accepted))))
+        try:
+            futures = [executor.submit(batch_result, index, filename, file_path, lang, profile, mode)
+                       for index, filename, file_path in accepted]
+            for future in as_completed(futures):
+                yield json.dumps(future.result()) + '\n'
+        finally:
+            # Client went away: drop queued files; running ones remove their own upload
+            executor.shutdown(wait=False, cancel_futures=True)
+            for _, _, file_path in accepted:
+                if os.path.exists(file_path):
+                    try:
+                        os.remove(file_path)
+                    except OSError:
+                        pass
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@bp.route('/ingest-zip', methods=['POST'])
+def ingest_zip():
+    """
+    Turn a ZIP of answer scripts ('test_scripts_zip') into submissions for
+    'exam_id', grading them when 'grade' is true. Members are read straight
+    from the upload; results stream as NDJSON: a plan line, one line per
+    student, then a summary line. An archive sent with a chunked upload is
+    named by 'upload_id' and its 'file_index' (default 0) instead.
+    """
+    upload_id = request.form.get('upload_id')
+    if 'test_scripts_zip' not in request.files and not upload_id:
+        return jsonify({'error': 'No test scripts ZIP provided'}), 400
+
+    exam_id = request.form.get('exam_id')
+    created_by = request.form.get('created_by')
+    if not exam_id or not created_by:
+        return jsonify({'error': 'exam_id and created_by are required'}), 400
+
+    spooled = None
+    if 'test_scripts_zip' in request.files:
+        stream = request.files['test_scripts_zip'].stream
+    else:
+        try:
+            spooled = stream = open(chunked_upload.get_spool().path(upload_id, int(request.form.get('file_index', 0))),
+                                    'rb')
+        except chunked_upload.UploadError as e:
+            return jsonify({'error': str(e), **e.details}), e.status
+    if not zipfile.is_zipfile(stream):
+        if spooled:
+            spooled.close()
+        return jsonify({'error': 'Not a ZIP archive'}), 400
+    stream.seek(0)
+
+    results = zip_ingest.ingest_archive(
+        stream,
+        exam_id=exam_id,
+        created_by=created_by,
+        lang=requested_language(),
+        profile=requested_profile(),
+        mode=request.form.get('layout'),
+        grade=request.form.get('grade', 'false').lower() == 'true',
+        strictness_level=int(request.form.get('strictness_level', 2))
+    )
+    try:
+        # Plan the archive before responding so an over-budget upload gets a plain error
+        first = next(results)
+    except (zip_ingest.ArchiveTooLargeError, zipfile.BadZipFile) as e:
+        if spooled:
+            spooled.close()
+        if isinstance(e, zip_ingest.ArchiveTooLargeError):
+            return jsonify({'error': str(e)}), 413
+        return jsonify({'error': f'Invalid ZIP archive: {str(e)}'}), 400
+
+    def generate():
+        try:
+            yield json.dumps(first) + '\n'
+            for result in results:
+                yield json.dumps(result) + '\n'
+        finally:
+            if spooled:
+                spooled.close()
+
+    # The upload stream must stay open while the archive is being read
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@bp.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a file for OCR and return its job id without waiting for the result"""
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+
+    file = request.files['file']
+    if not allowed_file(file):
+        return jsonify({'error': 'File type not allowed'}), 400
+
+    file_path = job_queue.store_upload(file, secure_filename(file.filename))
+    try:
+        job_id = job_queue.get_queue().submit(
+            file_path,
+            lang=requested_language(),
+            profile=requested_profile(),
+            mode=request.form.get('layout')
+        )
+    except job_queue.QueueFullError as e:
+        job_queue.remove_job_files(file_path)
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        job_queue.remove_job_files(file_path)
+        logger.error(f"Error queueing OCR job: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'job_id': job_id, 'status': job_queue.QUEUED}), 202
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Poll a job: its status, and the OCR result or error once finished"""
+    job = job_queue.get_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job), 200
+
+@bp.route('/jobs/stats', methods=['GET'])
+def job_stats():
+    """Report how many jobs are queued, running and finished"""
+    return jsonify(job_queue.get_queue().stats()), 200
+
+@bp.route('/uploads', methods=['POST'])
+def open_upload():
+    """
+    Open a chunked, resumable upload for files too large for one request.
+    JSON body: 'files' ([{'name', 'size', 'sha256'}]) and the usual OCR
+    fields ('exam_id', 'lang', 'profile', 'layout'). Files are then sent
+    with PUT /uploads/<upload_id>/files/<index>.
+    """
+    files = request_field('files') or []
+    for file in files:
+        name = str(file.get('name') or '') if isinstance(file, dict) else ''
+        ext = name.rsplit('.', 1)[1].lower() if '.' in name else ''
+        if ext not in ALLOWED_EXTENSIONS and ext != 'zip':
+            return jsonify({'error': f"File type not allowed: {name}"}), 400
+
+    try:
+        status = chunked_upload.get_spool().create(files, params={
+            'lang': requested_language(),
+            'profile': requested_profile(),
+            'mode': request_field('layout')
+        })
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+    return jsonify(status), 201
+
+@bp.route('/uploads/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Bytes received per file (where to resume) and the OCR jobs of complete files"""
+    try:
+        return jsonify(chunked_upload.get_spool().status(upload_id)), 200
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    chunked_upload.get_spool().remove(upload_id)
+    return '', 204
+
+def _queue_uploaded_file(spool, upload_id, status):
+    """Queue a file completed by a chunked upload for OCR; returns its status with the job id"""
+    mime = magic.from_file(status['path'], mime=True)
+    if mime not in ALLOWED_EXTENSIONS.values():
+        logger.warning(f"Uploaded {status['name']} is {mime}, not queued")
+        spool.finish(upload_id, status['index'], error='File type not allowed')
+        return {**status, 'error': 'File type not allowed'}
+
+    params = spool.status(upload_id)['params']
+    try:
+        job_id = job_queue.get_queue().submit(status['path'], **params)
+    except job_queue.QueueFullError as e:
+        # The file stays in the spool; it can still be sent to /jobs once the queue drains
+        spool.finish(upload_id, status['index'], error=str(e))
+        return {**status, 'error': str(e)}
+    spool.finish(upload_id, status['index'], job_id=job_id)
+    return {**status, 'job_id': job_id}
+
+@bp.route('/uploads/<upload_id>/files/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    """
+    Write one chunk of a file: the raw request body, starting at byte
+    'offset' (query parameter), checked against the 'X-Chunk-SHA256'
+    header. The chunk that completes a script file queues it for OCR, so
+    it is read while the other files are still uploading; a completed ZIP
+    is ingested with /ingest-zip and its 'upload_id'.
+    """
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset is required'}), 400
+
+    spool = chunked_upload.get_spool()
+    try:
+        status = spool.write_chunk(upload_id, index, offset, request.get_data(cache=False),
+                                   checksum=request.headers.get('X-Chunk-SHA256'))
+        if status['completed'] and not status['name'].lower().endswith('.zip'):
+            status = _queue_uploaded_file(spool, upload_id, status)
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+    status.pop('path', None)
+    return jsonify(status), 200
+
+@bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report OCR cache hit/miss counters for this worker"""
+    cache = get_cache()
+    if cache is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **cache.stats()}), 200
+
+@bp.route('/pipeline/stats', methods=['GET'])
+def pipeline_stats():
+    """Report how busy each stage of the page pipeline has been in this worker"""
+    return jsonify({
+        'enabled': ocr_extraction.OCR_PIPELINE,
+        'queue_size': page_pipeline.OCR_PIPELINE_QUEUE,
+        'workers': {'preprocess': ocr_extraction.OCR_PIPELINE_PREPROCESS_WORKERS,
+                    'ocr': ocr_extraction.OCR_PIPELINE_OCR_WORKERS},
+        'slots': ocr_extraction.OCR_PIPELINE_SLOTS,
+        **page_pipeline.metrics.stats()
+    }), 200
+
+@bp.route('/blank-pages/stats', methods=['GET'])
+def blank_page_stats():
+    """Report how many pages this worker skipped as blank and the OCR time that saved"""
+    return jsonify(blank_pages.metrics.stats()), 200
+
+@bp.route('/languages/stats', methods=['GET'])
+def language_stats():
+    """Report OCR throughput per language for this worker"""
+    return jsonify({
+        'default': ocr_languages.OCR_DEFAULT_LANGUAGE,
+        'preloaded': ocr_engine.preloaded_languages(),
+        'languages': ocr_languages.metrics.stats()
+    }), 200
+
+@bp.route('/cpu-budget', methods=['GET'])
+def cpu_budget_plan():
+    """Report how this worker shares the OCR CPU budget between processes and threads"""
+    return jsonify(cpu_budget.plan()), 200
+
+@bp.route('/rubrics/stats', methods=['GET'])
+def rubric_stats():
+    """Report how often rubric text was reused instead of being OCR'd or fetched again"""
+    return jsonify(rubric_store.get_store().stats()), 200
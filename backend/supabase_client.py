@@ -244,21 +244,47 @@ def get_exams(user_id=None):
         logger.error(f"Error fetching exams: {str(e)}")
         raise
 
-def create_exam(title, description, created_by, language='English'):
+def get_exam(exam_id):
+    """Get a single exam by ID, or None if it does not exist"""
+    try:
+        response = requests.get(
+            f"{SUPABASE_URL}/rest/v1/exams?id=eq.{exam_id}",
+            headers=headers
+        )
+        
+        if response.status_code != 200 or not response.json():
+            logger.info(f"No exam found for id: {exam_id}")
+            return None
+        
+        exam = response.json()[0]
+        if exam.get('language') is None:
+            exam['language'] = 'English'
+        return exam
+        
+    except Exception as e:
+        logger.error(f"Error getting exam: {str(e)}")
+        return None
+
+def create_exam(title, description, created_by, language='English', ocr_profile=None):
     """Create a new exam."""
     try:
         # Log the language being sent to Supabase
         logger.info(f"[supabase_client] Attempting to create exam with language: {language}")
 
+        exam_data = {
+            "title": title,
+            "description": description,
+            "created_by": created_by,
+            "language": language # Include the intended language
+        }
+        # Only send the OCR preprocessing profile when one was chosen
+        if ocr_profile:
+            exam_data["ocr_profile"] = ocr_profile
+
         response = requests.post(
             f"{SUPABASE_URL}/rest/v1/exams",
             headers={**headers, 'Prefer': 'return=representation'},
-            json={
-                "title": title,
-                "description": description,
-                "created_by": created_by,
-                "language": language # Include the intended language
-            }
+            json=exam_data
         )
         
         if response.status_code != 201:
@@ -323,8 +349,12 @@ def upload_rubric(file_name, file_type, file_size, preview, content, exam_id=Non
         logger.error(f"Error uploading rubric: {str(e)}")
         raise
 
-def get_rubric(exam_id):
-    """Get a rubric using Supabase REST API"""
+def get_rubric(exam_id, raise_errors=False):
+    """
+    Get a rubric using Supabase REST API, or None if the exam has none.
+    A failed request also returns None unless `raise_errors` is set, in
+    which case it raises so callers can tell it from a missing rubric.
+    """
     try:
         url = f"{SUPABASE_URL}/rest/v1/rubrics?exam_id=eq.{exam_id}"
         response = requests.get(url, headers=headers)
@@ -336,11 +366,30 @@ def get_rubric(exam_id):
             return None
         else:
             logger.error(f"Failed to get rubric: {response.text}")
+            if raise_errors:
+                raise Exception(f"Failed to get rubric: {response.text}")
             return None
     except Exception as e:
         logger.error(f"Get rubric error: {e}")
+        if raise_errors:
+            raise
         return None
 
+def update_rubric_preview(rubric_id, preview):
+    """Set the preview image URL of a rubric using Supabase REST API"""
+    try:
+        url = f"{SUPABASE_URL}/rest/v1/rubrics?id=eq.{rubric_id}"
+        response = requests.patch(url, headers=headers, json={"preview": preview})
+
+        if response.status_code in (200, 204):
+            return True
+        else:
+            logger.error(f"Failed to update rubric preview: {response.text}")
+            return False
+    except Exception as e:
+        logger.error(f"Update rubric preview error: {e}")
+        return False
+
 def create_submission(exam_id, student_name, student_id, script_file_name, created_by, extracted_text_script=None, extracted_text_rubric=None):
     """Create a submission using Supabase REST API"""
     try:
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from utils import adaptive_ocr
+
+def word(text, conf, x, y, line, block=1):
+    return {'text': text, 'conf': conf, 'box': (x, y, 40, 20), 'block': block, 'par': 1, 'line': line}
+
+PAGE_WORDS = [
+    word('Swali', 95, 10, 10, 1), word('la', 92, 60, 10, 1),
+    word('jbu', 30, 10, 50, 2), word('zuri', 88, 60, 50, 2),
+    word('Mwisho', 91, 10, 120, 1, block=2),
+]
+
+@pytest.fixture
+def fake_engine(monkeypatch):
+    """Full pages return PAGE_WORDS; line crops return one confident correction"""
+    calls = []
+
+    def image_to_data(image, lang):
+        calls.append(image.shape)
+        if image.shape[0] > 100:
+            return [dict(w) for w in PAGE_WORDS]
+        return [word('jibu', 90, 0, 0, 1), word('zuri', 89, 50, 0, 1)]
+
+    monkeypatch.setattr(adaptive_ocr.ocr_engine, 'image_to_data', image_to_data)
+    monkeypatch.setattr(adaptive_ocr, 'run_profile', lambda image, profile: (image, {}))
+    return calls
+
+def test_only_weak_lines_are_read_again(fake_engine):
+    page = np.full((300, 200), 255, dtype=np.uint8)
+    result = adaptive_ocr.two_pass_ocr(page, page, first_profile='fast', threshold=60)
+
+    assert result['text'] == 'Swali la\njibu zuri\n\nMwisho'
+    assert [region['pass'] for region in result['regions']] == [1, 2, 1]
+    assert len(fake_engine) == 2  # one page pass, one line crop
+    summary = result['confidence']
+    assert summary['first_pass_mean'] < summary['mean']
+    assert summary['regions_retried'] == 1 and summary['regions_improved'] == 1
+    assert summary['page_retried'] is False
+    assert 'second_pass' in result['timings']
+
+def test_heavy_first_pass_is_not_repeated(fake_engine):
+    page = np.full((300, 200), 255, dtype=np.uint8)
+    result = adaptive_ocr.two_pass_ocr(page, page, first_profile='max_quality', second_profile='max_quality')
+    assert len(fake_engine) == 1
+    assert result['confidence']['low_confidence_words'] == 1
+    assert result['confidence']['regions_retried'] == 0
+
+def test_mostly_poor_page_is_read_again_whole(fake_engine, monkeypatch):
+    monkeypatch.setattr(adaptive_ocr, 'OCR_PAGE_RETRY_RATIO', 0.2)
+    page = np.full((300, 200), 255, dtype=np.uint8)
+    result = adaptive_ocr.two_pass_ocr(page, page, first_profile='fast')
+    assert result['confidence']['page_retried'] is True
+    assert fake_engine == [(300, 200), (300, 200)]
+
+def test_regions_retried_counts_flagged_lines_on_a_page_retry(fake_engine, monkeypatch):
+    monkeypatch.setattr(adaptive_ocr, 'OCR_PAGE_RETRY_RATIO', 0.2)
+    page = np.full((300, 200), 255, dtype=np.uint8)
+    summary = adaptive_ocr.two_pass_ocr(page, page, first_profile='fast', threshold=60)['confidence']
+    assert summary['page_retried'] is True
+    assert summary['regions_retried'] == 1 and summary['lines'] == 3
+
+def handwritten_line(line, scores):
+    return [word(f"w{i}", conf, 50 * i, 30 * line, line) for i, conf in enumerate(scores)]
+
+# Word confidences typical of legible handwriting: most words in the 60s-80s,
+# with one or two badly scored words on nearly every line
+HANDWRITTEN_PAGE = [w for n, scores in enumerate([
+    [78, 64, 31, 82, 70], [66, 45, 71, 88], [90, 72, 18, 69, 75, 61], [58, 74, 80, 39],
+    [83, 67, 52, 77], [71, 28, 65, 79, 84], [62, 76, 44, 70], [35, 40, 52, 66],
+], 1) for w in handwritten_line(n, scores)]
+
+def test_handwriting_rarely_triggers_a_retry(monkeypatch):
+    reads = []
+
+    def image_to_data(image, lang):
+        reads.append(image.shape)
+        return [dict(w) for w in HANDWRITTEN_PAGE] if image.shape[0] > 100 else []
+
+    monkeypatch.setattr(adaptive_ocr.ocr_engine, 'image_to_data', image_to_data)
+    monkeypatch.setattr(adaptive_ocr, 'run_profile', lambda image, profile: (image, {}))
+    page = np.full((300, 400), 255, dtype=np.uint8)
+    summary = adaptive_ocr.two_pass_ocr(page, page, first_profile='fast', threshold=60)['confidence']
+    # Every line has a word below 60, but only the last one is weak overall
+    assert summary['page_retried'] is False
+    assert summary['regions_retried'] == 1
+    assert len(reads) == 2
+
+def test_document_summary_weights_pages_by_words():
+    pages = [
+        {'mean': 90.0, 'min': 80.0, 'words': 30, 'low_confidence_words': 0, 'regions_retried': 0,
+         'regions_improved': 0, 'page_retried': False},
+        {'mean': 60.0, 'min': 20.0, 'words': 10, 'low_confidence_words': 4, 'regions_retried': 2,
+         'regions_improved': 1, 'page_retried': False},
+        None,
+    ]
+    merged = adaptive_ocr.merge_summaries(pages)
+    assert merged['mean'] == 82.5 and merged['min'] == 20.0
+    assert merged['low_confidence_words'] == 4 and merged['regions_improved'] == 1
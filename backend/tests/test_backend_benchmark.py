@@ -0,0 +1,78 @@
+import numpy as np
+import cv2
+from utils import ocr_engine
+from utils import backend_benchmark
+
+class EchoBackend:
+    """Backend stand-in that 'reads' the page's width"""
+    name = 'echo'
+
+    def __init__(self, lang, tessdata_dir=None):
+        pass
+
+    @classmethod
+    def available(cls):
+        return True
+
+    @classmethod
+    def version(cls):
+        return 'test'
+
+    def image_to_string(self, image):
+        return f"width {image.shape[1]}"
+
+    def image_to_data(self, image):
+        return []
+
+    def close(self):
+        pass
+
+def test_load_corpus_pairs_pages_with_ground_truth(tmp_path):
+    cv2.imwrite(str(tmp_path / 'p1.png'), np.full((10, 30), 255, dtype=np.uint8))
+    (tmp_path / 'p1.txt').write_text('width 30', encoding='utf-8')
+    cv2.imwrite(str(tmp_path / 'p2.png'), np.full((10, 40), 255, dtype=np.uint8))
+    (tmp_path / 'notes.md').write_text('ignored')
+
+    pages = backend_benchmark.load_corpus(str(tmp_path))
+
+    assert [page['name'] for page in pages] == ['p1.png', 'p2.png']
+    assert pages[0]['reference'] == 'width 30'
+    assert pages[1]['reference'] is None
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert backend_benchmark.percentile(values, 50) == 50
+    assert backend_benchmark.percentile(values, 95) == 95
+    assert backend_benchmark.percentile([7], 95) == 7
+    assert backend_benchmark.percentile([], 50) is None
+
+def test_benchmark_reports_throughput_latency_and_accuracy(monkeypatch):
+    monkeypatch.setitem(ocr_engine.BACKENDS, 'echo', EchoBackend)
+    pages = [
+        {'name': 'a.png', 'image': np.full((20, 30), 255, dtype=np.uint8), 'reference': 'width 30'},
+        {'name': 'b.png', 'image': np.full((20, 40), 255, dtype=np.uint8), 'reference': 'width 99'},
+    ]
+
+    results = backend_benchmark.benchmark(pages, backends=['echo'], profile='fast', repeat=2, isolate=False)
+
+    result = results[0]
+    assert result['backend'] == 'echo' and result['engine'] == 'echo'
+    assert result['pages'] == 4
+    assert result['pages_per_sec'] > 0
+    assert result['p50_ms'] <= result['p95_ms']
+    # One exact page, one with two wrong characters out of eight
+    assert result['cer'] == round((0 + 2 / 8) / 2, 4)
+
+def test_failing_backend_is_reported_last(monkeypatch):
+    monkeypatch.setitem(ocr_engine.BACKENDS, 'echo', EchoBackend)
+
+    def broken(backend, pages, lang='swa', repeat=1):
+        if backend == 'broken':
+            raise RuntimeError('no model')
+        return {'backend': backend, 'pages_per_sec': 1.0, 'p95_ms': 1.0, 'cer': None}
+
+    monkeypatch.setattr(backend_benchmark, 'run_backend', broken)
+    pages = [{'name': 'a.png', 'image': np.full((20, 30), 255, dtype=np.uint8), 'reference': None}]
+    results = backend_benchmark.benchmark(pages, backends=['broken', 'echo'], isolate=False)
+    assert [r['backend'] for r in results] == ['echo', 'broken']
+    assert 'error' in results[1]
@@ -0,0 +1,58 @@
+import io
+import json
+import time
+import pytest
+from flask import Flask
+from PIL import Image
+
+@pytest.fixture
+def batch_client(tmp_path, monkeypatch):
+    from routes import ocr as ocr_routes
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.register_blueprint(ocr_routes.bp)
+    monkeypatch.setattr(ocr_routes, 'UPLOAD_FOLDER', str(tmp_path))
+    return app.test_client(), ocr_routes
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('L', (20, 20), color=255).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def test_batch_streams_one_line_per_file(batch_client, monkeypatch, tmp_path):
+    """Each file gets its own NDJSON line as soon as it finishes; slow files come last"""
+    client, ocr_routes = batch_client
+
+    def fake_extract_document(file_path, lang, profile, mode):
+        if 'slow' in file_path:
+            time.sleep(0.3)
+        if 'broken' in file_path:
+            return None
+        return {'text': f"text of {file_path.rsplit('_', 1)[-1]}", 'pages': [{}],
+                'timings': {'ocr': 1.0}, 'confidence': None, 'cached': False}
+
+    monkeypatch.setattr(ocr_routes, 'extract_document', fake_extract_document)
+    data = {'files': [
+        (io.BytesIO(png_bytes()), 'slow.png'),
+        (io.BytesIO(png_bytes()), 'fast.png'),
+        (io.BytesIO(png_bytes()), 'broken.png'),
+        (io.BytesIO(b'not an image'), 'notes.txt'),
+    ]}
+    response = client.post('/api/ocr/batch', data=data, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 4
+    by_index = {line['index']: line for line in lines}
+    assert by_index[0]['text'] == 'text of slow.png'
+    assert by_index[1]['text'] == 'text of fast.png'
+    assert 'error' in by_index[2] and 'error' in by_index[3]
+    assert lines[-1]['index'] == 0
+    # Uploads are removed once processed
+    assert list(tmp_path.iterdir()) == []
+
+def test_batch_requires_files(batch_client):
+    client, _ = batch_client
+    response = client.post('/api/ocr/batch', data={})
+    assert response.status_code == 400
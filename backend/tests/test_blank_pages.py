@@ -0,0 +1,79 @@
+import io
+import cv2
+import numpy as np
+from PIL import Image
+from utils import blank_pages
+from utils import ocr_corpus
+from utils import ocr_engine
+from utils import ocr_extraction
+from utils import adaptive_ocr
+from utils import page_normalization
+
+def blank_page():
+    return np.full((2200, 1700), 255, dtype=np.uint8)
+
+def test_written_pages_are_not_blank():
+    manifest = ocr_corpus.load_manifest()
+    for entry in manifest['pages']:
+        page = ocr_corpus.build_page(entry, manifest)
+        assert not blank_pages.classify(page)['blank'], entry
+
+def test_blank_and_photographed_blank_pages_are_blank():
+    assert blank_pages.classify(blank_page())['blank']
+    assert blank_pages.classify(ocr_corpus.degrade_page(blank_page(), seed=3))['blank']
+    # Shading and a dark scanner edge are not ink
+    ys, xs = np.mgrid[0:2200, 0:1700]
+    shaded = (255 - 80 * xs / 1700).astype(np.uint8)
+    shaded[:40] = 20
+    assert blank_pages.classify(shaded)['blank']
+
+def test_a_single_short_answer_is_not_blank():
+    for text in ('5', 'ok'):
+        assert not blank_pages.classify(ocr_corpus.render_page(text))['blank'], text
+
+def test_sparse_light_pencil_answers_are_not_blank():
+    # 300dpi A4 on off-white paper: (text, stroke width, pencil gray)
+    for text, thickness, gray in (('42', 1, 160), ('T', 3, 195), ('yes', 1, 180), ('x', 1, 200), ('7', 2, 210)):
+        page = np.full((3508, 2480), 245, dtype=np.uint8)
+        cv2.putText(page, text, (900, 1500), cv2.FONT_HERSHEY_SIMPLEX, 1.2, gray, thickness, cv2.LINE_AA)
+        assert not blank_pages.classify(page)['blank'], text
+        # Also once photographed
+        assert not blank_pages.classify(ocr_corpus.degrade_page(page, seed=1))['blank'], text
+
+def test_photographed_blank_a4_is_blank():
+    assert blank_pages.classify(ocr_corpus.degrade_page(np.full((3508, 2480), 245, dtype=np.uint8), seed=2))['blank']
+
+def test_summarize_estimates_saved_time():
+    pages = [
+        {'page': 1, 'source': 'ocr', 'timings': {'decode': 5.0, 'blank_check': 2.0, 'threshold': 30.0, 'ocr': 170.0}},
+        {'page': 2, 'source': 'blank', 'timings': {'blank_check': 2.0}},
+        {'page': 3, 'source': 'blank', 'timings': {'blank_check': 2.0}},
+        {'page': 4, 'source': 'text_layer', 'timings': {}}
+    ]
+    assert blank_pages.summarize(pages) == {'skipped_pages': [2, 3], 'ocr_ms_saved': 400.0}
+    assert blank_pages.summarize(pages[:1]) == {'skipped_pages': [], 'ocr_ms_saved': 0.0}
+
+def test_blank_frames_skip_ocr(monkeypatch):
+    read = []
+
+    def fake_image_to_string(image, lang='swa', **kwargs):
+        read.append(image.shape)
+        return 'Jibu'
+
+    monkeypatch.setattr(ocr_engine, 'image_to_string', fake_image_to_string)
+    monkeypatch.setattr(adaptive_ocr, 'OCR_TWO_PASS', False)
+    monkeypatch.setattr(page_normalization, 'OCR_NORMALIZE_RESOLUTION', False)
+    monkeypatch.setattr(page_normalization, 'OCR_NORMALIZE_GEOMETRY', False)
+    frames = [Image.fromarray(page) for page in
+              (blank_page(), ocr_corpus.render_page('Jibu: Nairobi ni mji mkuu'), blank_page())]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format='TIFF', save_all=True, append_images=frames[1:])
+
+    document = ocr_extraction.extract_document_bytes(buffer.getvalue(), 'booklet.tiff', use_cache=False,
+                                                     mode='page')
+    assert len(read) == 1
+    assert [page['source'] for page in document['pages']] == ['blank', 'ocr', 'blank']
+    assert document['text'] == 'Jibu'
+    assert document['skipped_pages'] == [1, 3]
+    assert document['ocr_ms_saved'] > 0
+    assert blank_pages.metrics.stats()['blank'] >= 2
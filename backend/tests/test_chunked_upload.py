@@ -0,0 +1,139 @@
+import io
+import hashlib
+import pytest
+from flask import Flask
+from PIL import Image
+from utils import chunked_upload
+from utils.chunked_upload import UploadSpool, UploadError
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+def open_session(spool, data, checksum=True):
+    return spool.create([{'name': 'scripts.pdf', 'size': len(data), 'sha256': sha256(data) if checksum else None}])
+
+def test_file_is_complete_once_every_chunk_is_in(tmp_path):
+    spool = UploadSpool(str(tmp_path), chunk_size=4)
+    data = b'0123456789'
+    upload_id = open_session(spool, data)['upload_id']
+
+    assert spool.write_chunk(upload_id, 0, 0, data[:4], sha256(data[:4]))['received'] == 4
+    assert spool.write_chunk(upload_id, 0, 4, data[4:8])['received'] == 8
+    status = spool.write_chunk(upload_id, 0, 8, data[8:])
+    assert status['completed'] and status['complete']
+    with open(spool.path(upload_id, 0), 'rb') as f:
+        assert f.read() == data
+    assert spool.status(upload_id)['complete']
+
+def test_resume_after_a_failure(tmp_path):
+    spool = UploadSpool(str(tmp_path), chunk_size=4)
+    data = b'0123456789'
+    upload_id = open_session(spool, data)['upload_id']
+    spool.write_chunk(upload_id, 0, 0, data[:4])
+
+    # A chunk past the received bytes would leave a gap
+    with pytest.raises(UploadError) as error:
+        spool.write_chunk(upload_id, 0, 8, data[8:])
+    assert error.value.status == 409 and error.value.details['received'] == 4
+
+    # The client asks where to resume; resending a chunk it is unsure about is harmless
+    assert spool.status(upload_id)['files'][0]['received'] == 4
+    spool.write_chunk(upload_id, 0, 0, data[:4])
+    spool.write_chunk(upload_id, 0, 4, data[4:8])
+    assert spool.write_chunk(upload_id, 0, 8, data[8:])['completed']
+    with open(spool.path(upload_id, 0), 'rb') as f:
+        assert f.read() == data
+
+def test_checksums_are_verified(tmp_path):
+    spool = UploadSpool(str(tmp_path), chunk_size=8)
+    data = b'01234567'
+    upload_id = spool.create([{'name': 'a.pdf', 'size': 8, 'sha256': sha256(b'something else')}])['upload_id']
+
+    with pytest.raises(UploadError) as error:
+        spool.write_chunk(upload_id, 0, 0, data, checksum=sha256(b'corrupted'))
+    assert error.value.status == 422
+    assert spool.status(upload_id)['files'][0]['received'] == 0
+
+    # The whole file does not match: it has to be sent again
+    with pytest.raises(UploadError) as error:
+        spool.write_chunk(upload_id, 0, 0, data)
+    assert error.value.status == 422 and error.value.details['received'] == 0
+    assert not spool.status(upload_id)['files'][0]['complete']
+
+def test_limits(tmp_path):
+    spool = UploadSpool(str(tmp_path), chunk_size=4, max_bytes=100)
+    with pytest.raises(UploadError) as error:
+        spool.create([{'name': 'big.zip', 'size': 101}])
+    assert error.value.status == 413
+    upload_id = spool.create([{'name': 'a.pdf', 'size': 6}])['upload_id']
+    with pytest.raises(UploadError):
+        spool.write_chunk(upload_id, 0, 0, b'12345')  # larger than a chunk
+    spool.write_chunk(upload_id, 0, 0, b'1234')
+    with pytest.raises(UploadError):
+        spool.write_chunk(upload_id, 0, 4, b'567')  # past the declared size
+    with pytest.raises(UploadError) as error:
+        spool.status('../etc')
+    assert error.value.status == 404
+
+def test_expired_sessions_are_removed(tmp_path):
+    spool = UploadSpool(str(tmp_path), ttl=-1)
+    upload_id = spool.create([{'name': 'a.pdf', 'size': 1}])['upload_id']
+    assert spool.expire() == 1
+    with pytest.raises(UploadError):
+        spool.status(upload_id)
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('L', (200, 200), color=255).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def test_completed_files_are_queued_while_others_upload(tmp_path, monkeypatch):
+    from routes import ocr as ocr_routes
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.register_blueprint(ocr_routes.bp)
+    client = app.test_client()
+
+    monkeypatch.setattr(chunked_upload, '_spool', UploadSpool(str(tmp_path), chunk_size=256))
+    submitted = []
+
+    class FakeQueue:
+        def submit(self, file_path, **params):
+            submitted.append((file_path, params))
+            return f"job-{len(submitted)}"
+
+    monkeypatch.setattr(ocr_routes.job_queue, 'get_queue', lambda: FakeQueue())
+    first, second = png_bytes(), png_bytes() + b'\0'
+    response = client.post('/api/ocr/uploads', json={
+        'files': [{'name': 'p1.png', 'size': len(first), 'sha256': sha256(first)},
+                  {'name': 'p2.png', 'size': len(second)}],
+        'lang': 'eng'
+    })
+    assert response.status_code == 201
+    upload_id = response.get_json()['upload_id']
+    url = f"/api/ocr/uploads/{upload_id}/files"
+
+    for offset in range(0, len(first), 256):
+        chunk = first[offset:offset + 256]
+        response = client.put(f"{url}/0?offset={offset}", data=chunk, headers={'X-Chunk-SHA256': sha256(chunk)})
+        assert response.status_code == 200
+    assert response.get_json()['job_id'] == 'job-1'
+    assert 'path' not in response.get_json()
+    assert submitted[0][1]['lang'] == 'eng'
+
+    # The first file is being OCR'd while the second is still arriving
+    client.put(f"{url}/1?offset=0", data=second[:256])
+    status = client.get(f"/api/ocr/uploads/{upload_id}").get_json()
+    assert [(f['complete'], f.get('job_id'), f['received']) for f in status['files']] == [
+        (True, 'job-1', len(first)), (False, None, 256)]
+
+    response = client.put(f"{url}/1?offset=512", data=second[512:])
+    assert response.status_code == 409 and response.get_json()['received'] == 256
+
+def test_uploads_only_accept_script_and_archive_files(tmp_path, monkeypatch):
+    from routes import ocr as ocr_routes
+    app = Flask(__name__)
+    app.register_blueprint(ocr_routes.bp)
+    monkeypatch.setattr(chunked_upload, '_spool', UploadSpool(str(tmp_path)))
+    response = app.test_client().post('/api/ocr/uploads', json={'files': [{'name': 'run.exe', 'size': 10}]})
+    assert response.status_code == 400
@@ -0,0 +1,46 @@
+import os
+import cv2
+from utils import cpu_budget
+
+def test_budget_is_split_between_web_workers(monkeypatch):
+    monkeypatch.setattr(cpu_budget, 'OCR_CPU_BUDGET', 16)
+    monkeypatch.setattr(cpu_budget, 'OCR_WEB_WORKERS', 4)
+    monkeypatch.delenv('OCR_PDF_WORKERS', raising=False)
+    monkeypatch.delenv('OCR_THREADS_PER_TASK', raising=False)
+    assert cpu_budget.worker_cores() == 4
+    assert cpu_budget.page_processes() == 3
+    # 3 page processes + the worker's own OCR share 4 cores
+    assert cpu_budget.thread_limit() == 1
+
+def test_fewer_processes_get_more_threads(monkeypatch):
+    monkeypatch.setattr(cpu_budget, 'OCR_CPU_BUDGET', 8)
+    monkeypatch.setattr(cpu_budget, 'OCR_WEB_WORKERS', 1)
+    monkeypatch.setenv('OCR_PDF_WORKERS', '1')
+    monkeypatch.delenv('OCR_THREADS_PER_TASK', raising=False)
+    assert cpu_budget.thread_limit() == 4
+    monkeypatch.setenv('OCR_THREADS_PER_TASK', '2')
+    assert cpu_budget.thread_limit() == 2
+
+def test_apply_thread_limits(monkeypatch):
+    monkeypatch.setenv('OMP_THREAD_LIMIT', '99')
+    previous = cv2.getNumThreads()
+    try:
+        assert cpu_budget.apply_thread_limits(2) == 2
+        assert os.environ['OMP_THREAD_LIMIT'] == '2'
+        assert cv2.getNumThreads() == 2
+    finally:
+        cv2.setNumThreads(previous)
+
+def test_candidate_settings_do_not_oversubscribe_past_twice_the_cores():
+    settings = cpu_budget.candidate_settings(6)
+    assert (1, 1) in settings and (6, 1) in settings and (2, 4) in settings
+    assert all(processes * threads <= 12 for processes, threads in settings)
+    assert (4, 4) not in settings
+
+def test_plan_reports_the_allocation(monkeypatch):
+    monkeypatch.setattr(cpu_budget, 'OCR_CPU_BUDGET', 4)
+    monkeypatch.setattr(cpu_budget, 'OCR_WEB_WORKERS', 2)
+    monkeypatch.delenv('OCR_PDF_WORKERS', raising=False)
+    plan = cpu_budget.plan()
+    assert plan['worker_cores'] == 2
+    assert plan['page_processes'] == 1
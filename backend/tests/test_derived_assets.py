@@ -0,0 +1,87 @@
+import io
+import pytest
+from PIL import Image
+from utils import derived_assets
+from utils.derived_assets import AssetStore
+
+def image_bytes(sizes, image_format='PNG'):
+    frames = [Image.new('RGB', size, color=(200, 200, 200)) for size in sizes]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format=image_format, save_all=len(frames) > 1, append_images=frames[1:])
+    return buffer.getvalue()
+
+def test_preview_and_thumbnails_are_downscaled(tmp_path):
+    store = AssetStore(str(tmp_path))
+    manifest = store.render(image_bytes([(3000, 4000)]))
+    assert manifest['pages'] == 1
+    source, preview = manifest['preview'].split('/')[-2:]
+    with Image.open(store.path(source, preview)) as image:
+        assert image.size == (derived_assets.ASSET_PREVIEW_WIDTH, 1365)
+    with Image.open(store.path(source, manifest['thumbnails'][0].split('/')[-1])) as image:
+        assert image.width == derived_assets.ASSET_THUMBNAIL_WIDTH
+
+def test_every_page_gets_a_thumbnail(tmp_path):
+    store = AssetStore(str(tmp_path))
+    manifest = store.render(image_bytes([(600, 800)] * 3, 'TIFF'))
+    assert manifest['pages'] == 3
+    assert [url.split('/')[-1] for url in manifest['thumbnails']] == [
+        f"page-{n}-w{derived_assets.ASSET_THUMBNAIL_WIDTH}-v{derived_assets.ASSET_FORMAT_VERSION}.jpg"
+        for n in (1, 2, 3)]
+
+def test_same_file_is_rendered_once(tmp_path):
+    store = AssetStore(str(tmp_path))
+    data = image_bytes([(400, 300)])
+    first = store.render(data)
+    assert store.render(data) == first
+    assert store.stats()['generated'] == 1 and store.stats()['reused'] == 1
+    assert store.manifest_for_url(first['preview']) == first
+
+def test_only_asset_names_resolve(tmp_path):
+    store = AssetStore(str(tmp_path))
+    manifest = store.render(image_bytes([(400, 300)]))
+    assert store.path(manifest['source'], '../../etc/passwd') is None
+    assert store.path('not-a-hash', 'manifest.json') is None
+    assert store.manifest_for_url('https://example.com/rubric.png') is None
+
+def test_rubric_assets_are_recorded_on_the_rubric(tmp_path, monkeypatch):
+    monkeypatch.setattr(derived_assets, '_store', AssetStore(str(tmp_path)))
+    monkeypatch.setattr(derived_assets, 'download', lambda url: image_bytes([(400, 300)]))
+    updates = []
+    monkeypatch.setattr(derived_assets.supabase_client, 'update_rubric_preview',
+                        lambda rubric_id, preview: updates.append((rubric_id, preview)))
+    url = f"{derived_assets.supabase_client.SUPABASE_URL}/storage/v1/object/public/rubrics/rubric.png"
+    manifest = derived_assets.schedule(7, url).result()
+    assert updates == [(7, manifest['preview'])]
+
+def test_rubric_urls_off_supabase_storage_are_never_fetched(monkeypatch):
+    fetched = []
+    monkeypatch.setattr(derived_assets.requests, 'get', lambda url, **kwargs: fetched.append(url))
+    storage = derived_assets.supabase_client.SUPABASE_URL
+    for url in ('https://example.com/storage/v1/object/public/rubric.png',
+                'http://169.254.169.254/latest/meta-data/',
+                storage.replace('https://', 'http://') + '/storage/v1/object/public/rubric.png',
+                storage + ':8443/storage/v1/object/public/rubric.png',
+                storage + '/rest/v1/users',
+                'https://user@' + storage[len('https://'):] + '/storage/v1/object/public/rubric.png'):
+        assert not derived_assets.is_allowed_source(url), url
+        assert derived_assets.schedule(7, url) is None
+        with pytest.raises(ValueError):
+            derived_assets.download(url)
+    assert fetched == []
+    assert derived_assets.is_allowed_source(storage + '/storage/v1/object/public/rubrics/rubric.png')
+
+def test_assets_are_served_with_long_cache_headers(tmp_path, monkeypatch):
+    import app as app_module
+    store = AssetStore(str(tmp_path))
+    monkeypatch.setattr(derived_assets, '_store', store)
+    manifest = store.render(image_bytes([(400, 300)]))
+    client = app_module.app.test_client()
+
+    response = client.get(manifest['preview'])
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert f"max-age={derived_assets.ASSET_MAX_AGE}" in response.headers['Cache-Control']
+    revalidated = client.get(manifest['preview'], headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert client.get(f"/api/assets/{manifest['source']}/missing.jpg").status_code == 404
@@ -0,0 +1,113 @@
+import io
+import numpy as np
+from PIL import Image
+from utils import image_ingest
+
+def encode(image, image_format):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+def test_color_upload_decodes_straight_to_gray():
+    data = encode(Image.new('RGB', (300, 200), color=(200, 100, 50)), 'PNG')
+    stats = image_ingest.new_ingest_stats()
+    gray, scale = image_ingest.decode_image_gray(data, stats=stats)
+    assert gray.shape == (200, 300) and gray.dtype == np.uint8
+    assert scale == 1.0
+    # Only the decoded gray frame is allocated, never a 3-channel one
+    assert stats == {'upload_bytes': 0, 'decoded_bytes': 300 * 200, 'bytes_copied': 300 * 200, 'buffers': 1}
+
+def test_large_jpeg_is_decoded_reduced():
+    data = encode(Image.new('RGB', (4000, 3000), color=(200, 200, 200)), 'JPEG')
+    gray, scale = image_ingest.decode_image_gray(data, max_pixels=2_000_000)
+    assert scale == 0.5
+    assert gray.shape == (1500, 2000)
+
+def test_upload_is_read_once():
+    data = encode(Image.new('L', (40, 30), color=255), 'PNG')
+    upload = io.BytesIO(data)
+    upload.read(10)  # e.g. a MIME sniff that did not rewind
+    stats = image_ingest.new_ingest_stats()
+    assert image_ingest.read_upload(upload, stats=stats) == data
+    assert stats['upload_bytes'] == len(data) and stats['buffers'] == 1
+
+def test_in_memory_document_reports_copies(monkeypatch):
+    from utils import ocr_extraction
+    monkeypatch.setattr(ocr_extraction, 'ocr_page',
+                        lambda page, lang, profile, scale, mode: {'text': f"{page.shape}", 'timings': {},
+                                                                 'scale': scale, 'geometry': None, 'blocks': 1,
+                                                                 'confidence': None, 'regions': None})
+    data = encode(Image.new('RGB', (64, 48), color=(10, 20, 30)), 'JPEG')
+    stats = image_ingest.new_ingest_stats()
+    document = ocr_extraction.extract_document_bytes(data, 'script.jpg', use_cache=False, ingest_stats=stats)
+    assert document['text'] == '(48, 64)'
+    assert stats['decoded_bytes'] == 64 * 48
+
+def multi_frame_tiff(sizes):
+    buffer = io.BytesIO()
+    frames = [Image.new('RGB', size, color=(i * 40, 80, 120)) for i, size in enumerate(sizes)]
+    frames[0].save(buffer, format='TIFF', save_all=True, append_images=frames[1:])
+    return buffer.getvalue()
+
+def test_tiff_frames_are_decoded_one_at_a_time():
+    data = multi_frame_tiff([(30, 20), (40, 30), (50, 40)])
+    stats = image_ingest.new_ingest_stats()
+    frames = image_ingest.iter_frames_gray(data, stats=stats)
+    number, gray = next(frames)
+    assert (number, gray.shape) == (1, (20, 30))
+    # Nothing past the first frame has been decoded yet
+    assert stats['decoded_bytes'] == 30 * 20
+    assert [(n, g.shape) for n, g in frames] == [(2, (30, 40)), (3, (40, 50))]
+    assert stats['buffers'] == 3
+
+def test_frame_formats():
+    assert image_ingest.is_frame_format('scan.TIFF')
+    assert image_ingest.is_frame_format('photo.webp')
+    assert not image_ingest.is_frame_format('page.png')
+
+def test_multi_page_tiff_is_ocrd_frame_by_frame(monkeypatch):
+    from utils import ocr_extraction
+    seen = []
+
+    def fake_ocr_page(page, lang, profile, scale=1.0, mode=None):
+        seen.append(page.shape)
+        return {'text': f"{page.shape}", 'timings': {'ocr': 1.0}, 'scale': scale, 'geometry': None,
+                'blocks': 1, 'confidence': None, 'regions': None}
+
+    monkeypatch.setattr(ocr_extraction, 'OCR_PIPELINE', False)
+    monkeypatch.setattr(ocr_extraction, 'ocr_page', fake_ocr_page)
+    data = multi_frame_tiff([(30, 20), (40, 30)])
+    document = ocr_extraction.extract_document_bytes(data, 'scans.tiff', use_cache=False)
+    assert [page['page'] for page in document['pages']] == [1, 2]
+    assert document['text'] == '(20, 30)\n(30, 40)'
+    assert seen == [(20, 30), (30, 40)]
+    assert 'decode' in document['pages'][0]['timings']
+
+def exif_jpeg(size, orientation):
+    """A JPEG with a dark top-left quadrant and the given EXIF Orientation"""
+    image = Image.new('L', size, color=230)
+    image.paste(20, (0, 0, size[0] // 2, size[1] // 2))
+    exif = Image.Exif()
+    exif[image_ingest.EXIF_ORIENTATION] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', exif=exif.tobytes())
+    return buffer.getvalue()
+
+def test_exif_orientation_is_applied_alike_on_both_paths():
+    from PIL import ImageOps
+    for orientation in range(1, 9):
+        data = exif_jpeg((400, 200), orientation)
+        decoded, decoded_scale = image_ingest.decode_image_gray(data)
+        loaded, loaded_scale = image_ingest.load_image_gray(io.BytesIO(data))
+        expected = np.asarray(ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert('L'))
+        assert decoded_scale == loaded_scale == 1.0, orientation
+        assert decoded.shape == loaded.shape == expected.shape, orientation
+        assert np.abs(decoded.astype(int) - expected).max() < 8, orientation
+        assert np.abs(loaded.astype(int) - expected).max() < 8, orientation
+
+def test_reduced_decode_of_rotated_jpeg_keeps_scale():
+    data = exif_jpeg((4000, 2000), 6)
+    decoded, decoded_scale = image_ingest.decode_image_gray(data, max_pixels=1_000_000)
+    loaded, loaded_scale = image_ingest.load_image_gray(io.BytesIO(data), max_pixels=1_000_000)
+    assert decoded_scale == loaded_scale == 0.5
+    assert decoded.shape == loaded.shape == (2000, 1000)
@@ -0,0 +1,110 @@
+import threading
+import time
+import pytest
+from utils import job_queue
+from utils.job_queue import JobQueue, QueueFullError
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(db_path=str(tmp_path / 'jobs.sqlite3'), max_depth=2, max_attempts=2, retry_delay=0, lease=60)
+
+def test_job_lifecycle(queue, tmp_path):
+    upload = tmp_path / 'script.png'
+    upload.write_bytes(b'png')
+    job_id = queue.submit(str(upload), lang='swa', profile='fast')
+    assert queue.get(job_id)['status'] == 'queued'
+
+    job = queue.claim()
+    assert job['id'] == job_id and job['params'] == {'lang': 'swa', 'profile': 'fast'}
+    assert queue.claim() is None
+    assert queue.get(job_id)['status'] == 'running'
+
+    assert queue.complete(job, {'text': 'jibu'})
+    job = queue.get(job_id)
+    assert job['status'] == 'done' and job['result'] == {'text': 'jibu'}
+    assert not upload.exists()
+
+def test_failed_jobs_are_retried_then_given_up(queue):
+    job_id = queue.submit('missing.png')
+    queue.fail(queue.claim(), 'boom')
+    assert queue.get(job_id)['status'] == 'queued'
+
+    queue.fail(queue.claim(), 'boom again')
+    job = queue.get(job_id)
+    assert job['status'] == 'failed' and job['attempts'] == 2 and job['error'] == 'boom again'
+    assert queue.claim() is None
+
+def test_queue_depth_is_bounded(queue):
+    queue.submit('a.png')
+    queue.submit('b.png')
+    with pytest.raises(QueueFullError):
+        queue.submit('c.png')
+
+def test_abandoned_jobs_are_reclaimed(queue):
+    queue.lease = 0
+    job_id = queue.submit('a.png')
+    queue.claim()
+    time.sleep(0.01)
+    job = queue.claim()
+    assert job['id'] == job_id and job['attempts'] == 2
+
+def test_only_the_current_lease_records_the_outcome(queue, tmp_path):
+    upload = tmp_path / 'job' / 'script.png'
+    upload.parent.mkdir()
+    upload.write_bytes(b'png')
+    queue.lease = 0
+    job_id = queue.submit(str(upload))
+    overran = queue.claim()
+    time.sleep(0.01)
+    current = queue.claim()
+    assert current['id'] == job_id
+
+    # The first run finishing late neither overwrites the job nor deletes the upload in use
+    assert not queue.complete(overran, {'text': 'old'})
+    assert not queue.fail(overran, 'late error')
+    assert queue.get(job_id)['status'] == 'running'
+    assert upload.exists()
+
+    assert queue.complete(current, {'text': 'new'})
+    assert queue.get(job_id)['result'] == {'text': 'new'}
+    assert not queue.complete(current, {'text': 'again'})
+
+def test_finished_jobs_expire(queue):
+    queue.ttl = 0
+    job_id = queue.submit('a.png')
+    queue.complete(queue.claim(), {})
+    time.sleep(0.01)
+    assert queue.expire() == 1
+    assert queue.get(job_id) is None
+
+def test_worker_processes_jobs(queue):
+    stop = threading.Event()
+    job_id = queue.submit('a.png', lang='eng')
+    worker = threading.Thread(target=job_queue.work, args=(queue, stop),
+                              kwargs={'handler': lambda job: {'lang': job['params']['lang']}, 'poll_interval': 0.01})
+    worker.start()
+    try:
+        for _ in range(200):
+            if queue.get(job_id)['status'] == 'done':
+                break
+            time.sleep(0.01)
+    finally:
+        stop.set()
+        worker.join()
+    assert queue.get(job_id)['result'] == {'lang': 'eng'}
+
+def test_concurrent_callers_start_one_set_of_workers(queue, monkeypatch):
+    started = []
+    monkeypatch.setattr(job_queue, '_queue', queue)
+    monkeypatch.setattr(job_queue, '_workers', [])
+    monkeypatch.setattr(job_queue, '_stop_event', threading.Event())
+    monkeypatch.setattr(job_queue, 'work', lambda queue, stop: started.append(1) or stop.wait())
+    callers = [threading.Thread(target=job_queue.start_workers, args=(2,)) for _ in range(8)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    try:
+        assert len(job_queue._workers) == 2
+    finally:
+        job_queue._stop_event.set()
@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+from utils import layout
+from utils.text_metrics import character_error_rate, word_error_rate
+
+def render_two_column_page():
+    """Two paragraphs side by side followed by a full-width paragraph below"""
+    page = np.full((1400, 1200), 235, dtype=np.uint8)
+    for line in range(5):
+        cv2.putText(page, 'Swali la kwanza jibu', (40, 80 + line * 45), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 20, 2)
+        cv2.putText(page, 'Swali la pili jibu', (700, 80 + line * 45), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 20, 2)
+    for line in range(5):
+        cv2.putText(page, 'Hitimisho la mtihani huu ni kama ifuatavyo', (40, 800 + line * 45),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, 20, 2)
+    return page
+
+def test_blocks_are_found_in_reading_order():
+    boxes = layout.find_text_blocks(render_two_column_page())
+    assert len(boxes) == 3
+    left, right, bottom = boxes
+    assert left[0] < 100 and right[0] > 600
+    assert bottom[1] > 700 and bottom[3] > 200
+
+def test_blank_page_has_no_blocks():
+    assert layout.find_text_blocks(np.full((800, 600), 240, dtype=np.uint8)) == []
+
+def test_reading_order_rows_then_columns():
+    boxes = [(500, 12, 100, 40), (10, 300, 600, 50), (10, 10, 100, 40)]
+    assert layout.reading_order(boxes) == [(10, 10, 100, 40), (500, 12, 100, 40), (10, 300, 600, 50)]
+
+def test_blocks_are_ocrd_concurrently_and_reassembled(monkeypatch):
+    """Block texts come back in box order, whatever order the threads finish in"""
+    page = render_two_column_page()
+    boxes = layout.find_text_blocks(page)
+    monkeypatch.setattr(layout, 'OCR_LAYOUT_WORKERS', 3)
+    monkeypatch.setattr(layout.ocr_engine, 'image_to_string',
+                        lambda image, lang: f"block {image.shape[1] - 2 * layout.BLOCK_PADDING}\n")
+
+    texts = layout.ocr_blocks(page, boxes)
+    assert texts == [f"block {w}\n" for _, _, w, _ in boxes]
+    assert layout.join_blocks(texts + ['  ']) == '\n'.join(f"block {w}" for _, _, w, _ in boxes)
+
+def test_unknown_mode_falls_back_to_default():
+    assert layout.resolve_mode('columns') == layout.OCR_LAYOUT_MODE
+    assert layout.resolve_mode('blocks') == 'blocks'
+
+def test_error_rates():
+    assert character_error_rate('jibu  zuri\n', 'jibu zuri') == 0.0
+    assert character_error_rate('jibo zuri', 'jibu zuri') == round(1 / 9, 4)
+    assert word_error_rate('jibo zuri sana', 'jibu zuri') == 1.0
@@ -77,4 +77,124 @@ def test_pdf_handling(sample_rubric_path):
     assert text is not None
     assert isinstance(text, str)
     assert len(text.strip()) > 0
-    print(f"Extracted text from PDF: {text}") 
\ No newline at end of file
+    print(f"Extracted text from PDF: {text}") 
+
+
+def test_iter_pdf_pages_renders_in_windows(monkeypatch):
+    """Pages are rendered in first_page/last_page windows, never all at once"""
+    from PIL import Image
+    from utils import ocr_extraction
+    rendered = []
+
+    def fake_convert(path, dpi, first_page, last_page, grayscale):
+        rendered.append((first_page, last_page))
+        return [Image.new('L', (20, 20), color=n) for n in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(ocr_extraction.pdf2image, 'pdfinfo_from_path', lambda path: {'Pages': 5})
+    monkeypatch.setattr(ocr_extraction.pdf2image, 'convert_from_path', fake_convert)
+
+    pages = ocr_extraction.iter_pdf_pages('booklet.pdf', window=2)
+    first_number, first = next(pages)
+    assert rendered == [(1, 2)]
+    assert first_number == 1
+    assert first.shape == (20, 20)
+
+    rest = list(pages)
+    assert rendered == [(1, 2), (3, 4), (5, 5)]
+    assert [int(page[0, 0]) for _, page in [(first_number, first)] + rest] == [1, 2, 3, 4, 5]
+
+def test_iter_pdf_text_keeps_page_order(monkeypatch):
+    """Extracted text is yielded page by page in document order"""
+    from utils import ocr_extraction
+    pages = [np.full((10, 10), n, dtype=np.uint8) for n in range(4)]
+
+    monkeypatch.setattr(ocr_extraction, 'OCR_PDF_WORKERS', 1)
+    monkeypatch.setattr(ocr_extraction, 'OCR_PIPELINE', False)
+    monkeypatch.setattr(ocr_extraction, 'iter_pdf_pages',
+                        lambda path, window, page_numbers: iter(enumerate(pages, 1)))
+    monkeypatch.setattr(ocr_extraction, 'ocr_page',
+                        lambda page, lang, profile, mode: {'text': f"page {page[0, 0]}", 'timings': {}})
+
+    results = list(ocr_extraction.iter_pdf_text('booklet.pdf', window=3))
+    assert [(n, result['text']) for n, result in results] == [
+        (1, 'page 0'), (2, 'page 1'), (3, 'page 2'), (4, 'page 3')
+    ]
+
+def test_pdf_text_layer_fast_path(monkeypatch):
+    """Pages with a usable text layer skip OCR, the rest fall back to it"""
+    from utils import ocr_extraction
+    ocr_requests = []
+
+    def fake_iter_pdf_text(path, lang, page_numbers, profile, mode):
+        ocr_requests.append(page_numbers)
+        for page_number in page_numbers:
+            yield page_number, {'text': f"scanned page {page_number}", 'timings': {'ocr': 1.0},
+                                'scale': 1.0, 'geometry': None, 'blocks': 1, 'confidence': None,
+                                'regions': None}
+
+    layer = ["Typed rubric question one carries ten marks", "", "  3  "]
+    monkeypatch.setattr(ocr_extraction.pdf2image, 'pdfinfo_from_path', lambda path: {'Pages': 3})
+    monkeypatch.setattr(ocr_extraction, 'extract_pdf_text_layer', lambda path: layer)
+    monkeypatch.setattr(ocr_extraction, 'iter_pdf_text', fake_iter_pdf_text)
+
+    pages = ocr_extraction.extract_pdf_pages('rubric.pdf')
+
+    assert ocr_requests == [[2, 3]]
+    assert [page['source'] for page in pages] == ['text_layer', 'ocr', 'ocr']
+    assert pages[0]['text'] == layer[0]
+    assert pages[2]['text'] == 'scanned page 3'
+
+def test_page_runs_are_bounded_by_window():
+    """Only consecutive pages are rendered together, in windows"""
+    from utils.ocr_extraction import _page_runs
+    assert _page_runs([1, 2, 3, 5, 6, 9], 2) == [[1, 2], [3, 3], [5, 6], [9, 9]]
+
+def _page_value_task(page, lang, profile, mode):
+    """Page pool task: later pages finish first"""
+    import time
+    value = int(page[0, 0])
+    time.sleep(0.05 * (4 - value))
+    return {'text': f"page {value}", 'timings': {}}
+
+def _stuck_page_task(page, lang, profile, mode):
+    import time
+    time.sleep(5)
+
+def _crashing_page_task(page, lang, profile, mode):
+    os._exit(1)
+
+@pytest.fixture
+def small_page_pool(monkeypatch):
+    """A two-process page pool in place of the shared one"""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from utils import ocr_extraction
+    pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn'))
+    monkeypatch.setattr(ocr_extraction, 'OCR_PDF_WORKERS', 2)
+    monkeypatch.setattr(ocr_extraction, '_page_executor', pool)
+    yield pool
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def test_ocr_pages_returns_results_in_page_order(monkeypatch, small_page_pool):
+    from utils import ocr_extraction
+    monkeypatch.setattr(ocr_extraction, '_ocr_page_task', _page_value_task)
+    pages = [np.full((10, 10), n, dtype=np.uint8) for n in range(4)]
+    results = ocr_extraction.ocr_pages(pages, timeout=60)
+    assert [result['text'] for result in results] == ['page 0', 'page 1', 'page 2', 'page 3']
+
+def test_ocr_pages_times_out(monkeypatch, small_page_pool):
+    from utils import ocr_extraction
+    monkeypatch.setattr(ocr_extraction, '_ocr_page_task', _stuck_page_task)
+    pages = [np.zeros((10, 10), dtype=np.uint8)] * 3
+    with pytest.raises(TimeoutError, match='pages outstanding'):
+        ocr_extraction.ocr_pages(pages, timeout=0.5)
+
+def test_broken_page_pool_is_replaced(monkeypatch, small_page_pool):
+    from concurrent.futures.process import BrokenProcessPool
+    from utils import ocr_extraction
+    monkeypatch.setattr(ocr_extraction, '_ocr_page_task', _crashing_page_task)
+    pages = [np.zeros((10, 10), dtype=np.uint8)] * 2
+    with pytest.raises(BrokenProcessPool):
+        ocr_extraction.ocr_pages(pages, timeout=60)
+    # The next document starts a fresh pool instead of failing on the broken one
+    assert ocr_extraction._page_executor is None
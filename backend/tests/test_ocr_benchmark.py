@@ -0,0 +1,65 @@
+import time
+import pytest
+from utils import ocr_benchmark
+
+REFERENCE = 'Swali la kwanza eleza usanisinuru'
+
+def corpus_pages():
+    return [
+        {'id': 'swa-typed-png', 'lang': 'swa', 'style': 'typed', 'format': 'png', 'path': 'a.png',
+         'reference': REFERENCE},
+        {'id': 'swa-noisy-pdf', 'lang': 'swa', 'style': 'noisy', 'format': 'pdf', 'path': 'b.pdf',
+         'reference': REFERENCE},
+    ]
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+    def fake_extract_document(path, lang, profile, use_cache, mode):
+        assert use_cache is False
+        time.sleep(0.005)
+        text = REFERENCE if path == 'a.png' else 'Swali la kwanza eleza usanisinuru kabisa'
+        timings = {'decode': 2.0, 'geometry': 1.0, 'grayscale': 0.5, 'adaptive_threshold': 1.5,
+                   'ocr': 10.0, 'second_pass': 5.0}
+        confidence = {'lines': 4, 'regions_retried': 1, 'pages_retried': 0}
+        return {'text': text, 'pages': [{}], 'timings': timings, 'confidence': confidence}
+
+    monkeypatch.setattr(ocr_benchmark.ocr_extraction, 'extract_document', fake_extract_document)
+
+def test_group_timings():
+    grouped = ocr_benchmark.group_timings({'decode': 1.0, 'median_blur': 2.0, 'ocr': 3.0, 'mystery': 1.0}, 10.0)
+    assert grouped == {'decode': 1.0, 'normalize': 0.0, 'preprocess': 2.0, 'ocr': 3.0, 'other': 4.0}
+
+def test_suite_reports_accuracy_stages_and_groups(fake_pipeline):
+    results = ocr_benchmark.run_suite(corpus_pages(), repeat=2)
+
+    assert results['corpus_version']
+    assert results['build']['pipeline_version']
+    assert len(results['pages']) == 4
+    typed, noisy = results['pages'][0], results['pages'][1]
+    assert typed['entry'] == 'extract_text_from_image' and noisy['entry'] == 'handle_pdf'
+    assert typed['cer'] == 0.0 and typed['wer'] == 0.0
+    assert noisy['wer'] == 0.2  # one inserted word in five
+    assert typed['stages']['ocr'] == 15.0 and typed['stages']['preprocess'] == 2.0
+
+    summary = results['summary']
+    assert summary['documents'] == 4 and summary['pages'] == 4
+    assert summary['pages_per_sec'] > 0
+    assert summary['line_retry_rate'] == 0.25 and summary['page_retry_rate'] == 0.0
+    assert set(results['by_language_style']) == {'swa/noisy', 'swa/typed'}
+    assert set(results['by_entry']) == {'extract_text_from_image', 'handle_pdf'}
+
+def test_compare_flags_regressions(fake_pipeline):
+    baseline = ocr_benchmark.run_suite(corpus_pages())
+    current = ocr_benchmark.run_suite(corpus_pages())
+    current['summary'] = {**baseline['summary'], 'cer': baseline['summary']['cer'] + 0.05,
+                          'p95_ms': baseline['summary']['p95_ms'] * 2}
+
+    report = ocr_benchmark.compare(baseline, current)
+
+    assert any(r.startswith('overall: cer') for r in report['regressions'])
+    assert any(r.startswith('overall: p95_ms') for r in report['regressions'])
+    assert report['deltas']['overall']['cer'] == 0.05
+
+def test_compare_identical_runs_has_no_regressions(fake_pipeline):
+    baseline = ocr_benchmark.run_suite(corpus_pages())
+    assert ocr_benchmark.compare(baseline, baseline)['regressions'] == []
@@ -0,0 +1,73 @@
+import os
+import pytest
+from utils.ocr_cache import OCRCache, make_key, hash_file
+
+@pytest.fixture
+def cache(tmp_path):
+    return OCRCache(cache_dir=str(tmp_path / 'ocr_cache'), max_disk_bytes=10_000, max_memory_entries=2)
+
+def test_key_depends_on_content_and_params(tmp_path):
+    """Same bytes and settings give the same key, any change gives a new one"""
+    first = tmp_path / 'a.png'
+    second = tmp_path / 'b.png'
+    first.write_bytes(b'same image bytes')
+    second.write_bytes(b'same image bytes')
+
+    assert hash_file(str(first)) == hash_file(str(second))
+    key = make_key(hash_file(str(first)), lang='swa', engine='tesserocr:5.3')
+    assert key == make_key(hash_file(str(second)), engine='tesserocr:5.3', lang='swa')
+    assert key != make_key(hash_file(str(first)), lang='eng', engine='tesserocr:5.3')
+    assert key != make_key(hash_file(str(first)), lang='swa', engine='tesserocr:5.4')
+
+def test_memory_and_disk_tiers(cache):
+    """A fresh cache over the same directory serves entries from disk"""
+    document = {'text': 'Jambo', 'pages': [{'page': 1, 'text': 'Jambo', 'source': 'ocr'}]}
+    assert cache.get('k1') is None
+    cache.set('k1', document)
+    assert cache.get('k1') == document
+    assert cache.stats()['memory_hits'] == 1
+
+    restarted = OCRCache(cache_dir=cache.cache_dir, max_disk_bytes=10_000)
+    assert restarted.get('k1') == document
+    assert restarted.stats()['disk_hits'] == 1
+    assert restarted.get('k1') == document
+    assert restarted.stats()['memory_hits'] == 1
+
+def test_cached_values_are_copies(cache):
+    """Callers mutating a result must not corrupt the cache"""
+    cache.set('k1', {'text': 'Jambo'})
+    cache.get('k1')['text'] = 'changed'
+    assert cache.get('k1')['text'] == 'Jambo'
+
+def test_memory_tier_is_lru(cache):
+    """The memory tier keeps only the most recently used entries"""
+    for key in ('k1', 'k2', 'k3'):
+        cache.set(key, {'text': key})
+    assert list(cache._memory) == ['k2', 'k3']
+
+def test_disk_tier_is_size_capped(cache):
+    """Old entries are evicted once the disk tier exceeds its cap"""
+    for n in range(20):
+        cache.set(f"key{n:02d}", {'text': 'x' * 1000})
+    assert cache.disk_bytes() <= cache.max_disk_bytes
+    assert cache.stats()['evictions'] > 0
+    assert cache.get('key19') is not None
+
+def test_workers_sharing_a_directory_respect_the_cap(tmp_path):
+    """Each worker notices the others' writes, so together they stay near the cap"""
+    cache_dir = str(tmp_path / 'ocr_cache')
+    workers = [OCRCache(cache_dir=cache_dir, max_disk_bytes=10_000, rescan_writes=2, rescan_seconds=3600)
+               for _ in range(2)]
+    for worker in workers:
+        assert worker.disk_bytes() == 0
+
+    # Each worker on its own stays under the cap
+    entry = {'text': 'x' * 1000}
+    for index, worker in enumerate(workers):
+        for n in range(9):
+            worker.set(f"w{index}-{n}", entry)
+    on_disk = sum(os.path.getsize(os.path.join(root, name))
+                  for root, _, files in os.walk(cache_dir) for name in files)
+    # At most rescan_writes unseen entries per worker on top of the cap
+    assert on_disk <= 10_000 + 2 * 2 * 1100
+    assert sum(worker.stats()['evictions'] for worker in workers) > 0
@@ -0,0 +1,44 @@
+import numpy as np
+from utils import ocr_corpus
+
+def test_manifest_is_versioned_and_complete():
+    manifest = ocr_corpus.load_manifest()
+    assert manifest['version']
+    ids = [page['id'] for page in manifest['pages']]
+    assert len(ids) == len(set(ids))
+    for page in manifest['pages']:
+        assert page['text'] in manifest['texts']
+        assert page['lang'] in ('swa', 'eng')
+        assert page['style'] in ('typed', 'noisy')
+        assert page['format'] in ('png', 'jpg', 'pdf')
+    # Both languages come typed and noisy
+    assert {(p['lang'], p['style']) for p in manifest['pages']} == {
+        ('swa', 'typed'), ('swa', 'noisy'), ('eng', 'typed'), ('eng', 'noisy')}
+
+def test_rendering_is_deterministic():
+    manifest = ocr_corpus.load_manifest()
+    entry = next(p for p in manifest['pages'] if p['style'] == 'noisy')
+    first = ocr_corpus.build_page(entry, manifest)
+    second = ocr_corpus.build_page(entry, manifest)
+    assert np.array_equal(first, second)
+
+def test_noisy_pages_are_degraded():
+    clean = ocr_corpus.render_page('Swali la kwanza', dpi=100)
+    noisy = ocr_corpus.degrade_page(clean, seed=1)
+    assert noisy.shape == clean.shape
+    assert np.count_nonzero(clean == 255) > np.count_nonzero(noisy == 255)
+    assert not np.array_equal(ocr_corpus.degrade_page(clean, seed=2), noisy)
+
+def test_materialize_writes_pages_with_ground_truth(tmp_path):
+    manifest = ocr_corpus.load_manifest()
+    ids = {'swa-typed-png', 'eng-typed-pdf'}
+    pages = ocr_corpus.materialize(manifest, cache_dir=str(tmp_path), ids=ids)
+
+    assert {page['id'] for page in pages} == ids
+    for page in pages:
+        assert page['path'].startswith(str(tmp_path / f"v{manifest['version']}"))
+        with open(page['path'], 'rb') as f:
+            header = f.read(4)
+        assert header == (b'%PDF' if page['format'] == 'pdf' else b'\x89PNG')
+        assert page['reference'] == manifest['texts'][page['text']]
+        assert len(page['pixels_sha256']) == 64
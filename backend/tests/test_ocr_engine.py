@@ -0,0 +1,138 @@
+import pytest
+import threading
+import numpy as np
+from utils import ocr_engine
+from utils.ocr_engine import EnginePool
+
+class FakeEngine:
+    """Engine stand-in that records how it was used"""
+    name = 'fake'
+
+    def __init__(self, lang, tessdata_dir=None):
+        self.lang = lang
+        self.calls = 0
+        self.closed = False
+
+    def image_to_string(self, image):
+        self.calls += 1
+        return f"{self.lang}:{image.shape}"
+
+    def close(self):
+        self.closed = True
+
+def test_pool_reuses_engines():
+    """Sequential calls should share one engine instead of starting a new one"""
+    pool = EnginePool('swa', size=2, factory=FakeEngine)
+    image = np.zeros((10, 10), dtype=np.uint8)
+
+    for _ in range(5):
+        with pool.engine() as engine:
+            assert engine.image_to_string(image) == 'swa:(10, 10)'
+
+    assert pool.created == 1
+    assert engine.calls == 5
+
+def test_pool_is_bounded():
+    """Concurrent callers never create more engines than the pool size"""
+    pool = EnginePool('eng', size=2, factory=FakeEngine)
+    barrier = threading.Barrier(4, timeout=5)
+
+    def worker():
+        with pool.engine():
+            pass
+        barrier.wait()
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    for t in threads:
+        t.join()
+
+    assert pool.created <= 2
+
+def test_failed_engine_is_discarded():
+    """An engine that raised is closed and replaced on the next call"""
+    pool = EnginePool('swa', size=1, factory=FakeEngine)
+
+    with pytest.raises(RuntimeError):
+        with pool.engine() as broken:
+            raise RuntimeError("OCR failed")
+
+    assert broken.closed
+    with pool.engine() as engine:
+        assert engine is not broken
+
+def test_warm_up_preloads_engine():
+    """Warm-up creates the engine ahead of the first request"""
+    pool = EnginePool('swa', size=2, factory=FakeEngine)
+    pool.warm_up()
+    assert pool.created == 1
+
+    with pool.engine():
+        pass
+    assert pool.created == 1
+
+def test_get_pool_is_keyed_by_language():
+    """Each language gets its own pool, the same language reuses it"""
+    assert ocr_engine.get_pool('swa', '/tmp/tessdata') is ocr_engine.get_pool('swa', '/tmp/tessdata')
+    assert ocr_engine.get_pool('swa', '/tmp/tessdata') is not ocr_engine.get_pool('eng', '/tmp/tessdata')
+
+class FakeBackend(FakeEngine):
+    """Registered backend stand-in"""
+    name = 'fake'
+
+    @classmethod
+    def available(cls):
+        return True
+
+    @classmethod
+    def version(cls):
+        return '1.0'
+
+    def image_to_data(self, image):
+        return []
+
+def test_registered_backend_is_selectable(monkeypatch):
+    monkeypatch.setitem(ocr_engine.BACKENDS, 'fake', FakeBackend)
+    image = np.zeros((4, 4), dtype=np.uint8)
+    assert ocr_engine.image_to_string(image, lang='swa', backend='fake') == 'swa:(4, 4)'
+    assert 'fake' in ocr_engine.available_backends()
+    assert ocr_engine.resolve_backend('fake') == 'fake'
+    # Pools are kept apart per backend
+    assert ocr_engine.get_pool('swa', backend='fake') is not ocr_engine.get_pool('swa', backend='pytesseract')
+
+def test_unknown_backend_falls_back_to_auto(monkeypatch):
+    monkeypatch.setattr(ocr_engine, 'tesserocr', None)
+    assert ocr_engine.resolve_backend('no-such-engine') == 'pytesseract'
+
+def test_failing_backend_falls_back_to_pytesseract(monkeypatch):
+    class BrokenBackend(FakeBackend):
+        name = 'broken'
+
+        def __init__(self, lang, tessdata_dir=None):
+            raise RuntimeError('model missing')
+
+    monkeypatch.setitem(ocr_engine.BACKENDS, 'broken', BrokenBackend)
+    engine = ocr_engine.create_engine('swa', backend='broken')
+    assert engine.name == 'pytesseract'
+
+def test_engine_version_retries_failed_lookups(monkeypatch):
+    """A version lookup that fails (e.g. Tesseract not configured yet) is not remembered"""
+    versions = [RuntimeError('Tesseract is not installed'), '5.3.0']
+
+    class LateEngine(FakeEngine):
+        name = 'late'
+
+        @classmethod
+        def version(cls):
+            result = versions.pop(0)  # a third lookup would fail: successes are kept
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+    monkeypatch.setitem(ocr_engine.BACKENDS, 'late', LateEngine)
+    monkeypatch.setattr(ocr_engine, '_versions', {})
+    assert ocr_engine.engine_version('late') == 'unknown'
+    assert ocr_engine.engine_version('late') == 'late:5.3.0'
+    assert ocr_engine.engine_version('late') == 'late:5.3.0'
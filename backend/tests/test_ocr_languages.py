@@ -0,0 +1,89 @@
+import io
+import json
+import pytest
+from flask import Flask
+from PIL import Image
+from utils import ocr_languages
+from utils.ocr_languages import to_tesseract, resolve_language, LanguageMetrics
+
+def test_exam_languages_map_to_tesseract_models():
+    assert to_tesseract('English') == 'eng'
+    assert to_tesseract('Kiswahili') == 'swa'
+    assert to_tesseract('swa') == 'swa'
+    assert to_tesseract('') is None
+    assert to_tesseract('Klingon') is None
+
+def test_mixed_language_exams_get_one_combined_pass():
+    assert to_tesseract('English and Swahili') == 'eng+swa'
+    assert to_tesseract('English, Swahili, English') == 'eng+swa'
+    assert to_tesseract('eng+swa') == 'eng+swa'
+    assert to_tesseract('Bilingual') == ocr_languages.OCR_MIXED_LANGUAGES
+
+def test_resolve_language_uses_first_usable_candidate():
+    assert resolve_language(None, 'Swahili', 'eng') == 'swa'
+    assert resolve_language('fra', 'Swahili') == 'fra'
+    assert resolve_language(None, 'Klingon', 'eng') == 'eng'
+    assert resolve_language(None, None) == ocr_languages.OCR_DEFAULT_LANGUAGE
+
+def test_language_metrics_report_throughput():
+    metrics = LanguageMetrics()
+    metrics.record('swa', pages=2, ocr_ms=1000.0, characters=500)
+    metrics.record('swa', pages=2, ocr_ms=1000.0, characters=300)
+    stats = metrics.stats()['swa']
+    assert stats['documents'] == 2
+    assert stats['pages'] == 4
+    assert stats['pages_per_sec'] == 2.0
+    assert stats['chars_per_sec'] == 400.0
+    assert stats['ms_per_page'] == 500.0
+
+@pytest.fixture
+def ocr_client(monkeypatch):
+    from routes import ocr as ocr_routes
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.register_blueprint(ocr_routes.bp)
+    return app.test_client(), ocr_routes
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('L', (20, 20), color=255).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def test_ocr_language_comes_from_the_exam(ocr_client, monkeypatch):
+    """Without a 'lang' field the exam's language is used, and the exam is fetched once"""
+    client, ocr_routes = ocr_client
+    lookups = []
+
+    def fake_get_exam(exam_id):
+        lookups.append(exam_id)
+        return {'id': exam_id, 'language': 'English and Swahili', 'ocr_profile': None}
+
+    seen = {}
+
+    def fake_extract_document_bytes(data, filename, lang, profile, mode, ingest_stats):
+        seen[filename] = lang
+        return {'text': 'text'}
+
+    monkeypatch.setattr(ocr_routes.supabase_client, 'get_exam', fake_get_exam)
+    monkeypatch.setattr(ocr_routes, 'extract_document_bytes', fake_extract_document_bytes)
+    data = {'exam_id': 'exam-1',
+            'rubric': (io.BytesIO(png_bytes()), 'rubric.png'),
+            'test_script': (io.BytesIO(png_bytes()), 'script.png')}
+    response = client.post('/api/ocr/extract', data=data, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert seen == {'rubric.png': 'eng+swa', 'script.png': 'eng+swa'}
+    assert lookups == ['exam-1']
+
+def test_language_stats_endpoint(ocr_client, monkeypatch):
+    client, ocr_routes = ocr_client
+    metrics = LanguageMetrics()
+    metrics.record('eng', pages=1, ocr_ms=250.0, characters=100)
+    monkeypatch.setattr(ocr_languages, 'metrics', metrics)
+
+    response = client.get('/api/ocr/languages/stats')
+
+    assert response.status_code == 200
+    body = json.loads(response.get_data(as_text=True))
+    assert body['languages']['eng']['pages_per_sec'] == 4.0
+    assert body['default'] == ocr_languages.OCR_DEFAULT_LANGUAGE
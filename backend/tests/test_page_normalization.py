@@ -0,0 +1,174 @@
+import cv2
+import numpy as np
+from PIL import Image
+from utils import page_normalization
+from utils.page_normalization import estimate_text_height, normalize_resolution, to_original_coordinates
+from utils.image_ingest import load_image_gray
+
+def render_page(factor):
+    """A lined answer page; `factor` multiplies both page and text size"""
+    page = np.full((int(2200 * factor), int(1700 * factor)), 235, dtype=np.uint8)
+    for line in range(25):
+        cv2.putText(page, 'Mwanafunzi aliandika jibu zuri sana', (int(50 * factor), int((80 + line * 80) * factor)),
+                    cv2.FONT_HERSHEY_SIMPLEX, factor, 20, max(1, int(2 * factor)))
+    return page
+
+def test_text_height_scales_with_page():
+    """Doubling the rendering size doubles the estimated text height"""
+    small = estimate_text_height(render_page(1))
+    large = estimate_text_height(render_page(2))
+    assert small is not None
+    assert abs(large / small - 2) < 0.2
+
+def test_blank_page_is_left_alone():
+    """Without text to measure, the page is not rescaled"""
+    blank = np.full((1000, 800), 240, dtype=np.uint8)
+    image, info = normalize_resolution(blank)
+    assert image is blank
+    assert info['scale'] == 1.0
+
+def test_high_resolution_photo_is_shrunk():
+    """Text far above the target DPI is scaled down toward it"""
+    page = render_page(4)
+    image, info = normalize_resolution(page, target_dpi=300)
+    assert info['scale'] < 1
+    assert info['effective_dpi'] > 300
+    assert image.shape[0] == round(page.shape[0] * info['scale'])
+
+def test_small_text_is_enlarged(monkeypatch):
+    """Text below OCR_MIN_DPI is enlarged, but never beyond MAX_SCALE"""
+    monkeypatch.setattr(page_normalization, 'OCR_MIN_DPI', 150)
+    _, info = normalize_resolution(render_page(0.5))
+    assert 1 < info['scale'] <= page_normalization.MAX_SCALE
+
+def test_boxes_map_back_to_upload():
+    assert to_original_coordinates((50, 100, 25, 10), 0.5) == (100, 200, 50, 20)
+
+def test_large_jpeg_uses_reduced_decode(tmp_path):
+    """JPEGs above the pixel budget decode at a DCT-reduced size, in grayscale"""
+    path = tmp_path / 'photo.jpg'
+    Image.new('RGB', (4000, 3000), color=(200, 200, 200)).save(path, format='JPEG')
+
+    gray, scale = load_image_gray(str(path), max_pixels=2_000_000)
+    assert gray.ndim == 2
+    assert scale in (0.5, 0.25)
+    assert gray.shape == (int(3000 * scale), int(4000 * scale))
+
+    gray, scale = load_image_gray(str(path), max_pixels=50_000_000)
+    assert scale == 1.0
+
+def rotate_page(page, angle):
+    """Rotate a page counter-clockwise by `angle` degrees on an enlarged white canvas"""
+    height, width = page.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(page, matrix, (width, height), borderValue=235)
+
+def test_skew_is_detected_and_corrected(monkeypatch):
+    monkeypatch.setattr(page_normalization, 'OCR_ORIENTATION_OSD', False)
+    skewed = rotate_page(render_page(1), 4)
+    assert abs(page_normalization.estimate_skew(skewed) + 4) < 0.5
+
+    _, info = page_normalization.normalize_geometry(skewed)
+    assert abs(info['skew'] + 4) < 0.5
+    assert info['rotation'] == 0
+
+def test_margins_are_cropped():
+    """Text in the top-left corner of a large sheet crops most of the page away"""
+    page = np.full((3000, 2400), 235, dtype=np.uint8)
+    page[:1100, :850] = render_page(0.5)
+    image, info = page_normalization.normalize_geometry(page)
+    assert info['area_reduction'] > 0.6
+    assert image.shape[0] < 1300 and image.shape[1] < 1100
+
+def fake_osd(monkeypatch, rotate, confidence=5.0):
+    """Stand in for Tesseract's orientation detector; returns the images it was asked about"""
+    seen = []
+
+    def detect_orientation(image):
+        seen.append(image.shape)
+        if rotate is None:
+            raise RuntimeError('osd.traineddata not found')
+        return {'rotate': rotate, 'confidence': confidence}
+
+    monkeypatch.setattr(page_normalization, 'OCR_ORIENTATION_OSD', True)
+    monkeypatch.setattr(page_normalization, '_osd_unavailable', None)
+    monkeypatch.setattr(page_normalization.ocr_engine, 'detect_orientation', detect_orientation)
+    return seen
+
+def test_sideways_page_is_turned_upright(monkeypatch):
+    sideways = cv2.rotate(render_page(1), cv2.ROTATE_90_COUNTERCLOCKWISE)
+    assert page_normalization.is_sideways(sideways)
+    seen = fake_osd(monkeypatch, 90)
+    assert page_normalization.detect_rotation(sideways) == 90
+    # On a downsample
+    assert max(seen[0]) <= page_normalization.ESTIMATE_SIZE
+    # The projection test backs up an unsure detector
+    fake_osd(monkeypatch, 90, confidence=0.5)
+    assert page_normalization.detect_rotation(sideways) == 90
+
+def test_upside_down_page_is_turned(monkeypatch):
+    upside_down = cv2.rotate(render_page(1), cv2.ROTATE_180)
+    assert not page_normalization.is_sideways(upside_down)
+    fake_osd(monkeypatch, 180)
+    assert page_normalization.detect_rotation(upside_down) == 180
+    fake_osd(monkeypatch, 180, confidence=0.5)
+    assert page_normalization.detect_rotation(upside_down) == 0
+
+def test_pages_are_not_turned_without_the_detector(monkeypatch, caplog):
+    sideways = cv2.rotate(render_page(1), cv2.ROTATE_90_COUNTERCLOCKWISE)
+    seen = fake_osd(monkeypatch, None)
+    for _ in range(3):
+        assert page_normalization.detect_rotation(sideways) == 0
+    # Asked once, then remembered as unavailable and reported once
+    assert len(seen) == 1
+    assert len([r for r in caplog.records if 'unavailable' in r.getMessage() and r.levelname == 'WARNING']) == 1
+    monkeypatch.setattr(page_normalization, 'OCR_ORIENTATION_OSD', False)
+    assert page_normalization.detect_rotation(sideways) == 0
+
+def test_pages_with_too_little_text_keep_the_detector(monkeypatch):
+    sideways = cv2.rotate(render_page(1), cv2.ROTATE_90_COUNTERCLOCKWISE)
+    fake_osd(monkeypatch, 90)
+    calls = []
+
+    def undetectable(image):
+        calls.append(image.shape)
+        raise page_normalization.ocr_engine.OrientationUndetectable('Too few characters')
+
+    monkeypatch.setattr(page_normalization.ocr_engine, 'detect_orientation', undetectable)
+    timings = {}
+    assert page_normalization.detect_rotation(sideways, timings) == 0
+    assert page_normalization.detect_rotation(sideways) == 0
+    assert len(calls) == 2
+    assert timings['osd'] >= 0
+
+def test_detector_time_is_reported(monkeypatch):
+    fake_osd(monkeypatch, 0)
+    _, info = page_normalization.normalize_geometry(render_page(1))
+    assert info['osd_ms'] is not None
+    # As its own page timing, next to the rest of the geometry step
+    from utils import ocr_extraction
+    monkeypatch.setattr(page_normalization, 'OCR_NORMALIZE_GEOMETRY', True)
+    prepared = ocr_extraction.prepare_page(render_page(1), mode='page')
+    assert 'osd' in prepared['timings'] and 'geometry' in prepared['timings']
+
+def test_blank_pages_skip_the_detector(monkeypatch):
+    seen = fake_osd(monkeypatch, 90)
+    assert page_normalization.detect_rotation(np.full((1000, 800), 240, dtype=np.uint8)) == 0
+    assert seen == []
+
+def test_blank_page_geometry_is_untouched():
+    blank = np.full((1000, 800), 240, dtype=np.uint8)
+    image, info = page_normalization.normalize_geometry(blank)
+    assert image.shape == blank.shape
+    assert info == {'rotation': 0, 'skew': 0.0, 'area_reduction': 0.0, 'transform': info['transform'],
+                    'osd_ms': None}
+
+def test_geometry_boxes_map_back_to_upload():
+    """A box on the cropped, half-scale page maps back through crop and scale"""
+    page = np.full((3000, 2400), 235, dtype=np.uint8)
+    page[1000:2100, 1000:1850] = render_page(0.5)
+    _, info = page_normalization.normalize_geometry(page)
+    to_original = page_normalization.to_original_matrix(info['transform'], scale=0.5)
+    x, y, _, _ = page_normalization.map_box_to_original((0, 0, 10, 10), to_original)
+    # The crop starts just above/left of the text, which sits at (1000, 1000) at half scale
+    assert 1700 < x <= 2000 and 1700 < y <= 2000
@@ -0,0 +1,117 @@
+import time
+import threading
+import numpy as np
+import pytest
+from utils import page_pipeline
+from utils.page_pipeline import Pipeline, Stage
+
+def test_results_keep_input_order():
+    def slow_odd(n):
+        time.sleep(0.02 if n % 2 else 0)
+        return n * 10
+
+    pipeline = Pipeline([Stage('double', lambda n: n * 2), Stage('tens', slow_odd, workers=3)])
+    assert list(pipeline.run(range(8))) == [n * 20 for n in range(8)]
+    stats = pipeline.stats()
+    assert stats['stages']['source']['items'] == 8
+    assert stats['stages']['tens']['items'] == 8 and stats['stages']['tens']['workers'] == 3
+
+def test_stages_overlap():
+    """While one page is in the second stage, the next one is already in the first"""
+    active, overlapped = set(), []
+    lock = threading.Lock()
+
+    def stage(name):
+        def run(item):
+            with lock:
+                active.add(name)
+                if len(active) > 1:
+                    overlapped.append(item)
+            time.sleep(0.03)
+            with lock:
+                active.discard(name)
+            return item
+        return run
+
+    pipeline = Pipeline([Stage('preprocess', stage('preprocess')), Stage('ocr', stage('ocr'))])
+    start = time.perf_counter()
+    assert list(pipeline.run(range(6))) == list(range(6))
+    # Sequential would take 6 * 2 * 30ms
+    assert time.perf_counter() - start < 0.3
+    assert overlapped
+    assert pipeline.stats()['stages']['ocr']['utilization'] > 0.5
+
+def test_queues_bound_pages_in_flight():
+    produced = []
+
+    def pages():
+        for n in range(20):
+            produced.append(n)
+            yield n
+
+    pipeline = Pipeline([Stage('slow', lambda n: time.sleep(0.01) or n)], queue_size=1)
+    results = pipeline.run(pages())
+    next(results)
+    time.sleep(0.05)
+    # One being processed, one per queue and one held by each thread at most
+    assert len(produced) <= 5
+    assert list(results) == list(range(1, 20))
+
+def test_stage_error_is_raised():
+    def fail_on_three(n):
+        if n == 3:
+            raise ValueError('bad page')
+        return n
+
+    with pytest.raises(ValueError, match='bad page'):
+        list(Pipeline([Stage('check', fail_on_three)]).run(range(10)))
+
+def test_timeout():
+    pipeline = Pipeline([Stage('stuck', lambda n: time.sleep(0.5))])
+    with pytest.raises(TimeoutError):
+        list(pipeline.run(range(3), timeout=0.1))
+
+def test_pdf_pages_go_through_the_pipeline(monkeypatch):
+    from utils import ocr_extraction
+    pages = [np.full((10, 10), n, dtype=np.uint8) for n in range(5)]
+    monkeypatch.setattr(ocr_extraction, 'OCR_PIPELINE', True)
+    monkeypatch.setattr(ocr_extraction, 'iter_pdf_pages',
+                        lambda path, window, page_numbers: iter(enumerate(pages, 1)))
+    monkeypatch.setattr(ocr_extraction, 'prepare_page',
+                        lambda page, profile, mode: {'value': int(page[0, 0])})
+    monkeypatch.setattr(ocr_extraction, 'read_page',
+                        lambda prepared, lang: {'text': f"page {prepared['value']}", 'timings': {}})
+    documents = page_pipeline.metrics.stats()['documents']
+
+    results = list(ocr_extraction.iter_pdf_text('booklet.pdf'))
+    assert [(n, result['text']) for n, result in results] == [(n, f"page {n - 1}") for n in range(1, 6)]
+    stats = page_pipeline.metrics.stats()
+    assert stats['documents'] == documents + 1
+    assert set(stats['stages']) >= {'rasterize', 'preprocess', 'ocr'}
+
+def test_pipeline_threads_share_the_worker_slots(monkeypatch):
+    from utils import ocr_extraction
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fake_read_page(prepared, lang):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return {'text': '', 'timings': {}}
+
+    monkeypatch.setattr(ocr_extraction, 'OCR_PIPELINE', True)
+    monkeypatch.setattr(ocr_extraction, 'OCR_PIPELINE_OCR_WORKERS', 3)
+    monkeypatch.setattr(ocr_extraction, '_pipeline_slots', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(ocr_extraction, 'prepare_page', lambda page, profile, mode: page)
+    monkeypatch.setattr(ocr_extraction, 'read_page', fake_read_page)
+    documents = [threading.Thread(target=lambda: list(ocr_extraction.iter_page_text(iter(enumerate(range(6), 1)))))
+                 for _ in range(2)]
+    for document in documents:
+        document.start()
+    for document in documents:
+        document.join()
+    assert peak[0] == 1
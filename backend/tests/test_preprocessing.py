@@ -0,0 +1,40 @@
+import pytest
+import cv2
+import numpy as np
+from utils.preprocessing import PROFILES, run_profile, preprocess_image, resolve_profile
+
+@pytest.fixture
+def page():
+    """A small synthetic page with dark text on a light background"""
+    image = np.full((120, 300, 3), 230, dtype=np.uint8)
+    cv2.putText(image, 'Jambo Dunia', (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 1, (20, 20, 20), 2)
+    return image
+
+@pytest.mark.parametrize('profile', sorted(PROFILES))
+def test_profiles_return_binary_page(page, profile):
+    """Every profile produces a single-channel image of the same size"""
+    processed, timings = run_profile(page, profile)
+    assert processed.shape == page.shape[:2]
+    assert processed.dtype == np.uint8
+    assert list(timings) == PROFILES[profile]
+    assert all(ms >= 0 for ms in timings.values())
+
+def test_max_quality_matches_original_chain(page):
+    """The max_quality profile keeps the original threshold/denoise/dilate output"""
+    gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY)
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    denoised = cv2.fastNlMeansDenoising(binary)
+    expected = cv2.dilate(denoised, cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2)), iterations=1)
+
+    assert np.array_equal(preprocess_image(page, 'max_quality'), expected)
+
+def test_unknown_profile_is_rejected(page):
+    with pytest.raises(ValueError):
+        run_profile(page, 'ultra')
+
+def test_resolve_profile_prefers_request_then_exam():
+    """A request's profile wins over the exam's, unknown names are skipped"""
+    assert resolve_profile('fast', 'balanced') == 'fast'
+    assert resolve_profile(None, 'balanced') == 'balanced'
+    assert resolve_profile('ultra', 'balanced') == 'balanced'
+    assert resolve_profile(None, None) in PROFILES
@@ -0,0 +1,144 @@
+import io
+import threading
+import time
+from flask import Flask
+from PIL import Image
+from utils import rubric_store
+from utils.rubric_store import RubricStore, normalize_rubric_text
+
+def test_normalize_rubric_text():
+    assert normalize_rubric_text('  Q1: 5 marks   \r\n\r\n\r\n\r\nQ2: 3 marks \n') == 'Q1: 5 marks\n\nQ2: 3 marks'
+    assert normalize_rubric_text(' \n ') is None
+    assert normalize_rubric_text(None) is None
+
+def test_uploaded_rubric_is_extracted_once_per_version():
+    store = RubricStore()
+    calls = []
+
+    def extract():
+        calls.append(1)
+        return 'Q1: 5 marks'
+
+    for _ in range(3):
+        assert store.upload_text('exam-1', b'rubric v1', extract, lang='swa') == 'Q1: 5 marks'
+    assert len(calls) == 1
+    # A new version of the rubric, or other OCR settings, is read again
+    store.upload_text('exam-1', b'rubric v2', extract, lang='swa')
+    store.upload_text('exam-1', b'rubric v1', extract, lang='eng')
+    assert len(calls) == 3
+    assert store.stats()['hits'] == 2
+
+def test_concurrent_requests_share_one_extraction():
+    store = RubricStore()
+    calls = []
+
+    def extract():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'rubric'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.upload_text('exam-1', b'same', extract)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['rubric'] * 5
+    assert len(calls) == 1
+
+def test_failed_extraction_is_not_stored():
+    store = RubricStore()
+    assert store.upload_text('exam-1', b'blank', lambda: None) is None
+    assert store.upload_text('exam-1', b'blank', lambda: 'late text') == 'late text'
+
+def test_exam_rubric_is_fetched_once_until_invalidated(monkeypatch):
+    store = RubricStore(row_ttl=60)
+    fetches = []
+
+    def fake_get_rubric(exam_id, raise_errors=False):
+        fetches.append(exam_id)
+        return {'id': len(fetches), 'content': f'rubric {len(fetches)}'}
+
+    monkeypatch.setattr(rubric_store.supabase_client, 'get_rubric', fake_get_rubric)
+    assert store.exam_text('exam-1') == 'rubric 1'
+    assert store.exam_text('exam-1') == 'rubric 1'
+    assert fetches == ['exam-1']
+
+    store.invalidate('exam-1')
+    assert store.exam_text('exam-1') == 'rubric 2'
+
+def test_exam_rubric_expires(monkeypatch):
+    store = RubricStore(row_ttl=0)
+    monkeypatch.setattr(rubric_store.supabase_client, 'get_rubric', lambda exam_id, raise_errors=False: None)
+    assert store.exam_text('exam-1') is None
+    assert store.exam_text('exam-1') is None
+    assert store.stats()['misses'] == 2
+
+def test_missing_rubric_is_fetched_again_soon(monkeypatch):
+    """A rubric uploaded through another worker shows up after missing_ttl, not row_ttl"""
+    store = RubricStore(row_ttl=60, missing_ttl=0.05)
+    rows = [None, {'id': 1, 'content': 'Q1: 5 marks'}]
+    monkeypatch.setattr(rubric_store.supabase_client, 'get_rubric',
+                        lambda exam_id, raise_errors=False: rows.pop(0))
+    assert store.exam_text('exam-1') is None
+    assert store.exam_text('exam-1') is None  # still trusted
+    time.sleep(0.06)
+    assert store.exam_text('exam-1') == 'Q1: 5 marks'
+    assert rows == []
+    assert store.exam_text('exam-1') == 'Q1: 5 marks'  # a found rubric keeps row_ttl
+
+def test_failed_fetch_is_not_stored(monkeypatch):
+    store = RubricStore(row_ttl=60)
+    responses = [None, {'id': 1, 'content': 'Q1: 5 marks'}]
+
+    def flaky_get_rubric(exam_id, raise_errors=False):
+        assert raise_errors
+        response = responses.pop(0)
+        if response is None:
+            raise Exception('Failed to get rubric: 503')
+        return response
+
+    monkeypatch.setattr(rubric_store.supabase_client, 'get_rubric', flaky_get_rubric)
+    assert store.exam_text('exam-1') is None
+    assert store.exam_text('exam-1') == 'Q1: 5 marks'
+    assert store.stats()['exams'] == 1
+
+def test_store_is_bounded():
+    store = RubricStore(max_entries=2)
+    for version in (b'a', b'b', b'c'):
+        store.upload_text('exam-1', version, lambda: 'text')
+    assert store.stats()['uploads'] == 2
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('L', (20, 20), color=255).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def test_extract_reuses_the_rubric_across_scripts(monkeypatch):
+    """Grading several scripts of one exam OCRs its rubric once"""
+    from routes import ocr as ocr_routes
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.register_blueprint(ocr_routes.bp)
+    client = app.test_client()
+
+    monkeypatch.setattr(rubric_store, '_store', RubricStore())
+    monkeypatch.setattr(ocr_routes.supabase_client, 'get_exam', lambda exam_id: None)
+    ocr_calls = []
+
+    def fake_extract_document_bytes(data, filename, lang, profile, mode, ingest_stats):
+        ocr_calls.append(filename)
+        return {'text': f'text of {filename}'}
+
+    monkeypatch.setattr(ocr_routes, 'extract_document_bytes', fake_extract_document_bytes)
+    rubric = png_bytes()
+    for script in ('s1.png', 's2.png', 's3.png'):
+        data = {'exam_id': 'exam-1',
+                'rubric': (io.BytesIO(rubric), 'rubric.png'),
+                'test_script': (io.BytesIO(png_bytes()), script)}
+        response = client.post('/api/ocr/extract', data=data, content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert response.get_json()['rubric_text'] == 'text of rubric.png'
+
+    assert ocr_calls == ['rubric.png', 's1.png', 's2.png', 's3.png']
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+from utils import tesseract_probe
+
+FAKE_TESSERACT = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/calls.log"
+case "$1" in
+  --version) echo "tesseract 5.3.0"; echo " leptonica-1.82.0";;
+  --list-langs) echo 'List of available languages in "/tessdata/" (2):'; echo swa; echo eng;;
+esac
+"""
+
+@pytest.fixture
+def fake_tesseract(tmp_path, monkeypatch):
+    if sys.platform == 'win32':
+        pytest.skip('shell script binary')
+    binary = tmp_path / 'bin' / 'tesseract'
+    binary.parent.mkdir()
+    binary.write_text(FAKE_TESSERACT)
+    binary.chmod(0o755)
+    monkeypatch.setattr(tesseract_probe, 'find_binary', lambda: str(binary))
+    monkeypatch.setattr(tesseract_probe, '_environment', None)
+    monkeypatch.delenv('TESSDATA_PREFIX', raising=False)
+    monkeypatch.setattr(tesseract_probe.pytesseract.pytesseract, 'tesseract_cmd', 'tesseract')
+    return binary
+
+def calls(binary):
+    log = binary.parent / 'calls.log'
+    return log.read_text().splitlines() if log.exists() else []
+
+def test_probe_reads_version_and_languages(fake_tesseract, tmp_path):
+    environment = tesseract_probe.probe(cache_path=str(tmp_path / 'probe.json'))
+    assert environment['version'] == '5.3.0'
+    assert environment['languages'] == ['eng', 'swa']
+    assert not environment['cached']
+    assert tesseract_probe.pytesseract.pytesseract.tesseract_cmd == str(fake_tesseract)
+
+def test_probe_runs_once_per_process(fake_tesseract, tmp_path):
+    cache_path = str(tmp_path / 'probe.json')
+    tesseract_probe.probe(cache_path=cache_path)
+    tesseract_probe.probe(cache_path=cache_path)
+    assert len(calls(fake_tesseract)) == 2  # --version and --list-langs
+
+def test_later_workers_use_the_disk_cache(fake_tesseract, tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'probe.json')
+    tesseract_probe.probe(cache_path=cache_path)
+    monkeypatch.setattr(tesseract_probe, '_environment', None)  # a new worker
+    environment = tesseract_probe.probe(cache_path=cache_path)
+    assert environment['cached'] and environment['version'] == '5.3.0'
+    assert len(calls(fake_tesseract)) == 2
+
+def test_cache_is_invalidated_by_a_new_binary_or_language_data(fake_tesseract, tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'probe.json')
+    tesseract_probe.probe(cache_path=cache_path)
+
+    stat = os.stat(fake_tesseract)
+    os.utime(fake_tesseract, (stat.st_atime, stat.st_mtime + 10))  # upgraded in place
+    monkeypatch.setattr(tesseract_probe, '_environment', None)
+    assert not tesseract_probe.probe(cache_path=cache_path)['cached']
+
+    tessdata = tmp_path / 'tessdata'
+    tessdata.mkdir()
+    monkeypatch.setenv('TESSDATA_PREFIX', str(tessdata))  # other language data
+    monkeypatch.setattr(tesseract_probe, '_environment', None)
+    assert not tesseract_probe.probe(cache_path=cache_path)['cached']
+    assert calls(fake_tesseract)[-1] == f"--list-langs --tessdata-dir {tessdata}"
+
+def test_missing_tesseract(monkeypatch, tmp_path):
+    monkeypatch.setattr(tesseract_probe, 'find_binary', lambda: None)
+    monkeypatch.setattr(tesseract_probe, '_environment', None)
+    assert tesseract_probe.probe(cache_path=str(tmp_path / 'probe.json')) is None
+    assert not tesseract_probe.ensure_configured()
+
+def test_warm_up_records_the_self_test(fake_tesseract, tmp_path, monkeypatch):
+    from utils import tesseract_config
+    cache_path = str(tmp_path / 'probe.json')
+    monkeypatch.setattr(tesseract_config, 'test_swahili_ocr', lambda: True)
+    assert tesseract_probe.warm_up(self_test=True, cache_path=cache_path)['self_test'] is True
+    with open(cache_path) as f:
+        assert json.load(f)['environment']['self_test'] is True
+
+def test_importing_ocr_modules_does_not_run_tesseract(tmp_path):
+    """Cold start: importing the OCR pipeline probes nothing"""
+    env = {**os.environ, 'PATH': str(tmp_path)}  # any tesseract run would fail loudly below
+    (tmp_path / 'tesseract').write_text('#!/bin/sh\necho ran >> "$(dirname "$0")/ran.log"\n')
+    (tmp_path / 'tesseract').chmod(0o755)
+    code = ('import sys; import utils.ocr_extraction, utils.ocr_engine, utils.tesseract_probe as p; '
+            'sys.exit(0 if p._environment is None else 1)')
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', code], cwd=backend, env=env, capture_output=True, timeout=60)
+    assert result.returncode == 0, result.stderr.decode()[-2000:]
+    assert not (tmp_path / 'ran.log').exists()
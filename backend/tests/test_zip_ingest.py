@@ -0,0 +1,74 @@
+import io
+import zipfile
+import pytest
+from utils import zip_ingest
+
+def make_archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+def test_student_ids_come_from_file_names():
+    assert zip_ingest.parse_student('class/S1234_Jane_Doe.pdf') == ('S1234', 'Jane Doe')
+    assert zip_ingest.parse_student('S1234-page2.jpg') == ('S1234', 'S1234')
+    assert zip_ingest.parse_student('S1234_Jane Doe_p3.png') == ('S1234', 'Jane Doe')
+    assert zip_ingest.parse_student('S1234.png') == ('S1234', 'S1234')
+    assert zip_ingest.parse_student('_notes.png') == (None, None)
+
+def test_archive_over_budget_is_refused_before_reading():
+    archive = zipfile.ZipFile(make_archive({'S1.png': b'x' * 600, 'S2.png': b'x' * 600}))
+    with pytest.raises(zip_ingest.ArchiveTooLargeError):
+        zip_ingest.plan_archive(archive, max_uncompressed=1000)
+
+def test_plan_groups_pages_and_skips_other_files():
+    archive = zipfile.ZipFile(make_archive({
+        'S2_p2.jpg': b'b', 'S2_p1.jpg': b'a', 'S1.pdf': b'c', 'readme.txt': b'', '__MACOSX/._S1.pdf': b''
+    }))
+    students, skipped = zip_ingest.plan_archive(archive)
+    assert [info.filename for info in students['S2']['members']] == ['S2_p1.jpg', 'S2_p2.jpg']
+    assert list(students) == ['S1', 'S2']
+    assert skipped == [{'filename': 'readme.txt', 'reason': 'unsupported file type'}]
+
+def test_archive_becomes_graded_submissions(monkeypatch):
+    created, scored = [], []
+    monkeypatch.setattr(zip_ingest, 'extract_document_bytes',
+                        lambda data, filename, lang, profile, mode: {'text': data.decode()} if data != b'bad' else None)
+    monkeypatch.setattr(zip_ingest.supabase_client, 'get_rubric', lambda exam_id, raise_errors=False: {'content': 'rubric'})
+    monkeypatch.setattr(zip_ingest.supabase_client, 'create_submission',
+                        lambda **kwargs: created.append(kwargs) or {'id': f"sub-{kwargs['student_id']}"})
+    monkeypatch.setattr(zip_ingest.supabase_client, 'update_submission_score',
+                        lambda submission_id, score, feedback: scored.append((submission_id, score)))
+    monkeypatch.setattr(zip_ingest, 'grade_with_mistral',
+                        lambda answer, rubric, strictness: {'score': len(answer), 'feedback': 'ok'})
+
+    archive = make_archive({'S1_p1.jpg': b'page one', 'S1_p2.jpg': b'page two',
+                            'S2_Ali.png': b'jibu', 'S3.png': b'bad'})
+    lines = list(zip_ingest.ingest_archive(archive, exam_id='exam-1', created_by='teacher', grade=True))
+
+    assert lines[0] == {'plan': {'students': 3, 'files': 4, 'skipped': []}}
+    summary = lines[-1]['summary']
+    assert summary['submissions'] == 2 and summary['graded'] == 2 and summary['failed'] == 1
+    assert summary['bytes_read'] == len(b'page one' b'page two' b'jibu' b'bad')
+
+    results = {line['student_id']: line for line in lines[1:-1]}
+    assert results['S1']['submission_id'] == 'sub-S1'
+    assert results['S3']['error'] == 'No text could be extracted'
+    assert results['S3']['unreadable_files'] == ['S3.png']
+    texts = {kwargs['student_id']: kwargs['extracted_text_script'] for kwargs in created}
+    assert texts == {'S1': 'page one\npage two', 'S2': 'jibu'}
+    assert sorted(scored) == [('sub-S1', 17), ('sub-S2', 4)]
+
+def test_ingest_endpoint_rejects_archive_over_budget(monkeypatch):
+    from flask import Flask
+    from routes import ocr as ocr_routes
+    app = Flask(__name__)
+    app.register_blueprint(ocr_routes.bp)
+    monkeypatch.setattr(zip_ingest, 'OCR_ZIP_MAX_UNCOMPRESSED', 100)
+
+    data = {'test_scripts_zip': (make_archive({'S1.png': b'x' * 200}), 'class.zip'),
+            'exam_id': 'exam-1', 'created_by': 'teacher'}
+    response = app.test_client().post('/api/ocr/ingest-zip', data=data, content_type='multipart/form-data')
+    assert response.status_code == 413
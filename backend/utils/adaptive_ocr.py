@@ -0,0 +1,178 @@
+"""
+Adaptive OCR
+Two-pass OCR driven by Tesseract's word confidences. The first pass runs a
+cheap preprocessing profile over the whole page and collects per-word
+confidences along with the text. Only the lines whose median word confidence
+falls below OCR_CONFIDENCE_THRESHOLD are cropped from the normalized page, preprocessed
+with the heavier second-pass profile and read again; the second reading is
+kept where it is more confident. If most of the page is poor, the whole page
+is read again instead.
+"""
+
+import os
+import time
+import logging
+import statistics
+
+import cv2
+
+from utils import ocr_engine
+from utils.preprocessing import run_profile, PROFILES
+
+logger = logging.getLogger(__name__)
+
+OCR_TWO_PASS = os.environ.get('OCR_TWO_PASS', 'True') == 'True'
+# Profile used to re-read low-confidence regions
+OCR_SECOND_PASS_PROFILE = os.environ.get('OCR_SECOND_PASS_PROFILE', 'max_quality')
+# Lines whose median word confidence (0-100) is below this get a second pass.
+# The median, not the weakest word: handwriting has a poorly scored word on
+# almost every line, which alone is not worth re-reading the line for
+OCR_CONFIDENCE_THRESHOLD = float(os.environ.get('OCR_CONFIDENCE_THRESHOLD', 60))
+# Above this fraction of low-confidence lines the whole page is read again
+OCR_PAGE_RETRY_RATIO = float(os.environ.get('OCR_PAGE_RETRY_RATIO', 0.5))
+
+# Context kept around a line when it is cropped, in multiples of its height
+REGION_PADDING = 0.3
+
+if OCR_SECOND_PASS_PROFILE not in PROFILES:
+    logger.warning(f"Unknown OCR_SECOND_PASS_PROFILE '{OCR_SECOND_PASS_PROFILE}', using max_quality")
+    OCR_SECOND_PASS_PROFILE = 'max_quality'
+
+
+def group_lines(words, pass_number=1):
+    """Group recognized words into text lines in reading order"""
+    lines = {}
+    for word in words:
+        key = (word['block'], word['par'], word['line'])
+        lines.setdefault(key, []).append(word)
+
+    result = []
+    for key, line_words in lines.items():
+        x0 = min(w['box'][0] for w in line_words)
+        y0 = min(w['box'][1] for w in line_words)
+        x1 = max(w['box'][0] + w['box'][2] for w in line_words)
+        y1 = max(w['box'][1] + w['box'][3] for w in line_words)
+        result.append({
+            'block': key[0],
+            'words': line_words,
+            'box': (x0, y0, x1 - x0, y1 - y0),
+            'confidence': line_confidence(line_words),
+            'pass': pass_number
+        })
+    return result
+
+
+def line_confidence(words):
+    """Mean confidence of a line's words; Tesseract reports -1 for unscored words"""
+    scores = [w['conf'] for w in words if w['conf'] >= 0]
+    return round(sum(scores) / len(scores), 2) if scores else 0.0
+
+
+def lines_to_text(lines):
+    """Reassemble lines into page text, separating blocks with a blank line"""
+    parts, previous_block = [], None
+    for line in lines:
+        if previous_block is not None and line['block'] != previous_block:
+            parts.append('')
+        parts.append(' '.join(w['text'] for w in line['words']))
+        previous_block = line['block']
+    return '\n'.join(parts)
+
+
+def _needs_second_pass(line, threshold):
+    scores = [w['conf'] for w in line['words'] if w['conf'] >= 0]
+    return bool(scores) and statistics.median(scores) < threshold
+
+
+def _crop(gray, box):
+    x, y, w, h = box
+    pad = max(4, int(h * REGION_PADDING))
+    top, left = max(0, y - pad), max(0, x - pad)
+    return gray[top:y + h + pad, left:x + w + pad]
+
+
+def confidence_summary(lines, threshold):
+    words = [w for line in lines for w in line['words'] if w['conf'] >= 0]
+    return {
+        'mean': round(sum(w['conf'] for w in words) / len(words), 2) if words else 0.0,
+        'min': round(min((w['conf'] for w in words), default=0.0), 2),
+        'words': len(words),
+        'low_confidence_words': sum(1 for w in words if w['conf'] < threshold),
+        'lines': len(lines),
+        'threshold': threshold
+    }
+
+
+def two_pass_ocr(gray, processed, lang='swa', first_profile=None, second_profile=None, threshold=None):
+    """
+    OCR a page whose first-pass preprocessing (`processed`) has been done,
+    re-reading low-confidence lines from the normalized `gray` page with the
+    second-pass profile.
+    Returns {'text', 'confidence', 'regions', 'timings'}; each region has its
+    'box', 'confidence' and the 'pass' (1 or 2) its text came from.
+    """
+    second_profile = second_profile or OCR_SECOND_PASS_PROFILE
+    threshold = OCR_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    timings = {}
+
+    start = time.perf_counter()
+    lines = group_lines(ocr_engine.image_to_data(processed, lang=lang))
+    timings['ocr'] = round((time.perf_counter() - start) * 1000, 2)
+    first_summary = confidence_summary(lines, threshold)
+
+    weak = [i for i, line in enumerate(lines) if _needs_second_pass(line, threshold)]
+    if first_profile == second_profile:
+        weak = []  # the first pass already used the heavy profile
+    page_retried = False
+    if weak:
+        start = time.perf_counter()
+        if len(weak) > len(lines) * OCR_PAGE_RETRY_RATIO:
+            # Most of the page is poor: one full second pass beats many crops
+            page_retried = True
+            heavy, _ = run_profile(gray, second_profile)
+            retry = group_lines(ocr_engine.image_to_data(heavy, lang=lang), pass_number=2)
+            if confidence_summary(retry, threshold)['mean'] > first_summary['mean']:
+                lines = retry
+        else:
+            for i in weak:
+                line = lines[i]
+                heavy, _ = run_profile(_crop(gray, line['box']), second_profile)
+                heavy = cv2.copyMakeBorder(heavy, 10, 10, 10, 10, cv2.BORDER_CONSTANT, value=255)
+                words = ocr_engine.image_to_data(heavy, lang=lang)
+                confidence = line_confidence(words)
+                if words and confidence > line['confidence']:
+                    lines[i] = {**line, 'words': [{**w, 'block': line['block']} for w in words],
+                                'confidence': confidence, 'pass': 2}
+        timings['second_pass'] = round((time.perf_counter() - start) * 1000, 2)
+        logger.debug(f"Second pass on {'whole page' if page_retried else f'{len(weak)} of {len(lines)} lines'} "
+                     f"took {timings['second_pass']:.0f}ms")
+
+    summary = confidence_summary(lines, threshold)
+    summary.update({
+        'first_pass_mean': first_summary['mean'],
+        'regions_retried': len(weak),
+        'regions_improved': sum(1 for line in lines if line['pass'] == 2),
+        'page_retried': page_retried,
+        'second_pass_profile': second_profile
+    })
+    regions = [{'box': list(line['box']), 'confidence': line['confidence'], 'pass': line['pass']}
+               for line in lines]
+    return {'text': lines_to_text(lines), 'confidence': summary, 'regions': regions, 'timings': timings}
+
+
+def merge_summaries(summaries):
+    """Combine per-page confidence summaries into one for the document"""
+    summaries = [s for s in summaries if s]
+    if not summaries:
+        return None
+    words = sum(s['words'] for s in summaries)
+    return {
+        'mean': round(sum(s['mean'] * s['words'] for s in summaries) / words, 2) if words else 0.0,
+        'min': min(s['min'] for s in summaries),
+        'words': words,
+        'low_confidence_words': sum(s['low_confidence_words'] for s in summaries),
+        'lines': sum(s.get('lines', 0) for s in summaries),
+        'regions_retried': sum(s['regions_retried'] for s in summaries),
+        'regions_improved': sum(s['regions_improved'] for s in summaries),
+        'pages_retried': sum(1 for s in summaries if s['page_retried'])
+    }
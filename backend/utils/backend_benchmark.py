@@ -0,0 +1,171 @@
+"""
+OCR Backend Benchmark
+Runs a corpus of pages through each OCR backend (see utils.ocr_engine) and
+reports pages/sec, p50/p95 latency, peak RSS and character error rate, so
+the backend can be chosen per deployment (OCR_ENGINE).
+
+Pages are preprocessed once, outside the timing, so only the backend is
+measured. Each backend runs in its own fresh process so that its memory
+peak is not mixed up with the others'; for subprocess backends the peak of
+the largest child (the tesseract binary) is reported separately.
+
+    python -m utils.backend_benchmark corpus/ --lang swa
+
+A corpus is a directory of page images; a page's ground truth, if any, is
+the .txt file with the same name.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from utils import ocr_engine
+from utils.preprocessing import run_profile
+from utils.text_metrics import character_error_rate
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+
+def load_corpus(directory):
+    """Read a corpus directory into [{'name', 'image' (grayscale), 'reference' or None}]"""
+    pages = []
+    for filename in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(filename)
+        if extension.lower() not in IMAGE_EXTENSIONS:
+            continue
+        image = cv2.imread(os.path.join(directory, filename), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            logger.warning(f"Skipping unreadable corpus page {filename}")
+            continue
+        reference_path = os.path.join(directory, stem + '.txt')
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, encoding='utf-8') as f:
+                reference = f.read()
+        pages.append({'name': filename, 'image': image, 'reference': reference})
+    return pages
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_backend(backend, pages, lang='swa', repeat=1):
+    """OCR the (preprocessed) pages with one backend in this process and summarize the run"""
+    pool = ocr_engine.get_pool(lang, backend=backend)
+    pool.warm_up()
+
+    latencies, rates, texts = [], [], {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            page_start = time.perf_counter()
+            text = ocr_engine.image_to_string(page['processed'], lang=lang, backend=backend)
+            latencies.append((time.perf_counter() - page_start) * 1000)
+            texts[page['name']] = text
+    seconds = time.perf_counter() - start
+
+    for page in pages:
+        if page.get('reference') is not None:
+            rates.append(character_error_rate(texts[page['name']], page['reference']))
+
+    with pool.engine() as engine:
+        engine_name = engine.name
+    return {
+        'backend': backend,
+        'engine': engine_name,  # differs from backend if the engine fell back to pytesseract
+        'version': ocr_engine.engine_version(backend),
+        'pages': len(latencies),
+        'seconds': round(seconds, 3),
+        'pages_per_sec': round(len(latencies) / seconds, 3) if seconds else None,
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+        'cer': round(sum(rates) / len(rates), 4) if rates else None,
+        'peak_rss_mb': _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        'peak_child_rss_mb': _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+    }
+
+
+def _run_isolated(backend, pages, lang, repeat):
+    try:
+        return run_backend(backend, pages, lang, repeat)
+    except Exception as e:
+        return {'backend': backend, 'error': f"{type(e).__name__}: {str(e)}"}
+
+
+def benchmark(pages, backends=None, lang='swa', profile=None, repeat=1, isolate=True):
+    """
+    Benchmark each backend (default: every available one) on corpus `pages`.
+    With `isolate`, each backend runs in a fresh process so its peak RSS is
+    its own. Returns one result dict per backend, fastest first; backends
+    that failed report an 'error' instead and come last.
+    """
+    prepared = [{**page, 'processed': run_profile(page['image'], profile)[0]} for page in pages]
+    for page in prepared:
+        del page['image']
+
+    results = []
+    for backend in backends or ocr_engine.available_backends():
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                result = pool.submit(_run_isolated, backend, prepared, lang, repeat).result()
+        else:
+            result = _run_isolated(backend, prepared, lang, repeat)
+        if 'error' in result:
+            logger.error(f"Backend {backend} failed: {result['error']}")
+        else:
+            logger.info(f"{backend}: {result['pages_per_sec']} pages/sec, p95 {result['p95_ms']}ms, "
+                        f"CER {result['cer']}")
+        results.append(result)
+    return sorted(results, key=lambda r: -(r.get('pages_per_sec') or 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare OCR backends on a corpus of page images')
+    parser.add_argument('corpus', help='Directory of page images with optional .txt ground truth')
+    parser.add_argument('--backends', help='Comma-separated backends (default: all available)')
+    parser.add_argument('--lang', default='swa')
+    parser.add_argument('--profile')
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    pages = load_corpus(args.corpus)
+    if not pages:
+        parser.error(f"No page images in {args.corpus}")
+    backends = args.backends.split(',') if args.backends else None
+    results = benchmark(pages, backends, lang=args.lang, profile=args.profile, repeat=args.repeat)
+    json.dump({'corpus': args.corpus, 'pages': len(pages), 'lang': args.lang, 'results': results},
+              sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,263 @@
+"""
+Chunked Uploads
+Resumable uploads for files larger than a single request may be (scanned
+ZIPs and PDFs of a whole class). A client opens an upload session listing
+its files, then sends each file in chunks of at most OCR_UPLOAD_CHUNK_SIZE
+bytes, each with the offset it starts at and its SHA-256:
+
+    POST /api/ocr/uploads                       -> upload id, chunk size
+    PUT  /api/ocr/uploads/<id>/files/<n>?offset  (raw chunk body)
+    GET  /api/ocr/uploads/<id>                   -> bytes received per file
+
+Chunks are written into a spool directory at their offset, so resending a
+chunk after a dropped connection is harmless and a client resumes from the
+'received' count of each file. A file is complete once all its bytes are
+in and its whole-file SHA-256 (if given) matches; the route then queues it
+for OCR while the session's other files are still arriving.
+
+Session metadata never changes after it is created and each file's state
+lives in its own files, so chunks may be handled by any web worker.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+from utils import job_queue
+
+logger = logging.getLogger(__name__)
+
+OCR_UPLOAD_DIR = os.environ.get('OCR_UPLOAD_DIR', os.path.join(job_queue.OCR_JOB_DIR, 'uploads'))
+# Largest chunk accepted; must stay below the app's MAX_CONTENT_LENGTH
+OCR_UPLOAD_CHUNK_SIZE = int(os.environ.get('OCR_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))  # 8MB
+# Total size of the files of one session
+OCR_UPLOAD_MAX_BYTES = int(os.environ.get('OCR_UPLOAD_MAX_BYTES', 2 * 1024 * 1024 * 1024))  # 2GB
+# Seconds an upload session is kept after it was opened
+OCR_UPLOAD_TTL = float(os.environ.get('OCR_UPLOAD_TTL', 24 * 3600))
+
+
+class UploadError(Exception):
+    """A request that does not fit the upload session; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def _hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json(path, value):
+    # Write to a temp file and rename so other workers never read a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+class UploadSpool:
+    """Spool directory holding the chunks of open upload sessions"""
+
+    def __init__(self, spool_dir=OCR_UPLOAD_DIR, chunk_size=OCR_UPLOAD_CHUNK_SIZE, max_bytes=OCR_UPLOAD_MAX_BYTES,
+                 ttl=OCR_UPLOAD_TTL):
+        self.spool_dir = spool_dir
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def _directory(self, upload_id):
+        if not upload_id or not all(c in '0123456789abcdef' for c in upload_id):
+            raise UploadError('Upload not found', status=404)
+        return os.path.join(self.spool_dir, upload_id)
+
+    def _session(self, upload_id):
+        try:
+            with open(os.path.join(self._directory(upload_id), 'session.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadError('Upload not found', status=404) from None
+
+    def _file(self, session, index):
+        if not 0 <= index < len(session['files']):
+            raise UploadError(f"Upload has no file {index}", status=404)
+        return session['files'][index]
+
+    def create(self, files, params=None):
+        """
+        Open a session for `files` ([{'name', 'size', 'sha256' (optional)}]).
+        `params` are kept with it for whoever processes the files.
+        Returns the session status.
+        """
+        self.expire()
+        if not files:
+            raise UploadError('No files to upload')
+        entries = []
+        for file in files:
+            name, size = os.path.basename(str(file.get('name') or '')), file.get('size')
+            if not name or not isinstance(size, int) or size <= 0:
+                raise UploadError('Every file needs a name and a positive size')
+            entries.append({'name': name, 'size': size, 'sha256': (file.get('sha256') or '').lower() or None})
+        total = sum(entry['size'] for entry in entries)
+        if total > self.max_bytes:
+            raise UploadError(f"Upload of {total} bytes exceeds the {self.max_bytes} byte limit", status=413)
+
+        upload_id = uuid.uuid4().hex
+        directory = self._directory(upload_id)
+        os.makedirs(directory)
+        _write_json(os.path.join(directory, 'session.json'), {
+            'upload_id': upload_id,
+            'files': entries,
+            'chunk_size': self.chunk_size,
+            'params': params or {},
+            'created_at': time.time()
+        })
+        logger.info(f"Opened upload {upload_id}: {len(entries)} files, {total} bytes")
+        return self.status(upload_id)
+
+    def _file_status(self, upload_id, index, entry):
+        directory = self._directory(upload_id)
+        status = {'index': index, 'name': entry['name'], 'size': entry['size'], 'received': 0, 'complete': False}
+        try:
+            with open(os.path.join(directory, f"{index}.done.json"), encoding='utf-8') as f:
+                return {**status, 'received': entry['size'], 'complete': True, **json.load(f)}
+        except (OSError, ValueError):
+            pass
+        part = os.path.join(directory, f"{index}.part")
+        if os.path.exists(part):
+            status['received'] = os.path.getsize(part)
+        return status
+
+    def status(self, upload_id):
+        """Session parameters and, per file, the bytes received so far (where to resume)"""
+        session = self._session(upload_id)
+        files = [self._file_status(upload_id, index, entry) for index, entry in enumerate(session['files'])]
+        for file in files:
+            file.pop('path', None)  # server-side only
+        return {
+            'upload_id': upload_id,
+            'chunk_size': session['chunk_size'],
+            'params': session['params'],
+            'files': files,
+            'complete': all(file['complete'] for file in files)
+        }
+
+    def write_chunk(self, upload_id, index, offset, data, checksum=None):
+        """
+        Write a chunk of file `index` at byte `offset`. `checksum` is the
+        chunk's SHA-256. A chunk may be resent; one that starts past the
+        received bytes is refused so no gap is left. Returns the file's
+        status, with 'completed' True for the chunk that completed it.
+        """
+        session = self._session(upload_id)
+        entry = self._file(session, index)
+        status = self._file_status(upload_id, index, entry)
+        if status['complete']:
+            return {**status, 'completed': False}
+        if len(data) > session['chunk_size']:
+            raise UploadError(f"Chunks may be at most {session['chunk_size']} bytes", status=413)
+        if offset < 0 or offset > status['received']:
+            raise UploadError(f"Chunk at {offset} leaves a gap; resume at {status['received']}", status=409,
+                              received=status['received'])
+        if offset + len(data) > entry['size']:
+            raise UploadError(f"Chunk ends past the declared size of {entry['name']}", status=416)
+        if checksum and hashlib.sha256(data).hexdigest() != checksum.lower():
+            raise UploadError('Chunk checksum does not match; resend it', status=422,
+                              received=status['received'])
+
+        part = os.path.join(self._directory(upload_id), f"{index}.part")
+        # Written at its offset, not appended, so a resent chunk overwrites the same bytes
+        fd = os.open(part, os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            if hasattr(os, 'pwrite'):
+                os.pwrite(fd, data, offset)
+            else:  # Windows
+                os.lseek(fd, offset, os.SEEK_SET)
+                os.write(fd, data)
+        finally:
+            os.close(fd)
+
+        received = os.path.getsize(part)
+        if received < entry['size']:
+            return {**status, 'received': received, 'completed': False}
+        return self._complete(upload_id, index, entry, part)
+
+    def _complete(self, upload_id, index, entry, part):
+        try:
+            if entry['sha256'] and _hash_file(part) != entry['sha256']:
+                os.remove(part)
+                raise UploadError(f"{entry['name']} does not match its checksum; upload it again", status=422,
+                                  received=0)
+            path = os.path.join(self._directory(upload_id), f"{index}.{entry['name']}")
+            os.replace(part, path)
+        except FileNotFoundError:
+            # A concurrent request for the last chunk completed the file first
+            return {**self._file_status(upload_id, index, entry), 'completed': False}
+        self.finish(upload_id, index, path=path)
+        logger.info(f"Upload {upload_id}: {entry['name']} complete ({entry['size']} bytes)")
+        return {**self._file_status(upload_id, index, entry), 'completed': True}
+
+    def finish(self, upload_id, index, **info):
+        """Record information about a complete file, e.g. its OCR job or where it was moved"""
+        done = os.path.join(self._directory(upload_id), f"{index}.done.json")
+        with self._lock:
+            try:
+                with open(done, encoding='utf-8') as f:
+                    info = {**json.load(f), **info}
+            except (OSError, ValueError):
+                pass
+            _write_json(done, info)
+
+    def path(self, upload_id, index):
+        """Path of a complete file of the session"""
+        session = self._session(upload_id)
+        status = self._file_status(upload_id, index, self._file(session, index))
+        if not status['complete'] or not os.path.exists(status.get('path') or ''):
+            raise UploadError(f"File {index} of upload {upload_id} is not complete", status=409,
+                              received=status['received'])
+        return status['path']
+
+    def remove(self, upload_id):
+        shutil.rmtree(self._directory(upload_id), ignore_errors=True)
+
+    def expire(self):
+        """Remove sessions opened more than `ttl` seconds ago; returns how many"""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for upload_id in os.listdir(self.spool_dir):
+            session = os.path.join(self.spool_dir, upload_id, 'session.json')
+            try:
+                if os.path.getmtime(session) < cutoff:
+                    shutil.rmtree(os.path.join(self.spool_dir, upload_id), ignore_errors=True)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"Removed {removed} expired uploads")
+        return removed
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool():
+    """Return the process-wide upload spool"""
+    global _spool
+    with _spool_lock:
+        if _spool is None:
+            _spool = UploadSpool()
+        return _spool
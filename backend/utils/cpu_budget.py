@@ -0,0 +1,166 @@
+"""
+CPU Budget
+Decides how the cores given to OCR are shared out. Tesseract (OpenMP) and
+OpenCV each start a thread per core by default, so several gunicorn workers,
+each with a page OCR pool, each running multi-threaded Tesseract and OpenCV,
+oversubscribe the box many times over and throughput falls below that of a
+single worker.
+
+The budget (OCR_CPU_BUDGET cores) is split evenly between the web workers
+(OCR_WEB_WORKERS). Within a worker the cores go to the page OCR processes
+(OCR_PDF_WORKERS) plus the worker's own in-process OCR, and each of those
+OCR tasks gets OCR_THREADS_PER_TASK engine threads, applied through
+OMP_THREAD_LIMIT and cv2.setNumThreads.
+
+    python -m utils.cpu_budget scan.pdf page.jpg
+
+benchmarks combinations of processes and threads per task on real pages and
+reports the fastest.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+# Cores the whole machine (or container) gives to OCR
+OCR_CPU_BUDGET = int(os.environ.get('OCR_CPU_BUDGET', os.cpu_count() or 1))
+# Processes sharing the budget, usually the number of gunicorn workers
+OCR_WEB_WORKERS = int(os.environ.get('OCR_WEB_WORKERS', os.environ.get('WEB_CONCURRENCY', 1)))
+
+
+def worker_cores():
+    """Cores available to one web worker"""
+    return max(1, OCR_CPU_BUDGET // max(1, OCR_WEB_WORKERS))
+
+
+def page_processes():
+    """Size of the page OCR process pool (OCR_PDF_WORKERS, default: worker cores - 1)"""
+    default = max(1, worker_cores() - 1)
+    return max(1, int(os.environ.get('OCR_PDF_WORKERS', default)))
+
+
+def thread_limit():
+    """
+    Engine threads per OCR task (OCR_THREADS_PER_TASK). By default the
+    worker's cores are divided between its page processes and its own
+    in-process OCR, which usually means one thread per task.
+    """
+    configured = int(os.environ.get('OCR_THREADS_PER_TASK', 0))
+    if configured > 0:
+        return configured
+    return max(1, worker_cores() // (page_processes() + 1))
+
+
+def apply_thread_limits(threads=None):
+    """
+    Cap Tesseract and OpenCV threads in this process. OpenMP reads
+    OMP_THREAD_LIMIT when the Tesseract library loads, so this has to run
+    before the engine is imported; child processes inherit it.
+    """
+    threads = threads or thread_limit()
+    os.environ['OMP_THREAD_LIMIT'] = str(threads)
+    cv2.setNumThreads(threads)
+    return threads
+
+
+def plan():
+    """The current CPU allocation, e.g. for logs and stats endpoints"""
+    return {
+        'cpu_budget': OCR_CPU_BUDGET,
+        'web_workers': OCR_WEB_WORKERS,
+        'worker_cores': worker_cores(),
+        'page_processes': page_processes(),
+        'threads_per_task': thread_limit(),
+        'omp_thread_limit': os.environ.get('OMP_THREAD_LIMIT'),
+        'cv2_threads': cv2.getNumThreads()
+    }
+
+
+def candidate_settings(cores=None):
+    """
+    (processes, threads per task) pairs worth benchmarking on `cores` cores:
+    every power of two up to the core count for each, without
+    oversubscribing by more than 2x
+    """
+    cores = cores or worker_cores()
+    sizes = sorted({2 ** i for i in range(cores.bit_length()) if 2 ** i <= cores} | {cores})
+    return [(processes, threads) for processes in sizes for threads in sizes
+            if processes * threads <= 2 * cores]
+
+
+def _init_benchmark_worker(threads):
+    os.environ['OCR_THREADS_PER_TASK'] = str(threads)
+    apply_thread_limits(threads)
+
+
+def benchmark(pages, settings=None, lang='swa', profile=None, repeat=1):
+    """
+    OCR `pages` (grayscale arrays) with each (processes, threads) setting in a
+    fresh process pool, so OpenMP picks up the thread limit. Engines are
+    warmed up before timing. Returns a list of {'processes', 'threads',
+    'pages', 'seconds', 'pages_per_sec'}, fastest first.
+    """
+    from utils.ocr_extraction import _ocr_page_task
+
+    results = []
+    work = list(pages) * repeat
+    for processes, threads in settings or candidate_settings():
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_benchmark_worker, initargs=(threads,)) as pool:
+            # One page per process loads its engine and model outside the timing
+            list(pool.map(_ocr_page_task, work[:processes], [lang] * processes,
+                          [profile] * processes, [None] * processes))
+            start = time.perf_counter()
+            list(pool.map(_ocr_page_task, work, [lang] * len(work), [profile] * len(work), [None] * len(work)))
+            seconds = time.perf_counter() - start
+        result = {'processes': processes, 'threads': threads, 'pages': len(work),
+                  'seconds': round(seconds, 3), 'pages_per_sec': round(len(work) / seconds, 3)}
+        logger.info(f"{processes} processes x {threads} threads: {result['pages_per_sec']} pages/sec")
+        results.append(result)
+    return sorted(results, key=lambda r: r['pages_per_sec'], reverse=True)
+
+
+def _load_pages(paths):
+    from utils.ocr_extraction import iter_pdf_pages
+
+    pages = []
+    for path in paths:
+        if path.lower().endswith('.pdf'):
+            pages.extend(page for _, page in iter_pdf_pages(path))
+        else:
+            page = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if page is None:
+                raise ValueError(f"Could not read {path}")
+            pages.append(page)
+    return pages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find the fastest OCR processes/threads split for this machine')
+    parser.add_argument('files', nargs='+', help='Images or PDFs to OCR')
+    parser.add_argument('--lang', default='swa')
+    parser.add_argument('--profile')
+    parser.add_argument('--repeat', type=int, default=1, help='OCR the pages this many times per setting')
+    parser.add_argument('--cores', type=int, help='Cores to plan for (default: cores per web worker)')
+    args = parser.parse_args(argv)
+
+    results = benchmark(_load_pages(args.files), candidate_settings(args.cores), lang=args.lang,
+                        profile=args.profile, repeat=args.repeat)
+    best = results[0]
+    json.dump({'plan': plan(), 'results': results, 'best': best}, sys.stdout, indent=2)
+    print(f"\nBest: OCR_PDF_WORKERS={best['processes']} OCR_THREADS_PER_TASK={best['threads']}",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,274 @@
+"""
+Derived Assets
+Downscaled previews and per-page thumbnails of uploaded rubrics, generated
+in the background after upload so that the dashboard no longer loads the
+full-size rubric from its image_url on every view.
+
+Assets are content-addressed: they live under the SHA-256 of the source
+file, and each file name carries the rendition (kind, width and
+ASSET_FORMAT_VERSION), so an asset never changes once written and is served
+with a long-lived immutable Cache-Control. A manifest.json next to them
+lists the preview and the page thumbnails.
+
+    <OCR_ASSET_DIR>/<sha[:2]>/<sha>/preview-w1024-v1.jpg
+    <OCR_ASSET_DIR>/<sha[:2]>/<sha>/page-1-w240-v1.jpg
+    <OCR_ASSET_DIR>/<sha[:2]>/<sha>/manifest.json
+"""
+
+import io
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import pdf2image
+from PIL import Image
+
+import supabase_client
+
+logger = logging.getLogger(__name__)
+
+OCR_ASSET_DIR = os.environ.get(
+    'OCR_ASSET_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'derived_assets')
+)
+ASSET_PREVIEW_WIDTH = int(os.environ.get('ASSET_PREVIEW_WIDTH', 1024))
+ASSET_THUMBNAIL_WIDTH = int(os.environ.get('ASSET_THUMBNAIL_WIDTH', 240))
+ASSET_JPEG_QUALITY = int(os.environ.get('ASSET_JPEG_QUALITY', 80))
+# Pages of a PDF rubric that get a thumbnail
+ASSET_MAX_PAGES = int(os.environ.get('ASSET_MAX_PAGES', 50))
+# Rasterization resolution for PDF pages; enough for the preview width
+ASSET_PDF_DPI = int(os.environ.get('ASSET_PDF_DPI', 100))
+# Largest rubric file downloaded for rendering
+ASSET_MAX_SOURCE_BYTES = int(os.environ.get('ASSET_MAX_SOURCE_BYTES', 50 * 1024 * 1024))
+# Hosts rubric files are downloaded from (default: the project's Supabase);
+# any other image_url is never fetched
+ASSET_SOURCE_HOSTS = [host.strip().lower() for host in os.environ.get(
+    'ASSET_SOURCE_HOSTS', urlparse(supabase_client.SUPABASE_URL).hostname).split(',') if host.strip()]
+ASSET_WORKERS = int(os.environ.get('ASSET_WORKERS', 1))
+# Seconds browsers and proxies may keep an asset
+ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', 365 * 24 * 3600))
+
+# Bump when renditions change so new names are generated
+ASSET_FORMAT_VERSION = 1
+
+URL_PREFIX = '/api/assets'
+_SOURCE = re.compile(r'^[0-9a-f]{64}$')
+_FILE = re.compile(r'^[a-z0-9-]+\.(jpg|json)$')
+
+
+def asset_url(source_hash, filename):
+    return f"{URL_PREFIX}/{source_hash}/{filename}"
+
+
+def _source_pages(data, max_pages):
+    """Yield the pages of a rubric file (PDF or image, first frames) as RGB PIL images, one at a time"""
+    if data[:5] == b'%PDF-':
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as spill:
+            spill.write(data)
+            spill.flush()
+            pages = pdf2image.pdfinfo_from_path(spill.name)['Pages']
+            for number in range(1, min(pages, max_pages) + 1):
+                image = pdf2image.convert_from_path(spill.name, dpi=ASSET_PDF_DPI, first_page=number,
+                                                    last_page=number)[0]
+                yield image.convert('RGB')
+        return
+
+    with Image.open(io.BytesIO(data)) as image:
+        for index in range(min(getattr(image, 'n_frames', 1), max_pages)):
+            image.seek(index)
+            yield image.convert('RGB')
+
+
+def _encode(image, width):
+    image = image.copy()
+    image.thumbnail((width, width * 4), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=ASSET_JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+class AssetStore:
+    """Disk store of content-addressed previews and thumbnails"""
+
+    def __init__(self, asset_dir=OCR_ASSET_DIR):
+        self.asset_dir = asset_dir
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.reused = 0
+        self.failures = 0
+        os.makedirs(asset_dir, exist_ok=True)
+
+    def _directory(self, source_hash):
+        return os.path.join(self.asset_dir, source_hash[:2], source_hash)
+
+    def path(self, source_hash, filename):
+        """Path of an asset, or None if the name is not a valid asset name or it does not exist"""
+        if not _SOURCE.match(source_hash) or not _FILE.match(filename):
+            return None
+        path = os.path.join(self._directory(source_hash), filename)
+        return path if os.path.exists(path) else None
+
+    def _write(self, directory, filename, data):
+        # Write to a temp file and rename so a partial asset is never served
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(directory, filename))
+
+    def manifest(self, source_hash):
+        """The manifest of a source's assets, or None if they were not generated"""
+        path = self.path(source_hash, 'manifest.json')
+        if not path:
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def render(self, data):
+        """
+        Generate the preview (first page) and page thumbnails of a rubric
+        file's bytes unless they already exist. Returns the manifest:
+        {'source', 'pages', 'preview', 'thumbnails'} with asset URLs.
+        """
+        source_hash = hashlib.sha256(data).hexdigest()
+        manifest = self.manifest(source_hash)
+        if manifest and manifest.get('version') == ASSET_FORMAT_VERSION:
+            with self._lock:
+                self.reused += 1
+            return manifest
+
+        directory = self._directory(source_hash)
+        os.makedirs(directory, exist_ok=True)
+        preview, thumbnails = None, []
+        for number, page in enumerate(_source_pages(data, ASSET_MAX_PAGES), start=1):
+            if preview is None:
+                preview = f"preview-w{ASSET_PREVIEW_WIDTH}-v{ASSET_FORMAT_VERSION}.jpg"
+                self._write(directory, preview, _encode(page, ASSET_PREVIEW_WIDTH))
+            thumbnail = f"page-{number}-w{ASSET_THUMBNAIL_WIDTH}-v{ASSET_FORMAT_VERSION}.jpg"
+            self._write(directory, thumbnail, _encode(page, ASSET_THUMBNAIL_WIDTH))
+            thumbnails.append(asset_url(source_hash, thumbnail))
+            page.close()
+
+        manifest = {
+            'version': ASSET_FORMAT_VERSION,
+            'source': source_hash,
+            'pages': len(thumbnails),
+            'preview': asset_url(source_hash, preview) if preview else None,
+            'thumbnails': thumbnails
+        }
+        # Written last: a manifest means every asset it lists is in place
+        self._write(directory, 'manifest.json', json.dumps(manifest).encode('utf-8'))
+        with self._lock:
+            self.generated += 1
+        logger.info(f"Generated preview and {len(thumbnails)} thumbnails for {source_hash[:12]}")
+        return manifest
+
+    def manifest_for_url(self, url):
+        """Manifest of the source behind an asset URL (e.g. a rubric's preview), or None"""
+        parts = (url or '').split('/')
+        if len(parts) < 2 or not url.startswith(URL_PREFIX + '/'):
+            return None
+        return self.manifest(parts[-2])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'generated': self.generated,
+                'reused': self.reused,
+                'failures': self.failures,
+                'pending': _pending,
+                'asset_dir': self.asset_dir
+            }
+
+
+STORAGE_PATH = '/storage/v1/object/'
+
+
+def is_allowed_source(url):
+    """True if `url` is an https URL of Supabase Storage on one of ASSET_SOURCE_HOSTS"""
+    try:
+        parsed = urlparse(url or '')
+        port = parsed.port
+    except ValueError:
+        return False
+    return (parsed.scheme == 'https' and port in (None, 443) and not parsed.username and not parsed.password
+            and (parsed.hostname or '').lower() in ASSET_SOURCE_HOSTS and parsed.path.startswith(STORAGE_PATH))
+
+
+def download(url, max_bytes=ASSET_MAX_SOURCE_BYTES):
+    """Fetch a rubric file from Supabase Storage, refusing anything larger than `max_bytes`"""
+    if not is_allowed_source(url):
+        raise ValueError(f"Refusing to download rubric from {url}")
+    # Redirects could lead off the storage host
+    with requests.get(url, stream=True, timeout=60, allow_redirects=False) as response:
+        response.raise_for_status()
+        buffer = io.BytesIO()
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            buffer.write(chunk)
+            if buffer.tell() > max_bytes:
+                raise ValueError(f"Rubric file is larger than {max_bytes} bytes")
+        return buffer.getvalue()
+
+
+def generate_rubric_assets(rubric_id, image_url):
+    """Download a rubric, render its assets and record the preview URL on the rubric row"""
+    store = get_store()
+    try:
+        manifest = store.render(download(image_url))
+    except Exception as e:
+        with store._lock:
+            store.failures += 1
+        logger.error(f"Could not generate preview for rubric {rubric_id}: {str(e)}")
+        return None
+    if manifest['preview']:
+        supabase_client.update_rubric_preview(rubric_id, manifest['preview'])
+    return manifest
+
+
+_store = None
+_executor = None
+_pending = 0
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide asset store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AssetStore()
+        return _store
+
+
+def _run(rubric_id, image_url):
+    global _pending
+    try:
+        return generate_rubric_assets(rubric_id, image_url)
+    finally:
+        with _store_lock:
+            _pending -= 1
+
+
+def schedule(rubric_id, image_url):
+    """
+    Generate a rubric's preview and thumbnails in the background; returns the
+    future, or None if `image_url` is not on Supabase Storage
+    """
+    global _executor, _pending
+    if not is_allowed_source(image_url):
+        logger.warning(f"Not generating preview for rubric {rubric_id}: {image_url} is not on Supabase Storage")
+        return None
+    with _store_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ASSET_WORKERS, thread_name_prefix='assets')
+        _pending += 1
+    return _executor.submit(_run, rubric_id, image_url)
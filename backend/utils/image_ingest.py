@@ -0,0 +1,196 @@
+"""
+Image Ingestion
+Decodes uploaded images straight to the grayscale buffers the OCR pipeline
+works on. Large JPEGs are decoded at reduced size using the JPEG DCT scaling,
+which is far cheaper than decoding at full resolution and resizing after.
+
+Multi-frame files (multi-page TIFFs from school scanners, animated WebP)
+are read one frame at a time with iter_frames_gray, so only the frame being
+OCR'd is ever held decoded.
+
+Uploads can be decoded from memory: the request body is read once into a
+bytes object and decoded by OpenCV directly to grayscale, so no temp file
+is written and no RGB/BGR frame is ever materialized. Every buffer the
+ingestion path allocates is counted so requests can report bytes copied.
+
+Phone photos carry their rotation in the EXIF Orientation tag. Both decode
+paths ignore the decoder's own handling of it and apply the tag themselves
+with apply_orientation, so a file gives the same pixels whichever way it was
+ingested.
+"""
+
+import io
+import os
+import logging
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Photos above this many pixels are decoded at a reduced size where the
+# format allows it (JPEG: 1/2, 1/4 or 1/8 scale)
+OCR_MAX_DECODE_PIXELS = int(os.environ.get('OCR_MAX_DECODE_PIXELS', 12_000_000))
+
+# Formats that can hold several pages; they are OCR'd frame by frame
+FRAME_EXTENSIONS = ('.tif', '.tiff', '.webp')
+
+
+def is_frame_format(filename):
+    """True if the file name is of a format read frame by frame (see iter_frames_gray)"""
+    return filename.lower().endswith(FRAME_EXTENSIONS)
+
+
+# EXIF Orientation tag and the transform that turns each value upright
+EXIF_ORIENTATION = 0x0112
+_ORIENTATIONS = {
+    2: lambda gray: cv2.flip(gray, 1),
+    3: lambda gray: cv2.rotate(gray, cv2.ROTATE_180),
+    4: lambda gray: cv2.flip(gray, 0),
+    5: cv2.transpose,
+    6: lambda gray: cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE),
+    7: lambda gray: cv2.flip(cv2.transpose(gray), -1),
+    8: lambda gray: cv2.rotate(gray, cv2.ROTATE_90_COUNTERCLOCKWISE),
+}
+
+
+def exif_orientation(image):
+    """EXIF Orientation of an opened Pillow image, 1 (upright) if it has none"""
+    try:
+        orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception as e:
+        logger.debug(f"Unreadable EXIF, assuming upright: {str(e)}")
+        return 1
+    return orientation if orientation in _ORIENTATIONS else 1
+
+
+def apply_orientation(gray, orientation, stats=None):
+    """Turn a decoded (still EXIF-oriented) array upright"""
+    if orientation not in _ORIENTATIONS:
+        return gray
+    gray = _ORIENTATIONS[orientation](gray)
+    _count(stats, gray.nbytes)
+    return gray
+
+
+def load_image_gray(file_path, max_pixels=None, stats=None):
+    """
+    Open an image file as an upright grayscale NumPy array.
+    Returns (gray, scale) where scale is decoded pixels per original pixel.
+    """
+    max_pixels = max_pixels or OCR_MAX_DECODE_PIXELS
+    with Image.open(file_path) as image:
+        logger.debug(f"Image opened: {image.format}, {image.size}, {image.mode}")
+        original_width, original_height = image.size
+        orientation = exif_orientation(image)
+
+        if image.format == 'JPEG' and original_width * original_height > max_pixels:
+            factor = (max_pixels / (original_width * original_height)) ** 0.5
+            # draft() picks the smallest DCT scale that is still >= the requested size
+            image.draft('L', (int(original_width * factor), int(original_height * factor)))
+
+        gray = image if image.mode == 'L' else image.convert('L')
+        array = np.asarray(gray)
+
+    # Both axes are scaled alike, so the scale is taken before turning upright
+    scale = array.shape[1] / original_width
+    if scale != 1.0:
+        logger.debug(f"Decoded {original_width}x{original_height} JPEG at {scale:.3f} scale")
+    return apply_orientation(array, orientation, stats), scale
+
+
+# cv2.imdecode flags decoding straight to grayscale at 1/1, 1/2, 1/4 and 1/8 size
+_REDUCED_GRAYSCALE = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+def new_ingest_stats():
+    """Counters describing what ingesting one request cost in memory"""
+    return {'upload_bytes': 0, 'decoded_bytes': 0, 'bytes_copied': 0, 'buffers': 0}
+
+
+def _count(stats, nbytes):
+    if stats is not None:
+        stats['bytes_copied'] += nbytes
+        stats['buffers'] += 1
+
+
+def read_upload(file, stats=None):
+    """
+    Read an uploaded werkzeug FileStorage (or any file object) into a single
+    bytes object without touching the disk
+    """
+    file.seek(0)
+    data = file.read()
+    if stats is not None:
+        stats['upload_bytes'] += len(data)
+    _count(stats, len(data))
+    return data
+
+
+def decode_image_gray(data, max_pixels=None, stats=None):
+    """
+    Decode encoded image bytes straight into a grayscale NumPy array.
+    Returns (gray, scale) like load_image_gray, upright by the same EXIF
+    policy. JPEGs above `max_pixels` are decoded at 1/2, 1/4 or 1/8 size by
+    libjpeg itself.
+    """
+    max_pixels = max_pixels or OCR_MAX_DECODE_PIXELS
+    # Reads only the header; the pixels are decoded by OpenCV below
+    with Image.open(io.BytesIO(data)) as probe:
+        image_format = probe.format
+        original_width, original_height = probe.size
+        orientation = exif_orientation(probe)
+
+    flag = cv2.IMREAD_GRAYSCALE
+    if image_format == 'JPEG':
+        for factor, reduced in _REDUCED_GRAYSCALE:
+            if (original_width // factor) * (original_height // factor) >= max_pixels:
+                flag = reduced
+                break
+
+    # np.frombuffer wraps the bytes without copying them. OpenCV's own EXIF
+    # handling is off: the tag is applied below, exactly as load_image_gray does
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag | cv2.IMREAD_IGNORE_ORIENTATION)
+    if gray is None:
+        logger.debug(f"OpenCV cannot decode {image_format}, falling back to Pillow")
+        gray, scale = load_image_gray(io.BytesIO(data), max_pixels=max_pixels, stats=stats)
+    else:
+        # Taken before turning upright, while the axes still match the header size
+        scale = gray.shape[1] / original_width
+        gray = apply_orientation(gray, orientation, stats)
+
+    if stats is not None:
+        stats['decoded_bytes'] += gray.nbytes
+    _count(stats, gray.nbytes)
+    if scale != 1.0:
+        logger.debug(f"Decoded {original_width}x{original_height} {image_format} at {scale:.3f} scale")
+    return gray, scale
+
+
+def iter_frames_gray(source, stats=None):
+    """
+    Decode a (possibly multi-frame) image lazily, yielding (frame_number,
+    grayscale NumPy array) with 1-based frame numbers. `source` is a path or
+    encoded bytes. Only the current frame is decoded; each array is
+    independent of the file, so callers may keep it after the next frame.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)  # shares the buffer, no copy
+    with Image.open(source) as image:
+        frames = getattr(image, 'n_frames', 1)
+        logger.debug(f"Reading {frames} {image.format} frames")
+        for index in range(frames):
+            image.seek(index)
+            frame = image if image.mode == 'L' else image.convert('L')
+            gray = np.asarray(frame)
+            if frame is not image:
+                frame.close()
+            if stats is not None:
+                stats['decoded_bytes'] += gray.nbytes
+            _count(stats, gray.nbytes)
+            yield index + 1, gray
@@ -0,0 +1,345 @@
+"""
+OCR Job Queue
+Durable, SQLite-backed queue for asynchronous OCR. A request stores the
+upload and enqueues a job, then returns immediately with the job id; worker
+threads (in the web workers or a standalone `python -m utils.job_queue`
+process) claim jobs, run the OCR and write the result back for clients to
+poll.
+
+Jobs move queued -> running -> done | failed. A job that raises is retried
+with a backoff up to OCR_JOB_MAX_ATTEMPTS times; a job whose worker died
+is handed out again once its lease runs out. Every claim gets a new lease
+token and only its holder may record the outcome, so a worker that
+overran its lease cannot overwrite the new run's result or delete the
+upload it is still reading. Finished jobs and their files are removed
+after OCR_JOB_TTL seconds.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+OCR_JOB_DIR = os.environ.get(
+    'OCR_JOB_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ocr_jobs')
+)
+OCR_JOB_DB = os.environ.get('OCR_JOB_DB', os.path.join(OCR_JOB_DIR, 'jobs.sqlite3'))
+# Background worker threads started per web worker (0 = run workers separately)
+OCR_JOB_WORKERS = int(os.environ.get('OCR_JOB_WORKERS', 1))
+# Unfinished jobs accepted before new submissions are refused
+OCR_JOB_MAX_DEPTH = int(os.environ.get('OCR_JOB_MAX_DEPTH', 500))
+OCR_JOB_MAX_ATTEMPTS = int(os.environ.get('OCR_JOB_MAX_ATTEMPTS', 3))
+OCR_JOB_RETRY_DELAY = float(os.environ.get('OCR_JOB_RETRY_DELAY', 10))  # seconds, doubled per attempt
+OCR_JOB_LEASE = float(os.environ.get('OCR_JOB_LEASE', 900))  # seconds a running job may go silent
+OCR_JOB_TTL = float(os.environ.get('OCR_JOB_TTL', 24 * 3600))  # seconds finished jobs are kept
+OCR_JOB_POLL_INTERVAL = float(os.environ.get('OCR_JOB_POLL_INTERVAL', 1.0))
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    params TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    finished_at REAL,
+    lease_token TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at);
+"""
+
+
+class QueueFullError(Exception):
+    """Raised when OCR_JOB_MAX_DEPTH unfinished jobs are already queued"""
+
+
+class JobQueue:
+    """SQLite-backed OCR job queue shared by every process using the same database file"""
+
+    def __init__(self, db_path=OCR_JOB_DB, max_depth=OCR_JOB_MAX_DEPTH, max_attempts=OCR_JOB_MAX_ATTEMPTS,
+                 retry_delay=OCR_JOB_RETRY_DELAY, lease=OCR_JOB_LEASE, ttl=OCR_JOB_TTL):
+        self.db_path = db_path
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'lease_token' not in columns:  # databases created before lease tokens
+                conn.execute('ALTER TABLE jobs ADD COLUMN lease_token TEXT')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def submit(self, file_path, **params):
+        """Enqueue OCR of a stored file and return the job id"""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            depth = conn.execute('SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)', (QUEUED, RUNNING)).fetchone()[0]
+            if depth >= self.max_depth:
+                conn.execute('ROLLBACK')
+                raise QueueFullError(f"OCR queue is full ({depth} unfinished jobs)")
+            conn.execute(
+                'INSERT INTO jobs (id, status, file_path, params, created_at, updated_at, available_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, QUEUED, file_path, json.dumps(params), now, now, now)
+            )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        logger.info(f"Queued OCR job {job_id} ({depth + 1} unfinished)")
+        return job_id
+
+    def claim(self):
+        """
+        Take the oldest job that is due, or one whose worker's lease expired.
+        Returns the job as a dict (status running, with the 'lease_token' to
+        complete or fail it with) or None if there is nothing to do.
+        """
+        now = time.time()
+        token = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE (status = ? AND available_at <= ?) OR (status = ? AND updated_at < ?) '
+                'ORDER BY created_at LIMIT 1',
+                (QUEUED, now, RUNNING, now - self.lease)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            if row['status'] == RUNNING:
+                logger.warning(f"OCR job {row['id']} lost its worker, running it again")
+            conn.execute(
+                'UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ?, lease_token = ? WHERE id = ?',
+                (RUNNING, now, token, row['id'])
+            )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+        job = dict(row)
+        job['status'] = RUNNING
+        job['attempts'] += 1
+        job['lease_token'] = token
+        job['params'] = json.loads(job['params'])
+        return job
+
+    def complete(self, job, result):
+        """
+        Store the result of a job returned by claim; its upload is no longer
+        needed. Returns False, changing nothing, if the lease was lost to
+        another claim.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            updated = conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ?, finished_at = ?, '
+                'lease_token = NULL WHERE id = ? AND status = ? AND lease_token = ?',
+                (DONE, json.dumps(result), now, now, job['id'], RUNNING, job['lease_token'])
+            ).rowcount
+        if not updated:
+            logger.warning(f"OCR job {job['id']} was claimed again, dropping the result of its old lease")
+            return False
+        remove_job_files(job['file_path'])
+        return True
+
+    def fail(self, job, error):
+        """
+        Record a failed attempt of a job returned by claim: retry later with
+        backoff, or give up after max_attempts. Returns False, changing
+        nothing, if the lease was lost to another claim.
+        """
+        now = time.time()
+        job_id, attempts = job['id'], job['attempts']
+        with closing(self._connect()) as conn:
+            if attempts < self.max_attempts:
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                updated = conn.execute(
+                    'UPDATE jobs SET status = ?, error = ?, updated_at = ?, available_at = ?, lease_token = NULL '
+                    'WHERE id = ? AND status = ? AND lease_token = ?',
+                    (QUEUED, error, now, now + delay, job_id, RUNNING, job['lease_token'])
+                ).rowcount
+            else:
+                updated = conn.execute(
+                    'UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = ?, lease_token = NULL '
+                    'WHERE id = ? AND status = ? AND lease_token = ?',
+                    (FAILED, error, now, now, job_id, RUNNING, job['lease_token'])
+                ).rowcount
+        if not updated:
+            logger.warning(f"OCR job {job_id} was claimed again, dropping the failure of its old lease: {error}")
+            return False
+        if attempts < self.max_attempts:
+            logger.warning(f"OCR job {job_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+        else:
+            logger.error(f"OCR job {job_id} failed after {attempts} attempts: {error}")
+            remove_job_files(job['file_path'])
+        return True
+
+    def get(self, job_id):
+        """Return a job's public state, or None if it does not exist (or expired)"""
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            'job_id': row['id'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'finished_at': row['finished_at'],
+        }
+        if row['result'] is not None:
+            job['result'] = json.loads(row['result'])
+        if row['error'] is not None:
+            job['error'] = row['error']
+        if row['finished_at'] is not None:
+            job['expires_at'] = row['finished_at'] + self.ttl
+        return job
+
+    def expire(self):
+        """Delete finished jobs older than the TTL along with their files. Returns the count removed."""
+        cutoff = time.time() - self.ttl
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                'SELECT id, file_path FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?', (cutoff,)
+            ).fetchall()
+            conn.execute('DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?', (cutoff,))
+        for row in rows:
+            remove_job_files(row['file_path'])
+        return len(rows)
+
+    def stats(self):
+        with closing(self._connect()) as conn:
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        return {
+            'queued': counts.get(QUEUED, 0),
+            'running': counts.get(RUNNING, 0),
+            'done': counts.get(DONE, 0),
+            'failed': counts.get(FAILED, 0),
+            'max_depth': self.max_depth
+        }
+
+
+def remove_job_files(file_path):
+    """Remove a job's upload; each job keeps its file in its own directory"""
+    directory = os.path.dirname(file_path)
+    if os.path.dirname(os.path.abspath(directory)) == os.path.abspath(OCR_JOB_DIR):
+        shutil.rmtree(directory, ignore_errors=True)
+    elif os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def store_upload(file, filename):
+    """Save an uploaded werkzeug FileStorage where workers can reach it; returns the path"""
+    directory = os.path.join(OCR_JOB_DIR, uuid.uuid4().hex)
+    os.makedirs(directory)
+    file_path = os.path.join(directory, filename)
+    file.save(file_path)
+    return file_path
+
+
+def run_job(job):
+    """OCR one claimed job and return its JSON-serializable result"""
+    from utils.ocr_extraction import extract_document
+    from utils import ocr_languages
+
+    params = job['params']
+    document = extract_document(job['file_path'], lang=params.get('lang') or ocr_languages.OCR_DEFAULT_LANGUAGE,
+                                profile=params.get('profile'), mode=params.get('mode'))
+    if document is None:
+        raise RuntimeError('No text could be extracted')
+    return document
+
+
+def work(queue, stop_event, handler=run_job, poll_interval=OCR_JOB_POLL_INTERVAL):
+    """Claim and run jobs until `stop_event` is set"""
+    last_expiry = 0.0
+    while not stop_event.is_set():
+        if time.monotonic() - last_expiry > 60:
+            try:
+                queue.expire()
+            except sqlite3.Error as e:
+                logger.error(f"Could not expire OCR jobs: {str(e)}")
+            last_expiry = time.monotonic()
+
+        try:
+            job = queue.claim()
+        except sqlite3.Error as e:
+            logger.error(f"Could not claim OCR job: {str(e)}")
+            job = None
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        logger.info(f"Running OCR job {job['id']} (attempt {job['attempts']})")
+        try:
+            queue.complete(job, handler(job))
+        except Exception as e:
+            queue.fail(job, f"{type(e).__name__}: {str(e)}")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_workers = []
+_workers_lock = threading.Lock()
+_stop_event = threading.Event()
+
+
+def get_queue():
+    """Return the process-wide job queue"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+def start_workers(count=None):
+    """Start background worker threads in this process (once)"""
+    count = OCR_JOB_WORKERS if count is None else count
+    # Held until every thread is started so concurrent callers start one set
+    with _workers_lock:
+        if _workers:
+            return
+        queue = get_queue()
+        for index in range(count):
+            thread = threading.Thread(target=work, args=(queue, _stop_event),
+                                      name=f"ocr-job-worker-{index}", daemon=True)
+            thread.start()
+            _workers.append(thread)
+    if count:
+        logger.info(f"Started {count} OCR job workers")
+
+
+if __name__ == '__main__':
+    # Standalone worker process: python -m utils.job_queue
+    logging.basicConfig(level=logging.INFO)
+    try:
+        work(get_queue(), threading.Event())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,130 @@
+"""
+Page Layout
+Finds the text blocks on a page so they can be OCR'd concurrently instead of
+sending the whole page to Tesseract as one image.
+
+Blocks are found with contour analysis: the ink is smeared with a kernel
+sized from the page's text height so that words merge into lines and lines
+into paragraphs, and the outer contours of the result are the blocks. The
+text of the blocks is reassembled in reading order (top to bottom, then
+left to right within a row of side-by-side blocks).
+"""
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from utils import ocr_engine
+from utils.page_normalization import estimate_text_height
+
+logger = logging.getLogger(__name__)
+
+# 'page' OCRs each page as a single image, 'blocks' OCRs its text blocks concurrently
+OCR_LAYOUT_MODE = os.environ.get('OCR_LAYOUT_MODE', 'page')
+# Threads OCR'ing the blocks of a page. Tesseract releases the GIL, but each
+# thread needs its own engine, so there is no point exceeding the pool size.
+OCR_LAYOUT_WORKERS = int(os.environ.get('OCR_LAYOUT_WORKERS', ocr_engine.OCR_ENGINE_POOL_SIZE))
+
+LAYOUT_MODES = ('page', 'blocks')
+
+# Smearing kernel, in multiples of the text height
+MERGE_WIDTH = 2.0
+MERGE_HEIGHT = 2.5
+# White border added around each block, Tesseract reads poorly at image edges
+BLOCK_PADDING = 10
+
+if OCR_LAYOUT_MODE not in LAYOUT_MODES:
+    logger.warning(f"Unknown OCR_LAYOUT_MODE '{OCR_LAYOUT_MODE}', using page")
+    OCR_LAYOUT_MODE = 'page'
+
+
+def resolve_mode(mode=None):
+    """Return `mode` if it is a known layout mode, otherwise the default"""
+    if mode and mode not in LAYOUT_MODES:
+        logger.warning(f"Ignoring unknown layout mode: {mode}")
+        mode = None
+    return mode or OCR_LAYOUT_MODE
+
+
+def reading_order(boxes):
+    """
+    Sort (x, y, w, h) boxes into reading order: boxes that overlap vertically
+    form a row, rows run top to bottom and boxes within a row left to right
+    """
+    rows = []
+    for box in sorted(boxes, key=lambda b: b[1]):
+        x, y, w, h = box
+        row = rows[-1] if rows else None
+        if row and y < row['bottom'] - min(h, row['height']) / 2:
+            row['boxes'].append(box)
+            row['bottom'] = max(row['bottom'], y + h)
+        else:
+            rows.append({'boxes': [box], 'bottom': y + h, 'height': h})
+    return [box for row in rows for box in sorted(row['boxes'], key=lambda b: b[0])]
+
+
+def find_text_blocks(gray):
+    """
+    Locate the text blocks of a grayscale page.
+    Returns (x, y, w, h) boxes in reading order, or [] if no text is found.
+    """
+    text_height = estimate_text_height(gray)
+    if text_height is None:
+        return []
+
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT,
+        (max(3, int(text_height * MERGE_WIDTH)), max(3, int(text_height * MERGE_HEIGHT)))
+    )
+    smeared = cv2.dilate(ink, kernel)
+    contours, _ = cv2.findContours(smeared, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = text_height * text_height
+    boxes = [cv2.boundingRect(contour) for contour in contours]
+    boxes = [box for box in boxes if box[2] * box[3] >= min_area]
+    return reading_order(boxes)
+
+
+def crop_block(image, box):
+    """Cut a block out of a page and give it a white border"""
+    x, y, w, h = box
+    block = image[y:y + h, x:x + w]
+    return cv2.copyMakeBorder(block, BLOCK_PADDING, BLOCK_PADDING, BLOCK_PADDING, BLOCK_PADDING,
+                              cv2.BORDER_CONSTANT, value=255)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_block_executor():
+    """Thread pool shared by every page OCR'd in block mode in this process"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, OCR_LAYOUT_WORKERS),
+                                           thread_name_prefix='ocr-block')
+        return _executor
+
+
+def ocr_blocks(image, boxes, lang='swa'):
+    """
+    OCR the given blocks of a (preprocessed) page concurrently.
+    Returns their texts in the order of `boxes`.
+    """
+    if len(boxes) <= 1 or OCR_LAYOUT_WORKERS <= 1:
+        return [ocr_engine.image_to_string(crop_block(image, box), lang=lang) for box in boxes]
+
+    executor = get_block_executor()
+    futures = [executor.submit(ocr_engine.image_to_string, crop_block(image, box), lang) for box in boxes]
+    return [future.result() for future in futures]
+
+
+def join_blocks(texts):
+    """Reassemble block texts into page text"""
+    return '\n'.join(text.strip() for text in texts if text and text.strip())
@@ -0,0 +1,242 @@
+"""
+OCR Benchmark Suite
+Runs the versioned corpus (utils.ocr_corpus) through the OCR pipeline and
+writes machine-readable results: per-stage timings (decode, normalize,
+preprocess, OCR), throughput, latency percentiles and character/word error
+rates, per page and summarized by language, style and entry point. Images
+go through the path behind extract_text_from_image and PDFs the
+page-level path behind handle_pdf (extract_document, which both wrap,
+without the OCR cache).
+
+    python -m utils.ocr_benchmark --output results.json
+    python -m utils.ocr_benchmark --compare baseline.json results.json
+
+--compare exits with status 1 if the second run is slower or less accurate
+than the first beyond the tolerances, so it can gate a deploy.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import logging
+import subprocess
+from datetime import datetime, timezone
+
+import cv2
+
+from utils import ocr_corpus
+from utils import ocr_engine
+from utils import cpu_budget
+from utils import ocr_extraction
+from utils.preprocessing import STAGES
+from utils.text_metrics import character_error_rate, word_error_rate
+from utils.backend_benchmark import percentile
+
+logger = logging.getLogger(__name__)
+
+RESULTS_FORMAT = 1
+
+# Page timing keys (see ocr_extraction.ocr_page) grouped into reported stages;
+# anything else, e.g. PDF rasterization, ends up in 'other'
+STAGE_GROUPS = {
+    'decode': {'decode'},
+    'normalize': {'blank_check', 'normalize', 'geometry', 'osd', 'layout'},
+    'preprocess': set(STAGES),
+    'ocr': {'ocr', 'second_pass'},
+}
+REPORTED_STAGES = tuple(STAGE_GROUPS) + ('other',)
+
+
+def group_timings(timings, wall_ms):
+    """Fold a document's per-stage timings into REPORTED_STAGES"""
+    grouped = {stage: 0.0 for stage in REPORTED_STAGES}
+    for key, ms in timings.items():
+        stage = next((name for name, keys in STAGE_GROUPS.items() if key in keys), 'other')
+        grouped[stage] += ms
+    grouped['other'] += max(0.0, wall_ms - sum(grouped.values()))
+    return {stage: round(ms, 2) for stage, ms in grouped.items()}
+
+
+def run_page(page, profile=None, mode=None):
+    """OCR one corpus page (uncached) and score it against its ground truth"""
+    start = time.perf_counter()
+    document = ocr_extraction.extract_document(page['path'], lang=page['lang'], profile=profile,
+                                               use_cache=False, mode=mode)
+    wall_ms = (time.perf_counter() - start) * 1000
+    text = document['text'] if document else ''
+    confidence = (document or {}).get('confidence') or {}
+    return {
+        'id': page['id'],
+        'lang': page['lang'],
+        'style': page['style'],
+        'format': page['format'],
+        'entry': 'handle_pdf' if page['format'] == 'pdf' else 'extract_text_from_image',
+        'pixels_sha256': page.get('pixels_sha256'),
+        'ok': document is not None,
+        'pages': len(document['pages']) if document else 0,
+        'wall_ms': round(wall_ms, 2),
+        'stages': group_timings(document['timings'] if document else {}, wall_ms),
+        'characters': len(text),
+        # How often the two-pass OCR read lines or whole pages again (see utils.adaptive_ocr)
+        'lines': confidence.get('lines', 0),
+        'lines_retried': confidence.get('regions_retried', 0),
+        'pages_retried': confidence.get('pages_retried', 0),
+        'cer': character_error_rate(text, page['reference']),
+        'wer': word_error_rate(text, page['reference'])
+    }
+
+
+def summarize(results):
+    """Throughput, latency percentiles, mean error rates and stage totals of a set of page results"""
+    if not results:
+        return None
+    seconds = sum(r['wall_ms'] for r in results) / 1000
+    pages = sum(r['pages'] for r in results)
+    latencies = [r['wall_ms'] for r in results]
+    stages = {stage: round(sum(r['stages'][stage] for r in results), 2) for stage in REPORTED_STAGES}
+    lines = sum(r.get('lines', 0) for r in results)
+    return {
+        'documents': len(results),
+        'failed': sum(1 for r in results if not r['ok']),
+        'pages': pages,
+        'pages_per_sec': round(pages / seconds, 3) if seconds else None,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'cer': round(sum(r['cer'] for r in results) / len(results), 4),
+        'wer': round(sum(r['wer'] for r in results) / len(results), 4),
+        'page_retry_rate': round(sum(r.get('pages_retried', 0) for r in results) / pages, 4) if pages else None,
+        'line_retry_rate': round(sum(r.get('lines_retried', 0) for r in results) / lines, 4) if lines else None,
+        'stages_ms': stages
+    }
+
+
+def _grouped(results, *fields):
+    groups = {}
+    for result in results:
+        groups.setdefault('/'.join(result[field] for field in fields), []).append(result)
+    return {name: summarize(group) for name, group in sorted(groups.items())}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(pages=None, profile=None, mode=None, repeat=1):
+    """
+    Benchmark the corpus `pages` (default: the whole corpus). Every page is
+    OCR'd `repeat` times after one untimed warm-up pass; each run is
+    reported. Returns the JSON-serializable results document.
+    """
+    manifest = ocr_corpus.load_manifest()
+    pages = pages if pages is not None else ocr_corpus.materialize(manifest)
+
+    # Warm-up: engine start-up and model loading are not part of page latency
+    for page in pages[:1]:
+        run_page(page, profile, mode)
+
+    results = [run_page(page, profile, mode) for _ in range(repeat) for page in pages]
+    return {
+        'format': RESULTS_FORMAT,
+        'corpus_version': manifest['version'],
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'build': {
+            'git_commit': _git_commit(),
+            'pipeline_version': ocr_extraction.OCR_PIPELINE_VERSION,
+            'engine': ocr_engine.engine_version(),
+            'opencv': cv2.__version__,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu': cpu_budget.plan()
+        },
+        'settings': {'profile': profile, 'mode': mode, 'repeat': repeat},
+        'summary': summarize(results),
+        'by_language_style': _grouped(results, 'lang', 'style'),
+        'by_entry': _grouped(results, 'entry'),
+        'pages': results
+    }
+
+
+def compare(baseline, current, latency_tolerance=0.10, accuracy_tolerance=0.01):
+    """
+    Compare two results documents. Returns {'deltas', 'regressions'}:
+    throughput/latency worse by more than `latency_tolerance` (a fraction)
+    or CER/WER higher by more than `accuracy_tolerance` (absolute) count as
+    regressions, overall and per language/style.
+    """
+    notes = []
+    if baseline.get('corpus_version') != current.get('corpus_version'):
+        notes.append(f"corpus version changed from {baseline.get('corpus_version')} "
+                     f"to {current.get('corpus_version')}; results are not comparable")
+
+    groups = {'overall': (baseline['summary'], current['summary'])}
+    for name, summary in current.get('by_language_style', {}).items():
+        if name in baseline.get('by_language_style', {}):
+            groups[name] = (baseline['by_language_style'][name], summary)
+
+    deltas, regressions = {}, []
+    for name, (before, after) in groups.items():
+        if not before or not after:
+            continue
+        delta = {}
+        for metric in ('pages_per_sec', 'p50_ms', 'p95_ms', 'cer', 'wer'):
+            if before.get(metric) is None or after.get(metric) is None:
+                continue
+            delta[metric] = round(after[metric] - before[metric], 4)
+            if metric == 'pages_per_sec':
+                worse = after[metric] < before[metric] * (1 - latency_tolerance)
+            elif metric.endswith('_ms'):
+                worse = after[metric] > before[metric] * (1 + latency_tolerance)
+            else:
+                worse = after[metric] > before[metric] + accuracy_tolerance
+            if worse:
+                regressions.append(f"{name}: {metric} {before[metric]} -> {after[metric]}")
+        deltas[name] = delta
+    return {'deltas': deltas, 'regressions': regressions, 'notes': notes}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='OCR accuracy and latency benchmark over the versioned corpus')
+    parser.add_argument('--output', help='Write results JSON here instead of stdout')
+    parser.add_argument('--profile', help='Preprocessing profile (default: OCR_PREPROCESS_PROFILE)')
+    parser.add_argument('--layout', help="Layout mode, 'page' or 'blocks'")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--pages', help='Comma-separated corpus page ids (default: all)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='Compare two results files instead of running the suite')
+    parser.add_argument('--latency-tolerance', type=float, default=0.10)
+    parser.add_argument('--accuracy-tolerance', type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f:
+            current = json.load(f)
+        report = compare(baseline, current, args.latency_tolerance, args.accuracy_tolerance)
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return 1 if report['regressions'] else 0
+
+    ids = set(args.pages.split(',')) if args.pages else None
+    pages = ocr_corpus.materialize(ids=ids)
+    results = run_suite(pages, profile=args.profile, mode=args.layout, repeat=args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote {args.output}: {results['summary']}")
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
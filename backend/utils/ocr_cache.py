@@ -0,0 +1,220 @@
+"""
+OCR Result Cache
+Content-addressed cache for OCR results. Keys are a SHA-256 of the file bytes
+plus every parameter that changes the output (language, preprocessing,
+engine version), so a re-upload of the same file is served without OCR.
+Results live in an in-memory LRU tier backed by a size-capped disk tier that
+is shared by all workers and survives restarts.
+
+Every worker (and page pool process) writes to the same directory, so a
+process's own running total of the disk tier goes stale as soon as anyone
+else writes. It is trusted for at most OCR_CACHE_RESCAN_WRITES writes or
+OCR_CACHE_RESCAN_SECONDS, after which the directory is summed again, so the
+tier overshoots its cap by at most a few entries per process.
+"""
+
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+OCR_CACHE_ENABLED = os.environ.get('OCR_CACHE_ENABLED', 'True') == 'True'
+OCR_CACHE_DIR = os.environ.get(
+    'OCR_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ocr_cache')
+)
+OCR_CACHE_MAX_BYTES = int(os.environ.get('OCR_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 256MB on disk
+OCR_CACHE_MEMORY_ENTRIES = int(os.environ.get('OCR_CACHE_MEMORY_ENTRIES', 256))
+# The disk tier's size is summed again after this many writes by a process,
+# or when the last sum is older than this many seconds
+OCR_CACHE_RESCAN_WRITES = int(os.environ.get('OCR_CACHE_RESCAN_WRITES', 32))
+OCR_CACHE_RESCAN_SECONDS = float(os.environ.get('OCR_CACHE_RESCAN_SECONDS', 30))
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(content_hash, **params):
+    """Combine a content hash with the OCR parameters into a cache key"""
+    encoded = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(f"{content_hash}:{encoded}".encode('utf-8')).hexdigest()
+
+
+class OCRCache:
+    """Two-tier (memory LRU + disk) cache of JSON-serializable OCR results"""
+
+    def __init__(self, cache_dir=OCR_CACHE_DIR, max_disk_bytes=OCR_CACHE_MAX_BYTES,
+                 max_memory_entries=OCR_CACHE_MEMORY_ENTRIES, rescan_writes=OCR_CACHE_RESCAN_WRITES,
+                 rescan_seconds=OCR_CACHE_RESCAN_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_entries = max_memory_entries
+        self.rescan_writes = rescan_writes
+        self.rescan_seconds = rescan_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # This process's view of the shared disk tier, see disk_bytes()
+        self._disk_bytes = None
+        self._scanned_at = 0.0
+        self._writes_since_scan = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return a cached result, or None on a miss"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return copy.deepcopy(self._memory[key])
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)  # keep recently used entries away from eviction
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, value)
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        """Store a result in both tiers"""
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._remember(key, value)
+
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so other workers never read a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Could not write OCR cache entry {key}: {str(e)}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+                self._writes_since_scan += 1
+        if self.disk_bytes() > self.max_disk_bytes:
+            self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield stat.st_mtime, stat.st_size, path
+
+    def disk_bytes(self):
+        """
+        Size of the disk tier. Other processes write to it too, so the running
+        total is re-summed from the directory once it may be stale.
+        """
+        with self._lock:
+            stale = (self._disk_bytes is None or self._writes_since_scan >= self.rescan_writes
+                     or time.monotonic() - self._scanned_at >= self.rescan_seconds)
+            if stale:
+                self._disk_bytes = sum(size for _, size, _ in self._entries())
+                self._scanned_at = time.monotonic()
+                self._writes_since_scan = 0
+            return self._disk_bytes
+
+    def _evict(self):
+        """Remove least recently used disk entries until under 90% of the cap"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_disk_bytes * 0.9
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+            self._scanned_at = time.monotonic()
+            self._writes_since_scan = 0
+            self.evictions += removed
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        for _, _, path in list(self._entries()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = 0
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'memory_entries': len(self._memory),
+            'disk_bytes': self.disk_bytes(),
+            'max_disk_bytes': self.max_disk_bytes
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide OCR cache, or None when caching is disabled"""
+    global _cache
+    if not OCR_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = OCRCache()
+        return _cache
@@ -0,0 +1,129 @@
+"""
+OCR Benchmark Corpus
+Versioned corpus of exam pages for the OCR benchmark (utils.ocr_benchmark).
+The pages are not stored in the repository: tests/test_data/ocr_corpus/
+manifest.json lists each page's ground truth text, language, style
+('typed' or 'noisy'), file format and random seed, and the pages are
+rendered from it deterministically into a cache directory.
+
+Noisy pages imitate a phone photo or cheap scan of a printed page: a small
+rotation, uneven lighting, blur, sensor noise, speckles and JPEG artefacts.
+Each rendered page carries the SHA-256 of its pixels so results from two
+builds can be checked against the same input.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH = os.environ.get(
+    'OCR_CORPUS_MANIFEST',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'tests', 'test_data', 'ocr_corpus', 'manifest.json')
+)
+OCR_CORPUS_CACHE = os.environ.get('OCR_CORPUS_CACHE', os.path.join(tempfile.gettempdir(), 'aems_ocr_corpus'))
+
+# A4 at the manifest's dpi
+PAGE_SIZE_INCHES = (8.27, 11.69)
+MARGIN_INCHES = 0.6
+FONT = cv2.FONT_HERSHEY_DUPLEX
+
+
+def load_manifest(path=None):
+    with open(path or MANIFEST_PATH, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def render_page(text, dpi=200):
+    """Render text as a clean grayscale page, one manifest line per printed line"""
+    width, height = int(PAGE_SIZE_INCHES[0] * dpi), int(PAGE_SIZE_INCHES[1] * dpi)
+    page = np.full((height, width), 255, dtype=np.uint8)
+    scale = dpi / 170
+    thickness = max(1, round(dpi / 100))
+    line_height = int(dpi * 0.3)
+    x = y = int(MARGIN_INCHES * dpi)
+    for line in text.split('\n'):
+        y += line_height
+        cv2.putText(page, line, (x, y), FONT, scale, 0, thickness, cv2.LINE_AA)
+    return page
+
+
+def degrade_page(page, seed):
+    """Make a clean page look photographed: rotation, shading, blur, noise, speckles, JPEG"""
+    rng = np.random.default_rng(seed)
+    height, width = page.shape
+
+    angle = rng.uniform(-2.0, 2.0)
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    page = cv2.warpAffine(page, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
+    # Light falls off towards one corner
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+    shade = 1.0 - 0.3 * (xs / width * rng.uniform(0.3, 1.0) + ys / height * rng.uniform(0.3, 1.0)) / 2
+    page = page.astype(np.float32) * shade
+
+    page = cv2.GaussianBlur(page, (3, 3), rng.uniform(0.6, 1.2))
+    page += rng.normal(0, 10, page.shape)
+    speckles = rng.random(page.shape) < 0.001
+    page[speckles] = rng.uniform(0, 80, int(speckles.sum()))
+    page = np.clip(page, 0, 255).astype(np.uint8)
+
+    _, encoded = cv2.imencode('.jpg', page, [cv2.IMWRITE_JPEG_QUALITY, int(rng.integers(45, 70))])
+    return cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)
+
+
+def build_page(entry, manifest):
+    """Render one manifest page entry; returns the grayscale pixels"""
+    dpi = manifest.get('dpi', 200)
+    page = render_page(manifest['texts'][entry['text']], dpi=dpi)
+    if entry['style'] == 'noisy':
+        page = degrade_page(page, entry['seed'])
+    return page
+
+
+def _write(page, path, fmt, dpi):
+    if fmt == 'pdf':
+        Image.fromarray(page).save(path, 'PDF', resolution=dpi)
+    elif fmt == 'jpg':
+        cv2.imwrite(path, page, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    else:
+        cv2.imwrite(path, page)
+
+
+def materialize(manifest=None, cache_dir=None, ids=None):
+    """
+    Render the corpus (or the pages named in `ids`) into
+    <cache_dir>/v<version>. Pages are always re-rendered so the files match
+    the recorded pixel hashes of this build.
+    Returns the page entries with 'path', 'reference' (ground truth) and
+    'pixels_sha256' added.
+    """
+    manifest = manifest or load_manifest()
+    directory = os.path.join(cache_dir or OCR_CORPUS_CACHE, f"v{manifest['version']}")
+    os.makedirs(directory, exist_ok=True)
+    dpi = manifest.get('dpi', 200)
+
+    pages = []
+    for entry in manifest['pages']:
+        if ids and entry['id'] not in ids:
+            continue
+        page = build_page(entry, manifest)
+        path = os.path.join(directory, f"{entry['id']}.{entry['format']}")
+        _write(page, path, entry['format'], dpi)
+        pages.append({
+            **entry,
+            'path': path,
+            'reference': manifest['texts'][entry['text']],
+            'pixels_sha256': hashlib.sha256(page.tobytes()).hexdigest()
+        })
+    logger.info(f"OCR corpus v{manifest['version']}: {len(pages)} pages in {directory}")
+    return pages
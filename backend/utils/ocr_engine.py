@@ -0,0 +1,398 @@
+"""
+OCR Engine Pool
+Keeps long-lived, pre-warmed OCR engines inside the worker process so that
+each page does not pay for forking the tesseract binary and reloading the
+traineddata model. Engines are pooled per (backend, language, tessdata dir)
+key.
+
+Backends are interchangeable engine classes registered with
+register_backend and chosen with OCR_ENGINE. An engine class has a `name`,
+`available()` and `version()` class methods, is constructed with
+(lang, tessdata_dir) and provides image_to_string(image),
+image_to_data(image) and close(). Two are built in: 'tesserocr' (Tesseract
+in-process) and 'pytesseract' (the tesseract binary per page). 'auto'
+prefers tesserocr and falls back to pytesseract when the binding is not
+installed or an engine cannot be initialised.
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+from utils import cpu_budget
+from utils import tesseract_probe
+
+# Must precede loading Tesseract: OpenMP reads its thread limit once, at load
+cpu_budget.apply_thread_limits()
+
+try:
+    import tesserocr
+except ImportError:  # optional dependency
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+# Backend name, or 'auto' to use the first available of AUTO_BACKENDS
+OCR_ENGINE = os.environ.get('OCR_ENGINE', 'auto')
+# Maximum number of live engines per language/model in one worker
+OCR_ENGINE_POOL_SIZE = int(os.environ.get('OCR_ENGINE_POOL_SIZE', 2))
+# Languages (e.g. 'swa,eng,eng+swa') loaded when a web or page OCR worker starts
+OCR_PRELOAD_LANGUAGES = [lang.strip() for lang in os.environ.get('OCR_PRELOAD_LANGUAGES', '').split(',')
+                         if lang.strip()]
+
+
+class OrientationUndetectable(RuntimeError):
+    """Raised when a page has too little text for orientation detection"""
+
+
+def _to_pil(image):
+    """Convert a NumPy array or PIL image to a PIL image without re-encoding"""
+    if isinstance(image, Image.Image):
+        return image
+    return Image.fromarray(np.ascontiguousarray(image))
+
+
+BACKENDS = {}
+# Preference order for OCR_ENGINE=auto
+AUTO_BACKENDS = ('tesserocr', 'pytesseract')
+
+
+def register_backend(engine_class):
+    """Make an engine class selectable by its name (usable as a class decorator)"""
+    BACKENDS[engine_class.name] = engine_class
+    return engine_class
+
+
+@register_backend
+class TesserocrEngine:
+    """In-process Tesseract engine that loads its model exactly once"""
+
+    name = 'tesserocr'
+
+    @classmethod
+    def available(cls):
+        return tesserocr is not None
+
+    @classmethod
+    def version(cls):
+        return tesserocr.tesseract_version().split()[1]
+
+    def __init__(self, lang, tessdata_dir=None):
+        kwargs = {'lang': lang}
+        if tessdata_dir:
+            kwargs['path'] = os.path.join(tessdata_dir, '')
+        self.lang = lang
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+
+    def image_to_string(self, image):
+        self.api.SetImage(_to_pil(image))
+        return self.api.GetUTF8Text()
+
+    def image_to_data(self, image):
+        """Recognize once and walk the result for per-word boxes and confidences"""
+        self.api.SetImage(_to_pil(image))
+        self.api.Recognize()
+        words = []
+        block = par = line = 0
+        iterator = self.api.GetIterator()
+        for word in tesserocr.iterate_level(iterator, tesserocr.RIL.WORD):
+            if word.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                block += 1
+            if word.IsAtBeginningOf(tesserocr.RIL.PARA):
+                par += 1
+            if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                line += 1
+            text = word.GetUTF8Text(tesserocr.RIL.WORD)
+            bounds = word.BoundingBox(tesserocr.RIL.WORD)
+            if not text or not text.strip() or bounds is None:
+                continue
+            x1, y1, x2, y2 = bounds
+            words.append({'text': text.strip(), 'conf': float(word.Confidence(tesserocr.RIL.WORD)),
+                          'box': (x1, y1, x2 - x1, y2 - y1), 'block': block, 'par': par, 'line': line})
+        return words
+
+    def detect_orientation(self, image):
+        """Orientation of a page; needs an engine loaded with lang 'osd'"""
+        self.api.SetPageSegMode(tesserocr.PSM.OSD_ONLY)
+        self.api.SetImage(_to_pil(image))
+        osd = self.api.DetectOrientationScript()
+        if not osd:
+            raise OrientationUndetectable('Orientation detection found no usable text')
+        # Tesseract reports how the page is turned; undoing it is the opposite turn
+        return {'rotate': (360 - osd['orient_deg']) % 360, 'confidence': float(osd['orient_conf'])}
+
+    def close(self):
+        self.api.End()
+
+
+@register_backend
+class PytesseractEngine:
+    """Subprocess-backed engine, used when tesserocr is unavailable"""
+
+    name = 'pytesseract'
+
+    @classmethod
+    def available(cls):
+        return tesseract_probe.ensure_configured()
+
+    @classmethod
+    def version(cls):
+        # From the probe cache, so worker start-up does not run the binary
+        environment = tesseract_probe.probe()
+        if environment is None:
+            raise RuntimeError('Tesseract is not installed')
+        return environment['version']
+
+    def __init__(self, lang, tessdata_dir=None):
+        tesseract_probe.ensure_configured()
+        self.lang = lang
+        self.config = f'--tessdata-dir "{tessdata_dir}"' if tessdata_dir else ''
+
+    def image_to_string(self, image):
+        return pytesseract.image_to_string(image, lang=self.lang, config=self.config)
+
+    def image_to_data(self, image):
+        data = pytesseract.image_to_data(image, lang=self.lang, config=self.config,
+                                         output_type=pytesseract.Output.DICT)
+        words = []
+        for i, text in enumerate(data['text']):
+            if data['level'][i] != 5 or not text or not text.strip():
+                continue
+            words.append({
+                'text': text.strip(),
+                'conf': float(data['conf'][i]),
+                'box': (data['left'][i], data['top'][i], data['width'][i], data['height'][i]),
+                'block': data['block_num'][i],
+                'par': data['par_num'][i],
+                'line': data['line_num'][i]
+            })
+        return words
+
+    def detect_orientation(self, image):
+        try:
+            osd = pytesseract.image_to_osd(image, lang=self.lang, config=self.config,
+                                           output_type=pytesseract.Output.DICT)
+        except pytesseract.TesseractError as e:
+            if 'Too few characters' in str(e):
+                raise OrientationUndetectable(str(e)) from e
+            raise
+        return {'rotate': int(osd['rotate']) % 360, 'confidence': float(osd['orientation_conf'])}
+
+    def close(self):
+        pass
+
+
+def available_backends():
+    """Names of the registered backends that can run here"""
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+def resolve_backend(backend=None):
+    """Name of the backend to use for `backend` (default: OCR_ENGINE), resolving 'auto'"""
+    name = backend or OCR_ENGINE
+    if name != 'auto' and name not in BACKENDS:
+        logger.warning(f"Unknown OCR backend '{name}', using auto")
+        name = 'auto'
+    if name == 'auto':
+        return next((candidate for candidate in AUTO_BACKENDS
+                     if candidate in BACKENDS and BACKENDS[candidate].available()), 'pytesseract')
+    return name
+
+
+def create_engine(lang, tessdata_dir=None, backend=None):
+    """Create an engine of the chosen backend for a language/model, falling back to pytesseract"""
+    name = resolve_backend(backend)
+    try:
+        return BACKENDS[name](lang, tessdata_dir)
+    except Exception as e:
+        if name == 'pytesseract':
+            raise
+        logger.warning(f"Could not start the {name} engine for '{lang}', "
+                       f"falling back to pytesseract: {str(e)}")
+    return PytesseractEngine(lang, tessdata_dir)
+
+
+class EnginePool:
+    """
+    Bounded pool of engines for one language/model.
+    Engines are created lazily up to `size` and reused across calls.
+    """
+
+    def __init__(self, lang, tessdata_dir=None, size=OCR_ENGINE_POOL_SIZE, factory=create_engine):
+        self.lang = lang
+        self.tessdata_dir = tessdata_dir
+        self.size = max(1, size)
+        self._factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def _create(self):
+        with self._lock:
+            self.created += 1
+        logger.info(f"Starting OCR engine #{self.created} for lang={self.lang}")
+        return self._factory(self.lang, self.tessdata_dir)
+
+    @contextmanager
+    def engine(self):
+        """Borrow an engine for the duration of the with-block"""
+        self._slots.acquire()
+        try:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                engine = self._create()
+            try:
+                yield engine
+            except Exception:
+                # The engine state is unknown after a failure, do not reuse it
+                engine.close()
+                with self._lock:
+                    self.created -= 1
+                raise
+            self._idle.put(engine)
+        finally:
+            self._slots.release()
+
+    def warm_up(self, count=1):
+        """Pre-create engines so the first request does not pay model loading"""
+        engines = []
+        for _ in range(min(count, self.size) - self._idle.qsize()):
+            engines.append(self._create())
+        for engine in engines:
+            self._idle.put(engine)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def get_pool(lang='swa', tessdata_dir=None, backend=None):
+    """Return the engine pool for a backend and language/model, creating it on first use"""
+    global _pools_pid
+    if tessdata_dir is None:
+        tessdata_dir = os.environ.get('TESSDATA_PREFIX')
+    backend = resolve_backend(backend)
+    key = (backend, lang, tessdata_dir)
+    with _pools_lock:
+        # Engines must not be shared across a fork (e.g. gunicorn --preload)
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = EnginePool(lang, tessdata_dir, factory=functools.partial(create_engine, backend=backend))
+            _pools[key] = pool
+        return pool
+
+
+def image_to_string(image, lang='swa', config='', backend=None):
+    """
+    Drop-in replacement for pytesseract.image_to_string backed by the pool.
+    Custom Tesseract configs are passed straight to pytesseract.
+    """
+    if config:
+        tesseract_probe.ensure_configured()
+        return pytesseract.image_to_string(image, lang=lang, config=config)
+    with get_pool(lang, backend=backend).engine() as engine:
+        return engine.image_to_string(image)
+
+
+def image_to_data(image, lang='swa', backend=None):
+    """
+    Recognize an image once and return its words as dicts with 'text',
+    'conf' (0-100), 'box' (x, y, w, h) and 'block'/'par'/'line' numbers
+    """
+    with get_pool(lang, backend=backend).engine() as engine:
+        return engine.image_to_data(image)
+
+
+def detect_orientation(image, backend=None):
+    """
+    Tesseract's orientation detection (needs osd.traineddata), through an
+    'osd' engine of the pool: {'rotate' (clockwise degrees that turn the
+    page upright), 'confidence'}. Raises OrientationUndetectable for a page
+    with too little text; any other error means detection cannot run here.
+    """
+    with get_pool('osd', backend=backend).engine() as engine:
+        return engine.detect_orientation(image)
+
+
+def preloaded_languages():
+    """Languages with a live engine pool in this worker"""
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            return []
+        return sorted({lang for _, lang, _ in _pools})
+
+
+# Versions found per backend; failed lookups are not kept so they are retried
+_versions = {}
+
+
+def engine_version(backend=None):
+    """Identify the backend and its version, e.g. for cache keys"""
+    name = resolve_backend(backend)
+    if name not in _versions:
+        try:
+            _versions[name] = f"{name}:{BACKENDS[name].version()}"
+        except Exception as e:
+            logger.warning(f"Could not determine Tesseract version: {str(e)}")
+            return 'unknown'
+    return _versions[name]
+
+
+def warm_up(languages=None):
+    """Pre-load one engine per language in this worker (default: OCR_PRELOAD_LANGUAGES)"""
+    for lang in OCR_PRELOAD_LANGUAGES if languages is None else languages:
+        try:
+            get_pool(lang).warm_up()
+        except Exception as e:
+            logger.error(f"Failed to warm up OCR engine for '{lang}': {str(e)}")
+
+
+def compare_latency(image, lang='swa', runs=5):
+    """
+    Measure per-page latency of the pooled engine against plain pytesseract.
+    Returns average milliseconds per page for both paths.
+    """
+    pool = get_pool(lang)
+    pool.warm_up()
+    tesseract_probe.ensure_configured()
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        pytesseract.image_to_string(image, lang=lang)
+    subprocess_ms = (time.perf_counter() - start) * 1000 / runs
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        image_to_string(image, lang=lang)
+    pooled_ms = (time.perf_counter() - start) * 1000 / runs
+
+    with pool.engine() as engine:
+        engine_name = engine.name
+
+    return {
+        'engine': engine_name,
+        'pytesseract_ms': round(subprocess_ms, 2),
+        'pooled_ms': round(pooled_ms, 2),
+        'speedup': round(subprocess_ms / pooled_ms, 2) if pooled_ms else None
+    }
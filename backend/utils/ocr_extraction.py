@@ -1,116 +1,403 @@
 import cv2
-import pytesseract
 import numpy as np
 from PIL import Image
 import pdf2image
 import os
+import hashlib
 import logging
-import platform
+import tempfile
+import subprocess
+import time
+import threading
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from utils import ocr_engine
+from utils import cpu_budget
+from utils import ocr_cache
+from utils.preprocessing import preprocess_image, run_profile, resolve_profile, grayscale
+from utils import page_normalization
+from utils import image_ingest
+from utils import layout
+from utils import text_metrics
+from utils import adaptive_ocr
+from utils import ocr_languages
+from utils import page_pipeline
+from utils import tesseract_probe
+from utils import blank_pages
 
 logger = logging.getLogger(__name__)
 
+# Page-level OCR parallelism for multi-page PDFs. The pool is shared by every
+# document handled in this worker, so concurrent uploads queue for the same
+# OCR_PDF_WORKERS processes instead of each claiming their own cores. Its
+# default size comes from the worker's share of the CPU budget.
+OCR_PDF_WORKERS = cpu_budget.page_processes()
+OCR_PDF_TIMEOUT = float(os.environ.get('OCR_PDF_TIMEOUT', 300))  # seconds per document
+# PDFs are rasterized a window of pages at a time so peak memory depends on
+# the window size rather than on the page count
+OCR_PDF_DPI = int(os.environ.get('OCR_PDF_DPI', 200))
+OCR_PDF_PAGE_WINDOW = int(os.environ.get('OCR_PDF_PAGE_WINDOW', max(2, OCR_PDF_WORKERS)))
+# Frames of a multi-frame TIFF/WebP decoded and OCR'd at a time (1 keeps a
+# single decoded frame in memory; more OCRs them in parallel like PDF pages)
+OCR_FRAME_WINDOW = int(os.environ.get('OCR_FRAME_WINDOW', 1))
+# Born-digital PDF pages whose text layer has at least this many letters or
+# digits are read directly instead of being rasterized and OCR'd
+OCR_USE_TEXT_LAYER = os.environ.get('OCR_USE_TEXT_LAYER', 'True') == 'True'
+OCR_TEXT_LAYER_MIN_CHARS = int(os.environ.get('OCR_TEXT_LAYER_MIN_CHARS', 25))
+# Overlap the stages of multi-page documents: pages are rasterized, preprocessed
+# and OCR'd on separate threads connected by bounded queues (see
+# utils.page_pipeline) instead of a window at a time on the page process pool.
+# The stages run inside the web worker, so this is off by default
+OCR_PIPELINE = os.environ.get('OCR_PIPELINE', 'False') == 'True'
+OCR_PIPELINE_PREPROCESS_WORKERS = int(os.environ.get('OCR_PIPELINE_PREPROCESS_WORKERS', 1))
+# More OCR threads than engines per language would only wait for an engine
+OCR_PIPELINE_OCR_WORKERS = int(os.environ.get('OCR_PIPELINE_OCR_WORKERS',
+                                              max(1, min(OCR_PDF_WORKERS, ocr_engine.OCR_ENGINE_POOL_SIZE))))
+# Pages being preprocessed or OCR'd by pipeline threads at once, across all
+# documents of the worker; the same share of the CPU budget as the page pool
+OCR_PIPELINE_SLOTS = int(os.environ.get('OCR_PIPELINE_SLOTS', OCR_PDF_WORKERS))
+# Part of every OCR cache key; bump when a pipeline change alters OCR output
+OCR_PIPELINE_VERSION = 8
+
 def configure_tesseract():
-    """Configure Tesseract path based on the environment"""
-    logger.info(f"Configuring Tesseract for platform: {platform.system()}")
-    logger.info(f"Current PATH: {os.environ.get('PATH', 'Not set')}")
-    logger.info(f"TESSDATA_PREFIX: {os.environ.get('TESSDATA_PREFIX', 'Not set')}")
-    
-    if platform.system() == 'Windows':
-        windows_paths = [
-            r'C:\Program Files\Tesseract-OCR\tesseract.exe',
-            r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe'
-        ]
-        for path in windows_paths:
-            if os.path.exists(path):
-                pytesseract.pytesseract.tesseract_cmd = path
-                logger.info(f"Using Tesseract from: {path}")
-                return True
-    else:
-        # For Linux/Unix systems, check common locations
-        unix_paths = [
-            '/usr/bin/tesseract',
-            '/usr/local/bin/tesseract',
-            '/opt/local/bin/tesseract',
-            '/usr/share/tesseract-ocr/tesseract'
-        ]
-        
-        # First try which command
-        try:
-            import subprocess
-            tesseract_path = subprocess.check_output(['which', 'tesseract']).decode().strip()
-            logger.info(f"Found Tesseract using 'which' command: {tesseract_path}")
-            if os.path.exists(tesseract_path):
-                pytesseract.pytesseract.tesseract_cmd = tesseract_path
-                # Verify it works
-                version = subprocess.check_output([tesseract_path, '--version']).decode()
-                logger.info(f"Tesseract version: {version}")
-                return True
-        except Exception as e:
-            logger.warning(f"Could not find Tesseract using 'which' command: {str(e)}")
-        
-        # Try common paths
-        for path in unix_paths:
-            if os.path.exists(path):
-                pytesseract.pytesseract.tesseract_cmd = path
-                logger.info(f"Using Tesseract from: {path}")
-                try:
-                    # Verify it works
-                    import subprocess
-                    version = subprocess.check_output([path, '--version']).decode()
-                    logger.info(f"Tesseract version: {version}")
-                    return True
-                except Exception as e:
-                    logger.warning(f"Found Tesseract at {path} but failed to verify: {str(e)}")
-                    continue
-    
-    logger.error("Tesseract not found in any common locations")
-    return False
-
-# Configure Tesseract when module is loaded
-configure_tesseract()
-
-def preprocess_image(image):
-    """
-    Preprocess the image for better OCR results
-    """
-    # Convert to grayscale if image is in color
-    if len(image.shape) == 3:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    """
+    Point pytesseract at the Tesseract binary. Probing happens lazily, on
+    first OCR use, and is cached on disk (see utils.tesseract_probe).
+    """
+    return tesseract_probe.ensure_configured()
+
+_page_executor = None
+_page_executor_lock = threading.Lock()
+
+def get_page_executor():
+    """Return the shared process pool used for page OCR, starting it on first use"""
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            # spawn avoids inheriting locks and engine handles from a threaded parent
+            # Each process loads the preloaded languages' engines before its first page
+            _page_executor = ProcessPoolExecutor(
+                max_workers=OCR_PDF_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=ocr_engine.warm_up
+            )
+            logger.info(f"Started page OCR pool with {OCR_PDF_WORKERS} workers, "
+                        f"{cpu_budget.thread_limit()} threads per task")
+        return _page_executor
+
+def _reset_page_executor():
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is not None:
+            _page_executor.shutdown(wait=False, cancel_futures=True)
+        _page_executor = None
+
+def prepare_page(page, profile=None, scale=1.0, mode=None):
+    """
+    The OpenCV half of ocr_page: normalize, find blocks and preprocess a
+    page. Returns the state read_page needs to OCR it; pages found blank
+    (see utils.blank_pages) are marked 'blank' and not preprocessed.
+    """
+    timings = {}
+    if blank_pages.OCR_SKIP_BLANK_PAGES:
+        check = blank_pages.classify(page)
+        timings['blank_check'] = check['ms']
+        if check['blank']:
+            return {'blank': True, 'timings': timings, 'scale': scale}
+    effective_dpi = None
+    if page_normalization.OCR_NORMALIZE_RESOLUTION:
+        start = time.perf_counter()
+        page, info = page_normalization.normalize_resolution(grayscale(page))
+        timings['normalize'] = round((time.perf_counter() - start) * 1000, 2)
+        scale *= info['scale']
+        effective_dpi = info['effective_dpi']
+
+    geometry = None
+    if page_normalization.OCR_NORMALIZE_GEOMETRY:
+        start = time.perf_counter()
+        page, info = page_normalization.normalize_geometry(grayscale(page))
+        timings['geometry'] = round((time.perf_counter() - start) * 1000, 2)
+        if info['osd_ms'] is not None:
+            # Reported on its own so the detector's cost shows in benchmarks
+            timings['osd'] = info['osd_ms']
+            timings['geometry'] = round(max(0.0, timings['geometry'] - info['osd_ms']), 2)
+        geometry = {
+            'rotation': info['rotation'],
+            'skew': info['skew'],
+            'area_reduction': info['area_reduction'],
+            'to_original': page_normalization.to_original_matrix(info['transform'], scale)
+        }
+
+    boxes = None
+    if layout.resolve_mode(mode) == 'blocks':
+        start = time.perf_counter()
+        boxes = layout.find_text_blocks(grayscale(page))
+        timings['layout'] = round((time.perf_counter() - start) * 1000, 2)
+
+    profile = resolve_profile(profile)
+    processed_image, stage_timings = run_profile(page, profile)
+    timings.update(stage_timings)
+    # The second pass re-reads regions of the unprocessed page
+    two_pass = adaptive_ocr.OCR_TWO_PASS and not (boxes and len(boxes) > 1)
+    return {
+        'page': grayscale(page) if two_pass else None,
+        'processed': processed_image,
+        'boxes': boxes,
+        'profile': profile,
+        'timings': timings,
+        'scale': scale,
+        'effective_dpi': effective_dpi,
+        'geometry': geometry
+    }
+
+def read_page(prepared, lang='swa'):
+    """The Tesseract half of ocr_page: OCR a page returned by prepare_page"""
+    timings = dict(prepared['timings'])
+    if prepared.get('blank'):
+        return {'text': '', 'timings': timings, 'scale': round(prepared['scale'], 4), 'effective_dpi': None,
+                'geometry': None, 'blocks': 0, 'confidence': None, 'regions': None, 'blank': True}
+    processed_image, boxes = prepared['processed'], prepared['boxes']
+    confidence = regions = None
+    start = time.perf_counter()
+    if boxes and len(boxes) > 1:
+        text = layout.join_blocks(layout.ocr_blocks(processed_image, boxes, lang=lang))
+        timings['ocr'] = round((time.perf_counter() - start) * 1000, 2)
+    elif prepared['page'] is not None:
+        result = adaptive_ocr.two_pass_ocr(prepared['page'], processed_image, lang=lang,
+                                           first_profile=prepared['profile'])
+        text, confidence, regions = result['text'], result['confidence'], result['regions']
+        timings.update(result['timings'])
     else:
-        gray = image
-
-    # Apply adaptive thresholding
-    binary = cv2.adaptiveThreshold(
-        gray, 255,
-        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-        cv2.THRESH_BINARY,
-        11, 2
-    )
+        text = ocr_engine.image_to_string(processed_image, lang=lang)
+        timings['ocr'] = round((time.perf_counter() - start) * 1000, 2)
+    return {
+        'text': text,
+        'timings': timings,
+        'scale': round(prepared['scale'], 4),
+        'effective_dpi': prepared['effective_dpi'],
+        'geometry': prepared['geometry'],
+        'blocks': len(boxes) if boxes else 1,
+        'confidence': confidence,
+        'regions': regions
+    }
+
+def ocr_page(page, lang='swa', profile=None, scale=1.0, mode=None):
+    """
+    Normalize, preprocess and OCR a single page image (grayscale or BGR NumPy
+    array). `scale` is how the page was already resized relative to the upload.
+    `mode` is 'page' to OCR the page as one image or 'blocks' to OCR its text
+    blocks concurrently (see utils.layout).
+    Returns {'text', 'timings', 'scale', 'effective_dpi', 'geometry', 'blocks',
+    'confidence', 'regions'} with milliseconds per stage; 'blocks' is the
+    number of blocks OCR'd. In page mode with OCR_TWO_PASS, low-confidence
+    lines are re-read with a heavier profile (see utils.adaptive_ocr) and
+    'confidence'/'regions' describe the word confidences and which pass
+    produced each line; otherwise they are None. 'geometry' holds the rotation, skew and cropped
+    'area_reduction', and 'to_original', a 2x3 matrix mapping page
+    coordinates back to the uploaded image. Blank pages are not OCR'd:
+    their result has empty 'text' and 'blank' True.
+    """
+    return read_page(prepare_page(page, profile, scale, mode), lang)
+
+def _ocr_page_task(page, lang, profile, mode):
+    """Process-pool entry point; re-raises errors in a form that always unpickles"""
+    try:
+        return ocr_page(page, lang, profile, mode=mode)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {str(e)}") from None
+
+def ocr_pages(pages, lang='swa', timeout=None, profile=None, mode=None):
+    """
+    OCR a list of page images in parallel and return their ocr_page results in
+    page order. Raises TimeoutError if the document does not finish within
+    `timeout` seconds.
+    """
+    timeout = OCR_PDF_TIMEOUT if timeout is None else timeout
 
-    # Denoise
-    denoised = cv2.fastNlMeansDenoising(binary)
+    if len(pages) <= 1 or OCR_PDF_WORKERS <= 1:
+        return [ocr_page(page, lang, profile, mode=mode) for page in pages]
 
-    # Dilation to connect text components
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-    dilated = cv2.dilate(denoised, kernel, iterations=1)
+    executor = get_page_executor()
+    try:
+        futures = [executor.submit(_ocr_page_task, page, lang, profile, mode) for page in pages]
+    except BrokenProcessPool:
+        _reset_page_executor()
+        raise
+
+    done, not_done = wait(futures, timeout=timeout)
+    if not_done:
+        for future in not_done:
+            future.cancel()
+        raise TimeoutError(f"OCR of {len(pages)} pages did not finish within {timeout}s "
+                           f"({len(not_done)} pages outstanding)")
+
+    try:
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        _reset_page_executor()
+        raise
 
-    return dilated
+def _page_runs(page_numbers, window):
+    """Group sorted page numbers into consecutive runs of at most `window` pages"""
+    runs = []
+    for page_number in page_numbers:
+        if runs and page_number == runs[-1][1] + 1 and page_number - runs[-1][0] < window:
+            runs[-1][1] = page_number
+        else:
+            runs.append([page_number, page_number])
+    return runs
 
-def handle_pdf(pdf_path):
+def iter_pdf_pages(pdf_path, window=None, dpi=None, page_numbers=None):
     """
-    Convert PDF to images and extract text from all pages
+    Rasterize a PDF lazily, `window` pages at a time, yielding
+    (page_number, grayscale NumPy array). Pages are released once yielded.
+    Only the 1-based `page_numbers` are rendered when given.
+    """
+    window = window or OCR_PDF_PAGE_WINDOW
+    dpi = dpi or OCR_PDF_DPI
+    if page_numbers is None:
+        page_numbers = range(1, pdf2image.pdfinfo_from_path(pdf_path)['Pages'] + 1)
+
+    for first_page, last_page in _page_runs(sorted(page_numbers), window):
+        images = pdf2image.convert_from_path(
+            pdf_path, dpi=dpi, first_page=first_page, last_page=last_page, grayscale=True
+        )
+        for page_number in range(first_page, last_page + 1):
+            if not images:
+                break
+            image = images.pop(0)
+            page = np.asarray(image if image.mode == 'L' else image.convert('L'))
+            image.close()
+            yield page_number, page
+
+_pipeline_slots = threading.BoundedSemaphore(max(1, OCR_PIPELINE_SLOTS))
+
+def _in_slot(func):
+    """Run a pipeline stage function only while holding one of the worker's OCR_PIPELINE_SLOTS"""
+    def run(item):
+        with _pipeline_slots:
+            return item[0], func(item[1])
+    return run
+
+def _iter_pipelined(pages, lang, timeout, profile, mode, name, source):
+    pipeline = page_pipeline.Pipeline([
+        page_pipeline.Stage('preprocess', _in_slot(lambda page: prepare_page(page, profile, mode=mode)),
+                            workers=OCR_PIPELINE_PREPROCESS_WORKERS),
+        page_pipeline.Stage('ocr', _in_slot(lambda prepared: read_page(prepared, lang)),
+                            workers=OCR_PIPELINE_OCR_WORKERS)
+    ], source_name=source, name=name)
+    yield from pipeline.run(pages, timeout=OCR_PDF_TIMEOUT if timeout is None else timeout)
+    logger.debug(f"Pipeline for {name}: {pipeline.stats()}")
+
+def iter_page_text(pages, lang='swa', window=None, timeout=None, profile=None, mode=None, name='document',
+                   source='rasterize'):
+    """
+    OCR an iterator of (page_number, page image) lazily, yielding
+    (page_number, ocr_page result) in order. With OCR_PIPELINE, `pages` is
+    consumed (the `source` stage), preprocessed and OCR'd concurrently by
+    the stages of a page_pipeline.Pipeline; otherwise each window of pages
+    is OCR'd in parallel before the next one is taken from `pages`.
+    """
+    if OCR_PIPELINE:
+        yield from _iter_pipelined(pages, lang, timeout, profile, mode, name, source)
+        return
+
+    window = window or OCR_PDF_PAGE_WINDOW
+    deadline = time.monotonic() + (OCR_PDF_TIMEOUT if timeout is None else timeout)
+
+    while True:
+        batch = list(itertools.islice(pages, window))
+        if not batch:
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"OCR of {name} exceeded the document timeout")
+        numbers = [page_number for page_number, _ in batch]
+        results = ocr_pages([page for _, page in batch], lang=lang, timeout=remaining,
+                             profile=profile, mode=mode)
+        del batch
+        for page_number, result in zip(numbers, results):
+            yield page_number, result
+
+def iter_pdf_text(pdf_path, lang='swa', window=None, timeout=None, page_numbers=None, profile=None,
+                  mode=None):
+    """
+    Extract text from a PDF page by page, yielding (page_number, ocr_page result) in order.
+    Each window of pages is OCR'd in parallel before the next one is rendered.
+    """
+    window = window or OCR_PDF_PAGE_WINDOW
+    pages = iter_pdf_pages(pdf_path, window=window, page_numbers=page_numbers)
+    yield from iter_page_text(pages, lang=lang, window=window, timeout=timeout, profile=profile, mode=mode,
+                              name=pdf_path)
+
+def extract_pdf_text_layer(pdf_path):
+    """
+    Read the embedded text layer of a PDF with poppler's pdftotext.
+    Returns one string per page, or None if the layer cannot be read.
     """
     try:
-        pages = pdf2image.convert_from_path(pdf_path)
-        text = []
+        output = subprocess.run(
+            ['pdftotext', '-layout', '-enc', 'UTF-8', pdf_path, '-'],
+            capture_output=True, timeout=60, check=True
+        ).stdout.decode('utf-8', errors='replace')
+    except Exception as e:
+        logger.warning(f"Could not read PDF text layer: {str(e)}")
+        return None
+
+    # pdftotext ends every page with a form feed
+    pages = output.split('\f')
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return pages
+
+def has_usable_text(text):
+    """True if a text layer carries enough real characters to skip OCR"""
+    return sum(1 for char in text if char.isalnum()) >= OCR_TEXT_LAYER_MIN_CHARS
 
-        for page in pages:
-            open_cv_image = cv2.cvtColor(np.array(page), cv2.COLOR_RGB2BGR)
-            processed_image = preprocess_image(open_cv_image)
-            page_text = pytesseract.image_to_string(processed_image, lang='swa')
-            text.append(page_text)
+def extract_pdf_pages(pdf_path, lang='swa', profile=None, mode=None):
+    """
+    Extract text from every PDF page, reading the embedded text layer where it
+    is usable and rasterizing + OCR'ing only the remaining pages.
+    Returns a list of {'page', 'text', 'source', 'timings'} where source is
+    'text_layer', 'ocr' or 'blank' (skipped as blank, see utils.blank_pages).
+    """
+    page_count = pdf2image.pdfinfo_from_path(pdf_path)['Pages']
+    pages = {}
+
+    text_layer = extract_pdf_text_layer(pdf_path) if OCR_USE_TEXT_LAYER else None
+    if text_layer and len(text_layer) == page_count:
+        for page_number, layer_text in enumerate(text_layer, 1):
+            if has_usable_text(layer_text):
+                pages[page_number] = {'page': page_number, 'text': layer_text.strip(),
+                                      'source': 'text_layer', 'timings': {}, 'scale': None, 'geometry': None}
+
+    missing = [n for n in range(1, page_count + 1) if n not in pages]
+    logger.debug(f"PDF has {page_count} pages, {page_count - len(missing)} read from the text layer")
+
+    if missing:
+        for page_number, result in iter_pdf_text(pdf_path, lang=lang, page_numbers=missing,
+                                                 profile=profile, mode=mode):
+            pages[page_number] = {'page': page_number, 'text': result['text'].strip(),
+                                  'source': page_source(result), 'timings': result['timings'],
+                                  'scale': result['scale'], 'geometry': result['geometry'], 'blocks': result['blocks'],
+                                  'confidence': result['confidence'], 'regions': result['regions']}
+
+    return [pages[n] for n in sorted(pages)]
+
+def page_source(result):
+    """How an OCR'd page was read: 'blank' if it was skipped as blank, else 'ocr'"""
+    return 'blank' if result.get('blank') else 'ocr'
+
+def handle_pdf(pdf_path, profile=None, lang=None):
+    """
+    Convert PDF to images and extract text from all pages
+    """
+    try:
+        pages = extract_pdf_pages(pdf_path, lang=lang or ocr_languages.OCR_DEFAULT_LANGUAGE, profile=profile)
 
-        full_text = '\n'.join(text)
+        full_text = '\n'.join(page['text'] for page in pages)
         logger.debug(f"Extracted text from PDF: {len(full_text)} characters")
         return full_text.strip()
 
@@ -118,10 +405,139 @@ def handle_pdf(pdf_path):
         logger.error(f"Error processing PDF: {str(e)}")
         return None
 
-def extract_text_from_image(file_path):
+def ocr_cache_key(file_path, lang='swa', profile=None, mode=None, content_hash=None):
+    """
+    Cache key covering the file contents and every setting that affects the OCR output.
+    Pass `content_hash` instead of reading `file_path` when the bytes are already in memory.
+    """
+    return ocr_cache.make_key(
+        content_hash or ocr_cache.hash_file(file_path),
+        lang=lang,
+        profile=resolve_profile(profile),
+        layout=layout.resolve_mode(mode),
+        pipeline=OCR_PIPELINE_VERSION,
+        engine=ocr_engine.engine_version(),
+        pdf_dpi=OCR_PDF_DPI,
+        normalize=page_normalization.OCR_NORMALIZE_RESOLUTION,
+        target_dpi=page_normalization.OCR_TARGET_DPI,
+        min_dpi=page_normalization.OCR_MIN_DPI,
+        geometry=page_normalization.OCR_NORMALIZE_GEOMETRY,
+        orientation_osd=page_normalization.OCR_ORIENTATION_OSD,
+        osd_min_confidence=page_normalization.OCR_OSD_MIN_CONFIDENCE,
+        max_decode_pixels=image_ingest.OCR_MAX_DECODE_PIXELS,
+        text_layer=OCR_USE_TEXT_LAYER,
+        text_layer_min_chars=OCR_TEXT_LAYER_MIN_CHARS,
+        two_pass=adaptive_ocr.OCR_TWO_PASS,
+        second_pass_profile=adaptive_ocr.OCR_SECOND_PASS_PROFILE,
+        confidence_threshold=adaptive_ocr.OCR_CONFIDENCE_THRESHOLD,
+        page_retry_ratio=adaptive_ocr.OCR_PAGE_RETRY_RATIO,
+        skip_blank=blank_pages.OCR_SKIP_BLANK_PAGES,
+        blank_sample_width=blank_pages.OCR_BLANK_SAMPLE_WIDTH,
+        blank_ink_delta=blank_pages.OCR_BLANK_INK_DELTA,
+        blank_min_mark_pixels=blank_pages.OCR_BLANK_MIN_MARK_PIXELS,
+        blank_margin=blank_pages.OCR_BLANK_MARGIN
+    )
+
+def extract_image_pages(source, lang='swa', profile=None, mode=None, ingest_stats=None):
+    """
+    OCR an image given as a path or as encoded bytes; returns a one-page list
+    like extract_pdf_pages. Bytes are decoded in memory, counting the
+    buffers allocated into `ingest_stats`.
+    """
+    logger.debug("Opening image file")
+    start = time.perf_counter()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        gray, decode_scale = image_ingest.decode_image_gray(source, stats=ingest_stats)
+    else:
+        gray, decode_scale = image_ingest.load_image_gray(source)
+    decode_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    logger.debug(f"Running OCR with preprocessing profile '{profile}'")
+    result = ocr_page(gray, lang=lang, profile=profile, scale=decode_scale, mode=mode)
+    logger.debug(f"OCR complete: {len(result['text'])} characters extracted")
+    return [{'page': 1, 'text': result['text'].strip(), 'source': page_source(result),
+             'timings': {'decode': decode_ms, **result['timings']}, 'scale': result['scale'],
+             'geometry': result['geometry'], 'blocks': result['blocks'],
+             'confidence': result['confidence'], 'regions': result['regions']}]
+
+def _timed_frames(frames, decode_ms):
+    """Pass frames through, recording how long each took to decode"""
+    while True:
+        start = time.perf_counter()
+        item = next(frames, None)
+        if item is None:
+            return
+        decode_ms[item[0]] = round((time.perf_counter() - start) * 1000, 2)
+        yield item
+
+def extract_frame_pages(source, lang='swa', profile=None, mode=None, ingest_stats=None, name='image'):
+    """
+    OCR every frame of a multi-frame TIFF/WebP (path or bytes) through the
+    same page pipeline as PDF pages, decoding OCR_FRAME_WINDOW frames at a
+    time. Returns a page list like extract_pdf_pages.
+    """
+    decode_ms = {}
+    frames = _timed_frames(image_ingest.iter_frames_gray(source, stats=ingest_stats), decode_ms)
+    pages = []
+    for number, result in iter_page_text(frames, lang=lang, window=OCR_FRAME_WINDOW, profile=profile,
+                                         mode=mode, name=name, source='decode'):
+        pages.append({'page': number, 'text': result['text'].strip(), 'source': page_source(result),
+                      'timings': {'decode': decode_ms.pop(number, 0.0), **result['timings']},
+                      'scale': result['scale'], 'geometry': result['geometry'], 'blocks': result['blocks'],
+                      'confidence': result['confidence'], 'regions': result['regions']})
+    logger.debug(f"OCR'd {len(pages)} frames of {name}")
+    return pages
+
+def _build_document(name, read_pages, cache_key, profile, mode, lang=None):
+    """Serve a document from the cache or run `read_pages` and assemble (and cache) the result"""
+    cache = ocr_cache.get_cache() if cache_key else None
+    if cache:
+        document = cache.get(cache_key)
+        if document is not None:
+            logger.debug(f"OCR cache hit for {name}")
+            document['cached'] = True
+            return document
+
+    try:
+        pages = read_pages()
+    except Exception as e:
+        logger.error(f"Error processing {name}: {str(e)}")
+        return None
+
+    full_text = '\n'.join(page['text'] for page in pages).strip()
+    logger.debug(f"Extracted {len(full_text)} characters from {len(pages)} pages")
+    timings = {}
+    for page in pages:
+        for stage, ms in page['timings'].items():
+            timings[stage] = round(timings.get(stage, 0) + ms, 2)
+    document = {'text': full_text, 'pages': pages, 'profile': profile, 'mode': mode, 'timings': timings,
+                'confidence': adaptive_ocr.merge_summaries(page.get('confidence') for page in pages),
+                **blank_pages.summarize(pages)}
+    if lang:
+        ocr_pages_read = [page for page in pages if page['source'] == 'ocr']
+        if ocr_pages_read:
+            ocr_languages.metrics.record(
+                lang, len(ocr_pages_read),
+                sum(sum(page['timings'].values()) for page in ocr_pages_read),
+                sum(len(page['text']) for page in ocr_pages_read)
+            )
+    if cache:
+        cache.set(cache_key, document)
+    document['cached'] = False
+    return document
+
+def extract_document(file_path, lang='swa', profile=None, use_cache=True, mode=None):
     """
-    Extract text from an image or PDF file using OCR
+    Extract text from an image or PDF file and report how each page was read.
+    Returns {'text', 'pages': [{'page', 'text', 'source', 'timings', 'scale', 'geometry',
+    'confidence', 'regions'}], 'profile', 'mode', 'timings', 'confidence', 'skipped_pages',
+    'ocr_ms_saved', 'cached'} or None on failure. 'skipped_pages' lists the pages skipped as
+    blank and 'ocr_ms_saved' estimates the OCR time that saved. `profile` names a
+    preprocessing profile (see utils.preprocessing) and `mode` a layout mode
+    (see utils.layout). Results are served from the OCR cache when possible.
     """
+    profile = resolve_profile(profile)
+    mode = layout.resolve_mode(mode)
     try:
         logger.debug(f"Starting OCR extraction for file: {file_path}")
 
@@ -129,37 +545,102 @@ def extract_text_from_image(file_path):
             logger.error(f"File not found: {file_path}")
             return None
 
-        if file_path.lower().endswith('.pdf'):
-            logger.debug("Delegating to handle_pdf()")
-            return handle_pdf(file_path)
+        cache_key = None
+        if use_cache and ocr_cache.get_cache():
+            cache_key = ocr_cache_key(file_path, lang=lang, profile=profile, mode=mode)
 
-        # Handle image files
-        try:
-            logger.debug("Opening image file")
-            image = Image.open(file_path)
-            logger.debug(f"Image opened: {image.format}, {image.size}, {image.mode}")
+        if file_path.lower().endswith('.pdf'):
+            read_pages = lambda: extract_pdf_pages(file_path, lang=lang, profile=profile, mode=mode)
+        elif image_ingest.is_frame_format(file_path):
+            read_pages = lambda: extract_frame_pages(file_path, lang=lang, profile=profile, mode=mode,
+                                                     name=file_path)
+        else:
+            read_pages = lambda: extract_image_pages(file_path, lang=lang, profile=profile, mode=mode)
+        return _build_document(file_path, read_pages, cache_key, profile, mode, lang)
 
-            if image.mode != 'RGB':
-                logger.debug(f"Converting image from {image.mode} to RGB")
-                image = image.convert('RGB')
+    except Exception as e:
+        logger.error(f"Unexpected error in extract_document: {str(e)}", exc_info=True)
+        return None
 
-            open_cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            processed = preprocess_image(open_cv_image)
+def extract_document_bytes(data, filename, lang='swa', profile=None, use_cache=True, mode=None,
+                           ingest_stats=None):
+    """
+    Like extract_document, for a file already held in memory (an upload read
+    with image_ingest.read_upload, or an archive member). `filename` only
+    decides between PDF and image handling. Images are decoded straight from
+    memory; PDFs are spilled to a temporary file for poppler, which cannot
+    read from memory. Buffers allocated on the way are added to
+    `ingest_stats` (see image_ingest.new_ingest_stats).
+    """
+    profile = resolve_profile(profile)
+    mode = layout.resolve_mode(mode)
+    try:
+        cache_key = None
+        if use_cache and ocr_cache.get_cache():
+            cache_key = ocr_cache_key(None, lang=lang, profile=profile, mode=mode,
+                                      content_hash=hashlib.sha256(data).hexdigest())
 
-            logger.debug("Running OCR on preprocessed image")
-            text = pytesseract.image_to_string(processed, lang='swa')
-            logger.debug(f"OCR complete: {len(text)} characters extracted")
+        if filename.lower().endswith('.pdf'):
+            def read_pages():
+                with tempfile.NamedTemporaryFile(suffix='.pdf') as spill:
+                    spill.write(data)
+                    spill.flush()
+                    if ingest_stats is not None:
+                        ingest_stats['spilled_bytes'] = ingest_stats.get('spilled_bytes', 0) + len(data)
+                    return extract_pdf_pages(spill.name, lang=lang, profile=profile, mode=mode)
+        elif image_ingest.is_frame_format(filename):
+            read_pages = lambda: extract_frame_pages(data, lang=lang, profile=profile, mode=mode,
+                                                     ingest_stats=ingest_stats, name=filename)
+        else:
+            read_pages = lambda: extract_image_pages(data, lang=lang, profile=profile, mode=mode,
+                                                     ingest_stats=ingest_stats)
+        return _build_document(filename, read_pages, cache_key, profile, mode, lang)
 
-            if not text.strip():
-                logger.warning("No text extracted from image")
-                return None
+    except Exception as e:
+        logger.error(f"Unexpected error in extract_document_bytes: {str(e)}", exc_info=True)
+        return None
 
-            return text.strip()
+def extract_text_from_image(file_path, profile=None, mode=None, lang=None):
+    """
+    Extract text from an image or PDF file using OCR.
+    `mode` selects whole-page ('page') or block-level ('blocks') OCR and
+    `lang` the Tesseract language (default: OCR_DEFAULT_LANGUAGE).
+    """
+    document = extract_document(file_path, lang=lang or ocr_languages.OCR_DEFAULT_LANGUAGE, profile=profile,
+                                mode=mode)
+    if not document or not document['text']:
+        logger.warning(f"No text extracted from {file_path}")
+        return None
+    return document['text']
 
-        except Exception as e:
-            logger.error(f"Error processing image: {str(e)}")
-            return None
+def compare_layout_modes(file_path, lang='swa', profile=None, reference=None):
+    """
+    OCR a file in every layout mode, bypassing the cache, and report the
+    latency of each. With a `reference` transcription each mode's character
+    and word error rates are reported; without one, 'agreement' is how
+    closely block-level OCR reproduces the whole-page text (1 - CER).
+    """
+    results = {}
+    for mode in layout.LAYOUT_MODES:
+        start = time.perf_counter()
+        document = extract_document(file_path, lang=lang, profile=profile, use_cache=False, mode=mode)
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+        if document is None:
+            results[mode] = {'ms': elapsed_ms, 'error': 'extraction failed'}
+            continue
+        results[mode] = {
+            'ms': elapsed_ms,
+            'ocr_ms': document['timings'].get('ocr', 0.0),
+            'blocks': sum(page.get('blocks') or 0 for page in document['pages']),
+            'characters': len(document['text']),
+            'text': document['text']
+        }
+        if reference is not None:
+            results[mode]['cer'] = text_metrics.character_error_rate(document['text'], reference)
+            results[mode]['wer'] = text_metrics.word_error_rate(document['text'], reference)
 
-    except Exception as e:
-        logger.error(f"Unexpected error in extract_text_from_image: {str(e)}", exc_info=True)
-        return None
+    page, blocks = results.get('page', {}), results.get('blocks', {})
+    if 'text' in page and 'text' in blocks:
+        results['agreement'] = round(max(0.0, 1 - text_metrics.character_error_rate(blocks['text'], page['text'])), 4)
+        results['speedup'] = round(page['ms'] / blocks['ms'], 2) if blocks['ms'] else None
+    return results
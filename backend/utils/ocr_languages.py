@@ -0,0 +1,107 @@
+"""
+OCR Languages
+Maps the language stored on an exam ("English", "Swahili", "English and
+Swahili", ...) to the Tesseract model(s) used to read its scripts, and keeps
+per-language throughput counters.
+
+Mixed-language exams get one combined pass ("eng+swa") instead of one pass
+per language: Tesseract scores both models per word within a single
+recognition, which is far cheaper than OCR'ing the page once per language.
+"""
+
+import os
+import re
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Model used when neither the request nor the exam names a language
+OCR_DEFAULT_LANGUAGE = os.environ.get('OCR_DEFAULT_LANGUAGE', 'swa')
+# Models combined for exams marked as mixed/bilingual
+OCR_MIXED_LANGUAGES = os.environ.get('OCR_MIXED_LANGUAGES', 'eng+swa')
+
+LANGUAGE_CODES = {
+    'english': 'eng',
+    'swahili': 'swa',
+    'kiswahili': 'swa',
+    'french': 'fra',
+    'arabic': 'ara',
+    'german': 'deu',
+    'spanish': 'spa',
+    'portuguese': 'por',
+}
+MIXED_NAMES = {'mixed', 'bilingual', 'multilingual'}
+
+_SEPARATORS = re.compile(r'\s*(?:\+|,|/|&|\band\b)\s*', re.IGNORECASE)
+_CODE = re.compile(r'^[a-z]{3}(?:_[a-z]+)?$')
+
+
+def to_tesseract(language):
+    """
+    Tesseract language string for an exam language, e.g. 'English' -> 'eng',
+    'English and Swahili' -> 'eng+swa'. Returns None if nothing is recognised.
+    """
+    if not language:
+        return None
+    language = language.strip()
+    if language.lower() in MIXED_NAMES:
+        return OCR_MIXED_LANGUAGES
+
+    codes = []
+    for part in _SEPARATORS.split(language):
+        part = part.strip().lower()
+        if not part:
+            continue
+        code = LANGUAGE_CODES.get(part) or (part if _CODE.match(part) else None)
+        if code is None:
+            logger.warning(f"Unknown OCR language: {part}")
+            continue
+        if code not in codes:
+            codes.append(code)
+    return '+'.join(codes) or None
+
+
+def resolve_language(*candidates):
+    """
+    Return the Tesseract language for the first usable candidate (e.g. the
+    request's choice, then the exam's language), falling back to the default
+    """
+    for candidate in candidates:
+        code = to_tesseract(candidate)
+        if code:
+            return code
+    return OCR_DEFAULT_LANGUAGE
+
+
+class LanguageMetrics:
+    """Per-language OCR throughput counters for this worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, lang, pages, ocr_ms, characters):
+        with self._lock:
+            stats = self._stats.setdefault(lang, {'documents': 0, 'pages': 0, 'ocr_ms': 0.0, 'characters': 0})
+            stats['documents'] += 1
+            stats['pages'] += pages
+            stats['ocr_ms'] += ocr_ms
+            stats['characters'] += characters
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for lang, stats in self._stats.items():
+                seconds = stats['ocr_ms'] / 1000
+                result[lang] = {
+                    **stats,
+                    'ocr_ms': round(stats['ocr_ms'], 2),
+                    'pages_per_sec': round(stats['pages'] / seconds, 3) if seconds else None,
+                    'chars_per_sec': round(stats['characters'] / seconds, 1) if seconds else None,
+                    'ms_per_page': round(stats['ocr_ms'] / stats['pages'], 2) if stats['pages'] else None
+                }
+            return result
+
+
+metrics = LanguageMetrics()
@@ -0,0 +1,386 @@
+"""
+Page Normalization
+Geometric normalization applied to each page before preprocessing and OCR.
+Pages are rescaled so their text lands at a target effective DPI: phone
+photos of 12-48 MP are shrunk (cost scales with pixels, accuracy does not)
+and only text too small for Tesseract to read well is enlarged.
+They are then turned upright, deskewed and cropped to the paper and text
+region so Tesseract does not spend time on margins and desk background.
+
+Every step is recorded as a 3x3 matrix mapping input to output pixels, so
+boxes found on the normalized page can be mapped back to the upload.
+"""
+
+import os
+import time
+import logging
+
+import cv2
+import numpy as np
+
+from utils import ocr_engine
+
+logger = logging.getLogger(__name__)
+
+OCR_NORMALIZE_RESOLUTION = os.environ.get('OCR_NORMALIZE_RESOLUTION', 'True') == 'True'
+OCR_TARGET_DPI = int(os.environ.get('OCR_TARGET_DPI', 300))
+# Pages whose text is below this effective DPI are enlarged up to it
+OCR_MIN_DPI = int(os.environ.get('OCR_MIN_DPI', 150))
+OCR_NORMALIZE_GEOMETRY = os.environ.get('OCR_NORMALIZE_GEOMETRY', 'True') == 'True'
+# Ask Tesseract's orientation detector (needs osd.traineddata) whether a
+# page is sideways or upside down; without it pages are never turned. A
+# worker that finds the detector unavailable stops asking it.
+OCR_ORIENTATION_OSD = os.environ.get('OCR_ORIENTATION_OSD', 'True') == 'True'
+# Least detector confidence for a turn the projection test does not back up
+# (any turn of an upright-looking page, or a sideways one by 0/180 degrees)
+OCR_OSD_MIN_CONFIDENCE = float(os.environ.get('OCR_OSD_MIN_CONFIDENCE', 2.0))
+
+# Median glyph height of exam text, in inches. 12pt print and typical
+# handwriting both measure about a tenth of an inch per character.
+TEXT_HEIGHT_INCHES = 0.1
+# Never shrink below a quarter or enlarge beyond double in one step
+MIN_SCALE = 0.25
+MAX_SCALE = 2.0
+# Rescaling by less than this is not worth the resampling cost
+SCALE_TOLERANCE = 0.15
+# Side length the text-height estimate works on
+ESTIMATE_SIZE = 1200
+# Minimum number of glyph-like components for a trustworthy estimate
+MIN_COMPONENTS = 15
+# Skew search range and the smallest skew worth correcting, in degrees
+MAX_SKEW = 10.0
+MIN_SKEW = 0.3
+# Side length the skew search works on
+SKEW_SAMPLE_SIZE = 600
+# Blank border kept around the text region, as a fraction of the page side
+CROP_MARGIN = 0.02
+# A page counts as sideways when closing its ink vertically leaves this many
+# times fewer blobs than closing it horizontally
+SIDEWAYS_RATIO = 1.5
+
+# Why orientation detection cannot run in this process, once it has failed
+_osd_unavailable = None
+
+
+def _downsample(gray, size):
+    """Return (copy no larger than `size` on its long side, factor applied)"""
+    height, width = gray.shape[:2]
+    factor = min(1.0, size / max(height, width))
+    if factor == 1.0:
+        return gray, factor
+    resized = cv2.resize(
+        gray, (max(1, int(width * factor)), max(1, int(height * factor))), interpolation=cv2.INTER_AREA
+    )
+    return resized, factor
+
+
+def _ink(sample):
+    """Binary mask of dark (ink) pixels"""
+    _, binary = cv2.threshold(sample, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return binary
+
+
+def _translation(dx, dy):
+    return np.array([[1, 0, dx], [0, 1, dy], [0, 0, 1]], dtype=np.float64)
+
+
+def _scaling(scale):
+    return np.array([[scale, 0, 0], [0, scale, 0], [0, 0, 1]], dtype=np.float64)
+
+
+def estimate_text_height(gray):
+    """
+    Estimate the median character height (in pixels of `gray`) from the
+    connected components of a downsampled, binarized copy of the page.
+    Returns None if the page does not contain enough glyph-like shapes.
+    """
+    sample, factor = _downsample(gray, ESTIMATE_SIZE)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(_ink(sample), connectivity=8)
+    if count <= 1:
+        return None
+
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    # Keep shapes that look like glyphs: not specks, not lines, not page borders
+    glyphs = (
+        (heights >= 3) & (heights <= sample.shape[0] / 8) &
+        (widths <= heights * 5) & (areas >= 6)
+    )
+    if np.count_nonzero(glyphs) < MIN_COMPONENTS:
+        return None
+
+    return float(np.median(heights[glyphs])) / factor
+
+
+def normalize_resolution(gray, target_dpi=None):
+    """
+    Shrink a grayscale page whose text is above `target_dpi` down to it, or
+    enlarge one whose text is below OCR_MIN_DPI up to that.
+    Returns (image, info) where info holds the applied 'scale' (output pixels
+    per input pixel) and the estimated 'effective_dpi' before rescaling.
+    """
+    target_dpi = target_dpi or OCR_TARGET_DPI
+    text_height = estimate_text_height(gray)
+    if text_height is None:
+        return gray, {'scale': 1.0, 'effective_dpi': None}
+
+    effective_dpi = text_height / TEXT_HEIGHT_INCHES
+    if effective_dpi > target_dpi:
+        scale = max(MIN_SCALE, target_dpi / effective_dpi)
+    elif effective_dpi < OCR_MIN_DPI:
+        scale = min(MAX_SCALE, OCR_MIN_DPI / effective_dpi)
+    else:
+        scale = 1.0
+    info = {'scale': 1.0, 'effective_dpi': round(effective_dpi)}
+    if abs(scale - 1.0) < SCALE_TOLERANCE:
+        return gray, info
+
+    height, width = gray.shape[:2]
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    info['scale'] = round(scale, 4)
+    logger.debug(f"Rescaling page {width}x{height} by {scale:.2f} "
+                 f"(text at ~{effective_dpi:.0f} DPI, target {target_dpi})")
+    return cv2.resize(gray, size, interpolation=interpolation), info
+
+
+def to_original_coordinates(box, scale):
+    """Map an (x, y, w, h) box on a rescaled page back to the uploaded image"""
+    return tuple(int(round(value / scale)) for value in box)
+
+
+def find_paper_region(gray):
+    """
+    Locate the sheet of paper in a photo as the largest bright region.
+    Returns (x, y, w, h) in `gray` pixels, or None if the page fills the frame.
+    """
+    sample, factor = _downsample(gray, SKEW_SAMPLE_SIZE)
+    blurred = cv2.blur(sample, (15, 15))
+    _, bright = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(bright, connectivity=4)
+    if count <= 1:
+        return None
+
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    x, y, w, h = (int(v) for v in stats[largest, :4])
+    frame = sample.shape[0] * sample.shape[1]
+    # Too small to be the page, or already (almost) the whole frame
+    if w * h < 0.3 * frame or w * h > 0.95 * frame:
+        return None
+    return tuple(int(round(v / factor)) for v in (x, y, w, h))
+
+
+def find_text_region(gray):
+    """
+    Bounding box (x, y, w, h) of the inked area plus a small margin,
+    or None if there is no ink
+    """
+    sample, factor = _downsample(gray, SKEW_SAMPLE_SIZE)
+    ink = _ink(sample)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    if count <= 1:
+        return None
+
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    boxes = stats[1:, :4][areas >= 3]
+    if len(boxes) == 0:
+        return None
+
+    x0 = boxes[:, 0].min()
+    y0 = boxes[:, 1].min()
+    x1 = (boxes[:, 0] + boxes[:, 2]).max()
+    y1 = (boxes[:, 1] + boxes[:, 3]).max()
+    margin = int(CROP_MARGIN * max(sample.shape))
+    x0, y0 = max(0, x0 - margin), max(0, y0 - margin)
+    x1, y1 = min(sample.shape[1], x1 + margin), min(sample.shape[0], y1 + margin)
+    return tuple(int(round(v / factor)) for v in (x0, y0, x1 - x0, y1 - y0))
+
+
+def _profile_variance(ink, axis):
+    profile = ink.sum(axis=axis, dtype=np.float64)
+    return float(np.var(profile / max(1, ink.shape[axis])))
+
+
+def _merged_components(ink, kernel):
+    closed = cv2.morphologyEx(ink, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, kernel))
+    return cv2.connectedComponents(closed)[0] - 1
+
+
+def _glyphs(ink):
+    """Bounding-box stats of the glyph-like components of an ink mask"""
+    stats = cv2.connectedComponentsWithStats(ink, connectivity=8)[2]
+    return stats[1:][stats[1:, cv2.CC_STAT_AREA] >= 3]
+
+
+def is_sideways(gray):
+    """
+    True if the text lines run vertically (page turned by 90 or 270 degrees).
+    Closing the ink with a glyph-sized horizontal bar merges upright text
+    into a few line blobs; a vertical bar merges sideways text instead.
+    """
+    sample, _ = _downsample(gray, ESTIMATE_SIZE)
+    ink = _ink(sample)
+    stats = _glyphs(ink)
+    if len(stats) < MIN_COMPONENTS:
+        return False
+
+    size = max(3, int(np.median(np.maximum(stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]))))
+    horizontal = _merged_components(ink, (size, 1))
+    vertical = _merged_components(ink, (1, size))
+    return vertical * SIDEWAYS_RATIO < horizontal
+
+
+def detect_rotation(gray, timings=None):
+    """
+    Clockwise rotation (0, 90, 180 or 270) that makes the page upright.
+    Projections cannot tell upright from upside-down text, so every page
+    with text goes through Tesseract's orientation detector on a downsample.
+    A turn the projection test agrees with (90 or 270 for a sideways page)
+    is taken at any confidence, others need OCR_OSD_MIN_CONFIDENCE. When the
+    detector is off, unavailable or unsure the page is left as it is.
+    The detector's time is recorded as timings['osd'].
+    """
+    global _osd_unavailable
+    if not OCR_ORIENTATION_OSD or _osd_unavailable:
+        return 0
+    sample, _ = _downsample(gray, ESTIMATE_SIZE)
+    if len(_glyphs(_ink(sample))) < MIN_COMPONENTS:
+        return 0
+    start = time.perf_counter()
+    try:
+        osd = ocr_engine.detect_orientation(sample)
+    except ocr_engine.OrientationUndetectable as e:
+        logger.debug(f"Orientation detector found too little text, leaving page unturned: {str(e)}")
+        return 0
+    except Exception as e:
+        _osd_unavailable = str(e) or type(e).__name__
+        logger.warning(f"Orientation detection unavailable, pages will not be turned: {_osd_unavailable}")
+        return 0
+    finally:
+        if timings is not None:
+            timings['osd'] = round((time.perf_counter() - start) * 1000, 2)
+    rotation = osd['rotate'] if osd['rotate'] in _ROTATIONS else 0
+    if rotation and osd['confidence'] < OCR_OSD_MIN_CONFIDENCE:
+        if not (rotation in (90, 270) and is_sideways(sample)):
+            logger.debug(f"Orientation detector unsure ({osd['confidence']:.2f}) of a {rotation} turn, leaving page")
+            return 0
+    return rotation
+
+
+def estimate_skew(gray):
+    """
+    Skew angle in degrees (counter-clockwise positive) that best aligns text
+    lines with the rows, found by maximizing the row-profile variance
+    """
+    sample, _ = _downsample(gray, SKEW_SAMPLE_SIZE)
+    ink = _ink(sample)
+    if not np.any(ink):
+        return 0.0
+    center = (sample.shape[1] / 2, sample.shape[0] / 2)
+
+    def score(angle):
+        matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+        rotated = cv2.warpAffine(ink, matrix, (sample.shape[1], sample.shape[0]), flags=cv2.INTER_NEAREST)
+        return _profile_variance(rotated, axis=1)
+
+    # Coarse search over the whole range, then refine around the best angle
+    best = max(np.arange(-MAX_SKEW, MAX_SKEW + 0.01, 1.0), key=score)
+    best = max(np.arange(best - 0.9, best + 0.91, 0.1), key=score)
+    return round(float(best), 2)
+
+
+_ROTATIONS = {
+    90: cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE,
+}
+
+
+def _rotation_matrix(rotation, width, height):
+    """Matrix of cv2.rotate for a width x height image"""
+    if rotation == 90:
+        return np.array([[0, -1, height - 1], [1, 0, 0], [0, 0, 1]], dtype=np.float64)
+    if rotation == 180:
+        return np.array([[-1, 0, width - 1], [0, -1, height - 1], [0, 0, 1]], dtype=np.float64)
+    return np.array([[0, 1, 0], [-1, 0, width - 1], [0, 0, 1]], dtype=np.float64)
+
+
+def _crop(gray, region, transform):
+    x, y, w, h = region
+    return gray[y:y + h, x:x + w], _translation(-x, -y) @ transform
+
+
+def normalize_geometry(gray):
+    """
+    Crop to the paper, turn the page upright, deskew it and crop to the text.
+    Returns (image, info) with the 'rotation' and 'skew' applied, the
+    'area_reduction' (fraction of pixels removed), the 3x3 'transform'
+    mapping input pixels to output pixels and the 'osd_ms' spent in
+    orientation detection (None if it was not asked).
+    """
+    original_area = gray.shape[0] * gray.shape[1]
+    transform = np.eye(3)
+
+    paper = find_paper_region(gray)
+    if paper:
+        gray, transform = _crop(gray, paper, transform)
+
+    osd_timings = {}
+    rotation = detect_rotation(gray, osd_timings)
+    if rotation:
+        height, width = gray.shape[:2]
+        gray = cv2.rotate(gray, _ROTATIONS[rotation])
+        transform = _rotation_matrix(rotation, width, height) @ transform
+
+    skew = estimate_skew(gray)
+    if abs(skew) >= MIN_SKEW:
+        height, width = gray.shape[:2]
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), skew, 1.0)
+        # Grow the canvas so rotated corners are not cut off
+        cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+        new_width, new_height = int(height * sin + width * cos), int(height * cos + width * sin)
+        matrix[0, 2] += new_width / 2 - width / 2
+        matrix[1, 2] += new_height / 2 - height / 2
+        gray = cv2.warpAffine(gray, matrix, (new_width, new_height),
+                              flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        transform = np.vstack([matrix, [0, 0, 1]]) @ transform
+
+    text = find_text_region(gray)
+    if text:
+        gray, transform = _crop(gray, text, transform)
+
+    area = gray.shape[0] * gray.shape[1]
+    info = {
+        'rotation': rotation,
+        'skew': skew if abs(skew) >= MIN_SKEW else 0.0,
+        'area_reduction': round(1 - area / original_area, 4) if original_area else 0.0,
+        'transform': transform,
+        'osd_ms': osd_timings.get('osd')
+    }
+    logger.debug(f"Geometry: rotated {rotation}, deskewed {info['skew']}, "
+                 f"removed {info['area_reduction']:.0%} of pixels")
+    # Crops are views into the page; the first preprocessing stage allocates the next buffer
+    return gray, info
+
+
+def to_original_matrix(transform, scale=1.0):
+    """
+    2x3 matrix mapping normalized page pixels back to the upload, given the
+    geometry `transform` and the `scale` applied before it
+    """
+    forward = np.asarray(transform, dtype=np.float64) @ _scaling(scale)
+    return np.round(np.linalg.inv(forward)[:2], 6).tolist()
+
+
+def map_box_to_original(box, to_original):
+    """
+    Map an (x, y, w, h) box on the normalized page back to the upload using
+    the page's 2x3 'to_original' matrix. Returns the enclosing box.
+    """
+    x, y, w, h = box
+    corners = np.array([[x, y, 1], [x + w, y, 1], [x, y + h, 1], [x + w, y + h, 1]], dtype=np.float64)
+    mapped = corners @ np.asarray(to_original, dtype=np.float64).T
+    x0, y0 = mapped.min(axis=0)
+    x1, y1 = mapped.max(axis=0)
+    return int(round(x0)), int(round(y0)), int(round(x1 - x0)), int(round(y1 - y0))
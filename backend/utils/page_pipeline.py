@@ -0,0 +1,230 @@
+"""
+Page Pipeline
+Runs the pages of a document through consecutive stages (rasterize ->
+preprocess -> OCR), each on its own threads and connected by bounded
+queues. While page N is in Tesseract, page N+1 is already being
+preprocessed. OpenCV and Tesseract release the GIL, so the stages really
+overlap on separate cores. Results come out in page order.
+
+Every stage reports its utilization: the share of its threads' time spent
+working rather than waiting for input (starved) or for room in the next
+queue (blocked). The busiest stage is the one to give more workers.
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Pages waiting between two stages; bounds the pages in memory
+OCR_PIPELINE_QUEUE = int(os.environ.get('OCR_PIPELINE_QUEUE', 2))
+
+_DONE = object()
+_POLL = 0.1  # seconds between checks for a stopped pipeline
+
+
+class Stage:
+    """A pipeline stage: `func(item)` returns the item for the next stage"""
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+
+
+class _Stopped(Exception):
+    pass
+
+
+class Pipeline:
+    """Staged, bounded, order-preserving pipeline over an iterator of items"""
+
+    def __init__(self, stages, queue_size=None, source_name='source', name='document'):
+        self.stages = stages
+        self.queue_size = queue_size or OCR_PIPELINE_QUEUE
+        self.source_name = source_name
+        self.name = name
+        self._stop = threading.Event()
+        self._error = None
+        self._lock = threading.Lock()
+        self._counters = {stage: {'workers': workers, 'items': 0, 'busy': 0.0, 'starved': 0.0, 'blocked': 0.0}
+                          for stage, workers in [(source_name, 1)] + [(s.name, s.workers) for s in stages]}
+        self._started = self._finished = None
+
+    def _count(self, stage, **seconds):
+        with self._lock:
+            counters = self._counters[stage]
+            for key, value in seconds.items():
+                counters[key] += value
+
+    def _put(self, q, item, stage):
+        start = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                q.put(item, timeout=_POLL)
+                break
+            except queue.Full:
+                continue
+        self._count(stage, blocked=time.perf_counter() - start)
+
+    def _get(self, q, stage):
+        start = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                item = q.get(timeout=_POLL)
+                break
+            except queue.Empty:
+                continue
+        self._count(stage, starved=time.perf_counter() - start)
+        return item
+
+    def _fail(self, error):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _source(self, items, out):
+        try:
+            sequence = 0
+            while True:
+                start = time.perf_counter()
+                item = next(items, _DONE)
+                if item is _DONE:
+                    break
+                self._count(self.source_name, busy=time.perf_counter() - start, items=1)
+                self._put(out, (sequence, item), self.source_name)
+                sequence += 1
+            self._put(out, _DONE, self.source_name)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self._fail(e)
+
+    def _worker(self, stage, inbox, out, remaining):
+        try:
+            while True:
+                entry = self._get(inbox, stage.name)
+                if entry is _DONE:
+                    self._put(inbox, _DONE, stage.name)  # for this stage's other workers
+                    with self._lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last:
+                        self._put(out, _DONE, stage.name)
+                    return
+                sequence, item = entry
+                start = time.perf_counter()
+                result = stage.func(item)
+                self._count(stage.name, busy=time.perf_counter() - start, items=1)
+                self._put(out, (sequence, result), stage.name)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self._fail(e)
+
+    def run(self, items, timeout=None):
+        """
+        Feed `items` (consumed lazily on a thread of its own) through the
+        stages and yield the last stage's results in input order. Raises the
+        first error of any stage, or TimeoutError after `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._source, args=(iter(items), queues[0]), daemon=True,
+                                    name=f"pipeline-{self.source_name}")]
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            threads += [threading.Thread(target=self._worker, args=(stage, queues[index], queues[index + 1], remaining),
+                                         daemon=True, name=f"pipeline-{stage.name}")
+                        for _ in range(stage.workers)]
+
+        self._started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            pending, expected = {}, 0
+            while True:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"OCR of {self.name} exceeded the document timeout")
+                if self._error is not None:
+                    raise self._error
+                try:
+                    entry = queues[-1].get(timeout=_POLL)
+                except queue.Empty:
+                    continue
+                if entry is _DONE:
+                    break
+                pending[entry[0]] = entry[1]
+                while expected in pending:
+                    yield pending.pop(expected)
+                    expected += 1
+            if self._error is not None:
+                raise self._error
+        finally:
+            self._finished = time.perf_counter()
+            self._stop.set()
+            for thread in threads:
+                thread.join(timeout=_POLL * 2)
+            metrics.record(self.stats())
+
+    def stats(self):
+        """Per-stage items, busy/starved/blocked milliseconds and utilization of the last run"""
+        wall = ((self._finished or time.perf_counter()) - self._started) if self._started else 0.0
+        with self._lock:
+            stages = {}
+            for stage, counters in self._counters.items():
+                capacity = wall * counters['workers']
+                stages[stage] = {
+                    'workers': counters['workers'],
+                    'items': counters['items'],
+                    'busy_ms': round(counters['busy'] * 1000, 2),
+                    'starved_ms': round(counters['starved'] * 1000, 2),
+                    'blocked_ms': round(counters['blocked'] * 1000, 2),
+                    'utilization': round(counters['busy'] / capacity, 3) if capacity else None
+                }
+        return {'wall_ms': round(wall * 1000, 2), 'stages': stages}
+
+
+class PipelineMetrics:
+    """Per-stage utilization accumulated over every pipeline run in this worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._documents = 0
+        self._stages = {}
+
+    def record(self, stats):
+        wall = stats['wall_ms']
+        with self._lock:
+            self._documents += 1
+            for name, stage in stats['stages'].items():
+                totals = self._stages.setdefault(name, {'items': 0, 'busy_ms': 0.0, 'capacity_ms': 0.0})
+                totals['items'] += stage['items']
+                totals['busy_ms'] += stage['busy_ms']
+                totals['capacity_ms'] += wall * stage['workers']
+
+    def stats(self):
+        with self._lock:
+            return {
+                'documents': self._documents,
+                'stages': {
+                    name: {
+                        'items': totals['items'],
+                        'busy_ms': round(totals['busy_ms'], 2),
+                        'utilization': (round(totals['busy_ms'] / totals['capacity_ms'], 3)
+                                        if totals['capacity_ms'] else None)
+                    }
+                    for name, totals in self._stages.items()
+                }
+            }
+
+
+metrics = PipelineMetrics()
@@ -0,0 +1,117 @@
+"""
+Image Preprocessing
+Named preprocessing profiles built from individual OpenCV stages. Each stage
+is timed so the cost of a profile can be seen per page.
+
+Profiles:
+    fast         - median blur + adaptive threshold, for clean scans (the
+                   default; with two-pass OCR, weak lines are re-read with
+                   max_quality, see utils.adaptive_ocr)
+    balanced     - bilateral blur + adaptive threshold + median cleanup + dilation
+    max_quality  - adaptive threshold + non-local-means denoising + dilation
+                   (the original chain, slowest, for noisy phone photos)
+"""
+
+import os
+import time
+import logging
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = os.environ.get('OCR_PREPROCESS_PROFILE', 'fast')
+
+_DILATE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+
+
+def grayscale(image):
+    """Convert BGR images to grayscale, pass grayscale through untouched"""
+    if len(image.shape) == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def median_blur(image):
+    return cv2.medianBlur(image, 3)
+
+
+def bilateral_blur(image):
+    return cv2.bilateralFilter(image, 5, 50, 50)
+
+
+def adaptive_threshold(image):
+    return cv2.adaptiveThreshold(
+        image, 255,
+        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY,
+        11, 2
+    )
+
+
+def nl_means_denoise(image):
+    return cv2.fastNlMeansDenoising(image)
+
+
+def dilate(image):
+    """Dilation to connect text components"""
+    return cv2.dilate(image, _DILATE_KERNEL, iterations=1)
+
+
+STAGES = {
+    'grayscale': grayscale,
+    'median_blur': median_blur,
+    'bilateral_blur': bilateral_blur,
+    'adaptive_threshold': adaptive_threshold,
+    'nl_means_denoise': nl_means_denoise,
+    'dilate': dilate,
+}
+
+PROFILES = {
+    'fast': ['grayscale', 'median_blur', 'adaptive_threshold'],
+    'balanced': ['grayscale', 'bilateral_blur', 'adaptive_threshold', 'median_blur', 'dilate'],
+    'max_quality': ['grayscale', 'adaptive_threshold', 'nl_means_denoise', 'dilate'],
+}
+
+if DEFAULT_PROFILE not in PROFILES:
+    logger.warning(f"Unknown OCR_PREPROCESS_PROFILE '{DEFAULT_PROFILE}', using fast")
+    DEFAULT_PROFILE = 'fast'
+
+
+def resolve_profile(*candidates):
+    """
+    Return the first known profile name among the candidates (e.g. the
+    request's choice, then the exam's), falling back to the default
+    """
+    for candidate in candidates:
+        if not candidate:
+            continue
+        if candidate in PROFILES:
+            return candidate
+        logger.warning(f"Ignoring unknown preprocessing profile: {candidate}")
+    return DEFAULT_PROFILE
+
+
+def run_profile(image, profile=None):
+    """
+    Run a preprocessing profile over an image.
+    Returns (processed image, {stage name: milliseconds}).
+    """
+    profile = profile or DEFAULT_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown preprocessing profile: {profile}")
+
+    timings = {}
+    for stage in PROFILES[profile]:
+        start = time.perf_counter()
+        image = STAGES[stage](image)
+        timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+    return image, timings
+
+
+def preprocess_image(image, profile=None):
+    """
+    Preprocess the image for better OCR results
+    """
+    processed, _ = run_profile(image, profile)
+    return processed
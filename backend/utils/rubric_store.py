@@ -0,0 +1,161 @@
+"""
+Rubric Store
+Keeps extracted rubric text per exam so that grading a class's scripts does
+not OCR (or fetch) the same rubric once per script. Rubric cost then scales
+with exams, not with scripts.
+
+Two kinds of entries are kept, both normalized with normalize_rubric_text:
+- uploaded rubric files, keyed by exam, the file's content hash (its
+  version) and the OCR settings. The text of a given file never changes, so
+  these are only evicted when the store is full. Concurrent requests for
+  the same rubric wait for a single extraction.
+- the stored rubric of an exam (the `rubrics` row), trusted for
+  OCR_RUBRIC_ROW_TTL seconds. Uploading a new rubric or deleting the exam
+  invalidates it in this worker; other workers pick the change up when the
+  TTL runs out. An exam found without a rubric is only trusted for
+  OCR_RUBRIC_MISSING_TTL seconds, since its rubric may be uploaded through
+  another worker, and a failed fetch is never stored.
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import supabase_client
+
+logger = logging.getLogger(__name__)
+
+# Rubric texts kept per worker
+OCR_RUBRIC_STORE_SIZE = int(os.environ.get('OCR_RUBRIC_STORE_SIZE', 256))
+# Seconds an exam's stored rubric is used before it is fetched again
+OCR_RUBRIC_ROW_TTL = float(os.environ.get('OCR_RUBRIC_ROW_TTL', 300))
+# Seconds an exam is trusted to have no rubric before it is fetched again
+OCR_RUBRIC_MISSING_TTL = float(os.environ.get('OCR_RUBRIC_MISSING_TTL', 10))
+
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def normalize_rubric_text(text):
+    """Strip trailing spaces and collapse runs of blank lines; None if nothing is left"""
+    if not text:
+        return None
+    lines = [line.rstrip() for line in text.replace('\r\n', '\n').split('\n')]
+    text = _BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip()
+    return text or None
+
+
+class RubricStore:
+    """Per-worker store of normalized rubric text"""
+
+    def __init__(self, max_entries=OCR_RUBRIC_STORE_SIZE, row_ttl=OCR_RUBRIC_ROW_TTL,
+                 missing_ttl=OCR_RUBRIC_MISSING_TTL):
+        self.max_entries = max_entries
+        self.row_ttl = row_ttl
+        self.missing_ttl = min(missing_ttl, row_ttl)
+        self._texts = OrderedDict()
+        self._rows = OrderedDict()
+        self._extracting = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, entries, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def upload_text(self, exam_id, data, extract, **settings):
+        """
+        Text of an uploaded rubric file (`data` bytes) for `exam_id`.
+        `extract()` OCRs it and is only called if this version of the rubric
+        has not been read with the same `settings` before.
+        """
+        key = (exam_id, hashlib.sha256(data).hexdigest(), tuple(sorted(settings.items())))
+        with self._lock:
+            if key in self._texts:
+                self._texts.move_to_end(key)
+                self.hits += 1
+                return self._texts[key]
+            key_lock = self._extracting.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._texts:  # extracted by a concurrent request
+                    self.hits += 1
+                    return self._texts[key]
+                self.misses += 1
+            try:
+                text = normalize_rubric_text(extract())
+                if text:
+                    with self._lock:
+                        self._remember(self._texts, key, text)
+                return text
+            finally:
+                with self._lock:
+                    self._extracting.pop(key, None)
+
+    def exam_text(self, exam_id):
+        """Text of the rubric stored for `exam_id`, or None if it has none"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(exam_id)
+            if entry:
+                ttl = self.row_ttl if entry['version'] is not None else self.missing_ttl
+                if now - entry['fetched_at'] < ttl:
+                    self.hits += 1
+                    return entry['text']
+            self.misses += 1
+
+        try:
+            rubric = supabase_client.get_rubric(exam_id, raise_errors=True)
+        except Exception as e:
+            # Not stored: the next lookup fetches again
+            logger.warning(f"Could not fetch the rubric of exam {exam_id}: {str(e)}")
+            return entry['text'] if entry else None
+        text = normalize_rubric_text(rubric.get('content')) if rubric else None
+        version = (rubric.get('id'), rubric.get('created_at')) if rubric else None
+        with self._lock:
+            previous = self._rows.get(exam_id)
+            if previous and previous['version'] != version:
+                logger.info(f"Rubric for exam {exam_id} changed")
+            self._remember(self._rows, exam_id, {'text': text, 'version': version, 'fetched_at': now})
+        return text
+
+    def invalidate(self, exam_id):
+        """Forget everything held for an exam, e.g. after its rubric is replaced"""
+        with self._lock:
+            self._rows.pop(exam_id, None)
+            for key in [key for key in self._texts if key[0] == exam_id]:
+                del self._texts[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'uploads': len(self._texts),
+                'exams': len(self._rows),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'max_entries': self.max_entries,
+                'row_ttl': self.row_ttl,
+                'missing_ttl': self.missing_ttl
+            }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide rubric store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RubricStore()
+        return _store
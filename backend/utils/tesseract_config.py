@@ -81,6 +81,7 @@ def test_swahili_ocr():
         # Create a simple test image with Swahili text
         from PIL import Image, ImageDraw, ImageFont
         import numpy as np
+        from utils import ocr_engine
         
         # Create a white image
         img = Image.new('RGB', (400, 100), color='white')
@@ -96,12 +97,8 @@ def test_swahili_ocr():
         # Convert to numpy array
         img_array = np.array(img)
         
-        # Try OCR with Swahili
-        result = pytesseract.image_to_string(
-            img_array,
-            lang='swa',
-            config=f'--tessdata-dir "{os.environ["TESSDATA_PREFIX"]}"'  # Add quotes for path with spaces
-        )
+        # Try OCR with Swahili through the configured backend (models from TESSDATA_PREFIX)
+        result = ocr_engine.image_to_string(img_array, lang='swa')
         
         # Check if any text was extracted
         if not result.strip():
@@ -0,0 +1,199 @@
+"""
+Tesseract Probe
+Finds the Tesseract binary, its version and its languages lazily, the first
+time OCR needs them, instead of when a module is imported. The result is
+cached on disk, keyed by the binary's resolved path, size and mtime (which
+change whenever the installed version does) and the tessdata directory's
+mtime. Later worker boots and test runs then read one small JSON file
+instead of shelling out. Upgrading Tesseract or adding language data
+changes the key, so the environment is probed again.
+
+Run the warm-up command at build or deploy time so that even the first
+worker starts with a warm cache:
+
+    python -m utils.tesseract_probe --self-test
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+import pytesseract
+
+logger = logging.getLogger(__name__)
+
+TESSERACT_PROBE_CACHE = os.environ.get(
+    'TESSERACT_PROBE_CACHE',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ocr_cache', 'tesseract_probe.json')
+)
+
+WINDOWS_PATHS = (
+    r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+    r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe'
+)
+UNIX_PATHS = (
+    '/usr/bin/tesseract',
+    '/usr/local/bin/tesseract',
+    '/opt/local/bin/tesseract',
+    '/usr/share/tesseract-ocr/tesseract'
+)
+
+_MISSING = {}  # remembered result when no binary is installed
+_environment = None
+_lock = threading.Lock()
+
+
+def find_binary():
+    """Path of the Tesseract binary, from PATH or the usual install locations, or None"""
+    found = shutil.which(pytesseract.pytesseract.tesseract_cmd) or shutil.which('tesseract')
+    if found:
+        return found
+    for path in WINDOWS_PATHS if platform.system() == 'Windows' else UNIX_PATHS:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def probe_key(binary):
+    """What the cached probe of `binary` is valid for"""
+    stat = os.stat(binary)
+    tessdata = os.environ.get('TESSDATA_PREFIX')
+    return {
+        'binary': os.path.realpath(binary),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'tessdata': tessdata,
+        'tessdata_mtime': os.stat(tessdata).st_mtime if tessdata and os.path.isdir(tessdata) else None
+    }
+
+
+def probe_binary(binary):
+    """Ask the binary for its version and languages (two short subprocesses)"""
+    tessdata = os.environ.get('TESSDATA_PREFIX')
+    version = subprocess.run([binary, '--version'], capture_output=True, text=True, timeout=30)
+    # Older releases print the version to stderr
+    first_line = (version.stdout or version.stderr).strip().splitlines()[0]
+    command = [binary, '--list-langs'] + (['--tessdata-dir', tessdata] if tessdata else [])
+    listing = subprocess.run(command, capture_output=True, text=True, timeout=30)
+    languages = sorted(line.strip() for line in listing.stdout.splitlines()[1:] if line.strip())
+    return {
+        'binary': binary,
+        'version': first_line.split()[-1],
+        'languages': languages,
+        'tessdata': tessdata,
+        'self_test': None,
+        'probed_at': time.time()
+    }
+
+
+def _read_cache(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(path, value):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so other workers never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write Tesseract probe cache: {str(e)}")
+
+
+def probe(force=False, cache_path=None):
+    """
+    The Tesseract environment: {'binary', 'version', 'languages',
+    'tessdata', 'self_test', 'cached'}, or None if Tesseract is not
+    installed. Probed once per process, from the disk cache when its key
+    still matches; `force` probes the binary again.
+    """
+    global _environment
+    cache_path = cache_path or TESSERACT_PROBE_CACHE
+    with _lock:
+        if _environment is not None and not force:
+            return _environment or None
+
+        binary = find_binary()
+        if binary is None:
+            logger.error("Tesseract not found in PATH or any common location")
+            _environment = _MISSING
+            return None
+
+        key = probe_key(binary)
+        cached = _read_cache(cache_path)
+        if not force and cached and cached.get('key') == key:
+            environment = {**cached['environment'], 'cached': True}
+        else:
+            start = time.perf_counter()
+            environment = probe_binary(binary)
+            _write_cache(cache_path, {'key': key, 'environment': environment})
+            logger.info(f"Probed Tesseract {environment['version']} at {binary} in "
+                        f"{(time.perf_counter() - start) * 1000:.0f}ms: {', '.join(environment['languages'])}")
+            environment = {**environment, 'cached': False}
+
+        pytesseract.pytesseract.tesseract_cmd = binary
+        _environment = environment
+        return environment
+
+
+def ensure_configured():
+    """Point pytesseract at the binary (probing on first use); False if Tesseract is missing"""
+    return probe() is not None
+
+
+def _record_self_test(passed, cache_path):
+    global _environment
+    with _lock:
+        cached = _read_cache(cache_path)
+        if cached:
+            cached['environment']['self_test'] = passed
+            _write_cache(cache_path, cached)
+        if _environment:
+            _environment = {**_environment, 'self_test': passed}
+
+
+def warm_up(self_test=False, cache_path=None):
+    """
+    Probe the binary now and store the result for every later worker;
+    with `self_test`, also OCR a rendered Swahili line and record whether
+    it worked. Returns the environment, or None if Tesseract is missing.
+    """
+    cache_path = cache_path or TESSERACT_PROBE_CACHE
+    environment = probe(force=True, cache_path=cache_path)
+    if environment and self_test:
+        from utils.tesseract_config import test_swahili_ocr
+        _record_self_test(test_swahili_ocr(), cache_path)
+        environment = probe(cache_path=cache_path)
+    return environment
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Probe Tesseract and cache the result for OCR workers')
+    parser.add_argument('--self-test', action='store_true', help='Also OCR a test line in Swahili')
+    args = parser.parse_args(argv)
+
+    environment = warm_up(self_test=args.self_test)
+    json.dump(environment, sys.stdout, indent=2)
+    print()
+    if environment is None or environment.get('self_test') is False:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+Text Metrics
+Edit-distance based accuracy measures for comparing OCR output with a
+reference transcription.
+"""
+
+
+def edit_distance(source, target):
+    """Levenshtein distance between two sequences (strings or word lists)"""
+    if len(source) < len(target):
+        source, target = target, source
+    previous = list(range(len(target) + 1))
+    for i, item in enumerate(source, 1):
+        current = [i]
+        for j, other in enumerate(target, 1):
+            current.append(min(
+                previous[j] + 1,                   # deletion
+                current[j - 1] + 1,                # insertion
+                previous[j - 1] + (item != other)  # substitution
+            ))
+        previous = current
+    return previous[-1]
+
+
+def normalize_text(text):
+    """Collapse whitespace so line breaks and spacing do not count as errors"""
+    return ' '.join((text or '').split())
+
+
+def character_error_rate(hypothesis, reference):
+    """Character edits needed to turn the OCR output into the reference, per reference character"""
+    hypothesis, reference = normalize_text(hypothesis), normalize_text(reference)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return round(edit_distance(hypothesis, reference) / len(reference), 4)
+
+
+def word_error_rate(hypothesis, reference):
+    """Word edits needed to turn the OCR output into the reference, per reference word"""
+    hypothesis, reference = normalize_text(hypothesis).split(), normalize_text(reference).split()
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return round(edit_distance(hypothesis, reference) / len(reference), 4)
@@ -0,0 +1,249 @@
+"""
+Archive Ingestion
+Turns a ZIP of a whole class's answer scripts into submissions. Members are
+read straight out of the archive into memory (nothing is extracted to the
+upload folder), OCR'd in parallel, grouped by the student id in their file
+names, stored as submissions and optionally graded.
+
+Memory stays bounded: the declared uncompressed size of the archive is
+checked against OCR_ZIP_MAX_UNCOMPRESSED before anything is read, and only
+a window of members is held in memory at a time.
+"""
+
+import os
+import re
+import time
+import logging
+import zipfile
+import posixpath
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import supabase_client
+from utils.ocr_extraction import extract_document_bytes
+from utils.grading_helper import grade_with_mistral
+from utils import rubric_store
+
+logger = logging.getLogger(__name__)
+
+# Total uncompressed size of the script files in one archive
+OCR_ZIP_MAX_UNCOMPRESSED = int(os.environ.get('OCR_ZIP_MAX_UNCOMPRESSED', 1024 * 1024 * 1024))  # 1GB
+# Size of a single script file
+OCR_ZIP_MAX_MEMBER = int(os.environ.get('OCR_ZIP_MAX_MEMBER', 50 * 1024 * 1024))  # 50MB
+# Members OCR'd at the same time; twice as many are held in memory
+OCR_ZIP_WORKERS = int(os.environ.get('OCR_ZIP_WORKERS', 4))
+# Students whose submissions are stored/graded at the same time
+OCR_ZIP_GRADING_WORKERS = int(os.environ.get('OCR_ZIP_GRADING_WORKERS', 4))
+# Maps a file name (without extension) to a student id and optional name, e.g.
+# "S1234_Jane Doe.pdf" or "S1234-page2.jpg"
+OCR_ZIP_STUDENT_PATTERN = os.environ.get(
+    'OCR_ZIP_STUDENT_PATTERN',
+    r'^(?P<student_id>[A-Za-z0-9]+?)(?:[_\- ](?P<student_name>.*))?$'
+)
+
+SCRIPT_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.webp', '.pdf')
+# Trailing page markers are not part of the student's name
+_PAGE_SUFFIX = re.compile(r'[_\- ]*(?:p|page|pg)?[_\- ]*\d{1,3}$', re.IGNORECASE)
+
+
+class ArchiveTooLargeError(Exception):
+    """Raised when an archive's script files exceed the uncompressed-size budget"""
+
+
+def parse_student(filename, pattern=None):
+    """
+    Derive (student_id, student_name) from a member's file name.
+    Returns (None, None) if the name does not match the pattern.
+    """
+    stem = os.path.splitext(posixpath.basename(filename))[0].strip()
+    match = re.match(pattern or OCR_ZIP_STUDENT_PATTERN, stem)
+    if not match or not match.group('student_id'):
+        return None, None
+    student_id = match.group('student_id')
+    name = match.groupdict().get('student_name') or ''
+    name = _PAGE_SUFFIX.sub('', name).replace('_', ' ').strip()
+    return student_id, name or student_id
+
+
+def plan_archive(archive, max_uncompressed=None, max_member=None):
+    """
+    Decide which members to read, before reading any of them.
+    Returns (students, skipped): students maps student id to
+    {'student_name', 'members': [ZipInfo sorted by name]}; skipped lists
+    {'filename', 'reason'}. Raises ArchiveTooLargeError if the scripts'
+    declared uncompressed size exceeds the budget.
+    """
+    max_uncompressed = max_uncompressed or OCR_ZIP_MAX_UNCOMPRESSED
+    max_member = max_member or OCR_ZIP_MAX_MEMBER
+    students, skipped, total = {}, [], 0
+
+    for info in sorted(archive.infolist(), key=lambda i: i.filename):
+        name = info.filename
+        base = posixpath.basename(name)
+        if info.is_dir() or base.startswith('.') or name.startswith('__MACOSX/'):
+            continue
+        if not base.lower().endswith(SCRIPT_EXTENSIONS):
+            skipped.append({'filename': name, 'reason': 'unsupported file type'})
+            continue
+        if info.file_size > max_member:
+            skipped.append({'filename': name, 'reason': f'larger than {max_member} bytes'})
+            continue
+        student_id, student_name = parse_student(name)
+        if not student_id:
+            skipped.append({'filename': name, 'reason': 'no student id in file name'})
+            continue
+        total += info.file_size
+        student = students.setdefault(student_id, {'student_name': student_name, 'members': []})
+        student['members'].append(info)
+
+    if total > max_uncompressed:
+        raise ArchiveTooLargeError(
+            f"Archive holds {total} bytes of scripts, more than the {max_uncompressed} byte budget"
+        )
+    return students, skipped
+
+
+def read_member(archive, info):
+    """Read one member into memory, refusing members that inflate past their declared size"""
+    with archive.open(info) as member:
+        data = member.read(info.file_size + 1)
+    if len(data) > info.file_size:
+        raise ArchiveTooLargeError(f"{info.filename} is larger than its declared size")
+    return data
+
+
+def store_submission(exam_id, created_by, student_id, student, texts, rubric_text, grade, strictness_level):
+    """Create (and optionally grade) one student's submission from their OCR'd pages"""
+    script_text = '\n'.join(text for text in texts if text).strip()
+    result = {
+        'student_id': student_id,
+        'student_name': student['student_name'],
+        'files': [info.filename for info in student['members']],
+        'characters': len(script_text)
+    }
+    if not script_text:
+        result['error'] = 'No text could be extracted'
+        return result
+
+    submission = supabase_client.create_submission(
+        exam_id=exam_id,
+        student_name=student['student_name'],
+        student_id=student_id,
+        script_file_name=', '.join(posixpath.basename(name) for name in result['files']),
+        created_by=created_by,
+        extracted_text_script=script_text,
+        extracted_text_rubric=rubric_text
+    )
+    result['submission_id'] = submission.get('id')
+
+    if grade and rubric_text:
+        grading = grade_with_mistral(script_text, rubric_text, strictness_level)
+        supabase_client.update_submission_score(submission.get('id'), grading.get('score'), grading.get('feedback'))
+        result['score'] = grading.get('score')
+    return result
+
+
+def ingest_archive(archive_file, exam_id, created_by, lang='swa', profile=None, mode=None,
+                   grade=False, strictness_level=2, max_uncompressed=None):
+    """
+    OCR every script in a ZIP (path or seekable file object) and store one
+    submission per student. Yields {'plan': ...} once the archive has been
+    checked, then a result dict per student as soon as it is stored/graded,
+    then a final {'summary': ...}.
+    Raises ArchiveTooLargeError (before any OCR) if the archive is over budget.
+    """
+    start = time.perf_counter()
+    with zipfile.ZipFile(archive_file) as archive:
+        students, skipped = plan_archive(archive, max_uncompressed=max_uncompressed)
+        logger.info(f"Ingesting {sum(len(s['members']) for s in students.values())} scripts "
+                    f"for {len(students)} students ({len(skipped)} files skipped)")
+
+        rubric_text = rubric_store.get_store().exam_text(exam_id)
+        if grade and not rubric_text:
+            logger.warning(f"Exam {exam_id} has no rubric text, submissions will not be graded")
+
+        members = [(student_id, index, info)
+                   for student_id, student in students.items()
+                   for index, info in enumerate(student['members'])]
+        texts = {student_id: [None] * len(student['members']) for student_id, student in students.items()}
+        remaining = {student_id: len(student['members']) for student_id, student in students.items()}
+        errors = {student_id: [] for student_id in students}
+        stats = {'students': len(students), 'files': len(members), 'bytes_read': 0,
+                 'submissions': 0, 'graded': 0, 'failed': 0, 'skipped': skipped}
+        yield {'plan': {'students': len(students), 'files': len(members), 'skipped': skipped}}
+
+        ocr_pool = ThreadPoolExecutor(max_workers=max(1, OCR_ZIP_WORKERS), thread_name_prefix='zip-ocr')
+        store_pool = ThreadPoolExecutor(max_workers=max(1, OCR_ZIP_GRADING_WORKERS), thread_name_prefix='zip-store')
+        ocr_futures, store_futures = {}, set()
+        queue = iter(members)
+        try:
+            while True:
+                # Keep a bounded window of members in memory; reading happens on this thread
+                while len(ocr_futures) < 2 * max(1, OCR_ZIP_WORKERS):
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    student_id, index, info = item
+                    try:
+                        data = read_member(archive, info)
+                    except (ArchiveTooLargeError, zipfile.BadZipFile, OSError) as e:
+                        logger.warning(f"Could not read {info.filename}: {str(e)}")
+                        data = None
+                    if data is None:
+                        future = ocr_pool.submit(lambda: None)  # counted as an unreadable file
+                    else:
+                        stats['bytes_read'] += len(data)
+                        future = ocr_pool.submit(extract_document_bytes, data, info.filename,
+                                                 lang=lang, profile=profile, mode=mode)
+                    ocr_futures[future] = item
+                    data = None
+
+                if not ocr_futures and not store_futures:
+                    break
+
+                done, _ = wait(set(ocr_futures) | store_futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in store_futures:
+                        store_futures.discard(future)
+                        result = future.result()
+                        if 'error' in result:
+                            stats['failed'] += 1
+                        else:
+                            stats['submissions'] += 1
+                            stats['graded'] += 'score' in result
+                        yield result
+                        continue
+
+                    student_id, index, info = ocr_futures.pop(future)
+                    document = future.result()
+                    if document is None:
+                        errors[student_id].append(info.filename)
+                    else:
+                        texts[student_id][index] = document['text']
+                    remaining[student_id] -= 1
+                    if remaining[student_id] == 0:
+                        store_futures.add(store_pool.submit(
+                            _store_safely, exam_id, created_by, student_id, students[student_id],
+                            texts.pop(student_id), errors[student_id], rubric_text, grade, strictness_level
+                        ))
+        finally:
+            ocr_pool.shutdown(wait=False, cancel_futures=True)
+            store_pool.shutdown(wait=False, cancel_futures=True)
+
+    stats['ms'] = round((time.perf_counter() - start) * 1000, 2)
+    logger.info(f"Archive ingested: {stats['submissions']} submissions, {stats['graded']} graded, "
+                f"{stats['failed']} failed in {stats['ms'] / 1000:.1f}s")
+    yield {'summary': stats}
+
+
+def _store_safely(exam_id, created_by, student_id, student, texts, failed_files, rubric_text, grade,
+                  strictness_level):
+    try:
+        result = store_submission(exam_id, created_by, student_id, student, texts, rubric_text, grade,
+                                  strictness_level)
+    except Exception as e:
+        logger.error(f"Error storing submission for {student_id}: {str(e)}", exc_info=True)
+        result = {'student_id': student_id, 'student_name': student['student_name'],
+                  'files': [info.filename for info in student['members']], 'error': str(e)}
+    if failed_files:
+        result['unreadable_files'] = failed_files
+    return result